@@ -0,0 +1,163 @@
+"""
+Timed cases of `premise` transformations, run by `airspeed velocity <https://asv.readthedocs.io>`_
+on synthetic databases generated by :mod:`benchmarks.synthetic_db`.
+
+Transformations modify the database they are given, so each case is run
+once per repeat, on a fresh copy of the database.
+"""
+
+import copy
+import functools
+import tempfile
+from pathlib import Path
+from premise.clean_datasets import DatabaseCleaner
+from premise.compact import CompactDatabase
+from premise.data_collection import IAMDataCollection
+from premise.electricity import Electricity
+from premise.cement import Cement
+from premise.steel import Steel
+from premise.export import Export, MatrixStore
+from premise.utils import add_modified_tags
+from .synthetic_db import as_ecospold, generate_database, write_remind_file
+
+MODEL = "remind"
+PATHWAY = "SSP2-Base"
+YEAR = 2030
+VERSION = "3.7.1"
+
+SIZES = [1000, 10000]
+
+
+@functools.lru_cache(maxsize=None)
+def get_database(n_datasets, **kwargs):
+    return generate_database(n_datasets=n_datasets, **kwargs)
+
+
+@functools.lru_cache(maxsize=None)
+def get_iam_data():
+    directory = Path(tempfile.mkdtemp())
+    write_remind_file(directory, pathway=PATHWAY)
+    return IAMDataCollection(model=MODEL, pathway=PATHWAY, year=YEAR, filepath_iam_files=directory)
+
+
+class Benchmark:
+    params = SIZES
+    param_names = ["datasets"]
+    number = 1
+    repeat = 3
+    timeout = 600
+
+    def setup(self, n_datasets):
+        self.db = copy.deepcopy(get_database(n_datasets))
+
+
+class TimeDatabaseCleaner(Benchmark):
+    def setup(self, n_datasets):
+        # As `DatabaseCleaner.__init__` would do, without reading the source
+        self.cleaner = DatabaseCleaner.__new__(DatabaseCleaner)
+        self.cleaner.db = copy.deepcopy(get_database(n_datasets, missing_locations_share=0.05))
+        self.cleaner.dataset_rules = []
+        self.cleaner.exchange_rules = []
+
+        self.ecospold_cleaner = DatabaseCleaner.__new__(DatabaseCleaner)
+        self.ecospold_cleaner.db = as_ecospold(get_database(n_datasets))
+        self.ecospold_cleaner.dataset_rules = [self.ecospold_cleaner.transform_dataset_parameter_field]
+        self.ecospold_cleaner.exchange_rules = [
+            self.ecospold_cleaner.set_exchange_location_from_input,
+            self.ecospold_cleaner.set_exchange_product_and_name,
+        ]
+
+    def time_prepare_datasets(self, n_datasets):
+        self.cleaner.prepare_datasets()
+
+    def time_prepare_datasets_ecospold(self, n_datasets):
+        self.ecospold_cleaner.prepare_datasets()
+
+
+class TimeCompactDatabase(Benchmark):
+    def setup(self, n_datasets):
+        super().setup(n_datasets)
+        self.compact_db = CompactDatabase(self.db)
+
+    def time_compact(self, n_datasets):
+        CompactDatabase(self.db)
+
+    def time_expand(self, n_datasets):
+        self.compact_db.to_database()
+
+
+class TimeElectricity(Benchmark):
+    def setup(self, n_datasets):
+        super().setup(n_datasets)
+        self.electricity = Electricity(
+            db=self.db, iam_data=get_iam_data(), model=MODEL, pathway=PATHWAY, year=YEAR
+        )
+
+    def time_update_electricity_markets(self, n_datasets):
+        self.electricity.update_electricity_markets()
+
+    def time_update_electricity_efficiency(self, n_datasets):
+        self.electricity.update_electricity_efficiency()
+
+
+class TimeCement(Benchmark):
+    def setup(self, n_datasets):
+        super().setup(n_datasets)
+        self.cement = Cement(
+            db=self.db, model=MODEL, scenario=PATHWAY, iam_data=get_iam_data(), year=YEAR, version=VERSION
+        )
+
+    def time_add_datasets_to_database(self, n_datasets):
+        self.cement.add_datasets_to_database()
+
+
+class TimeSteel(Benchmark):
+    def setup(self, n_datasets):
+        super().setup(n_datasets)
+        self.steel = Steel(db=self.db, model=MODEL, iam_data=get_iam_data(), year=YEAR)
+
+    def time_generate_activities(self, n_datasets):
+        # The synthetic REMIND file has no industry module
+        self.steel.generate_activities(industry_module_present=False)
+
+
+class TimeAddModifiedTags(Benchmark):
+    def setup(self, n_datasets):
+        super().setup(n_datasets)
+        # A scenario database in which one dataset in ten has been rescaled, and as many datasets created
+        scenario_db = copy.deepcopy(self.db)
+        for ds in scenario_db[::10]:
+            for exc in ds["exchanges"]:
+                if exc["type"] != "production":
+                    exc["amount"] *= 0.9
+            new_ds = copy.deepcopy(ds)
+            new_ds["location"] = "World"
+            new_ds["code"] = ds["code"][::-1]
+            for exc in new_ds["exchanges"]:
+                if exc["type"] == "production":
+                    exc["location"] = "World"
+            scenario_db.append(new_ds)
+
+        self.scenarios = [
+            {"model": MODEL, "pathway": PATHWAY, "year": YEAR, "database": scenario_db}
+        ]
+
+    def time_add_modified_tags(self, n_datasets):
+        add_modified_tags(self.db, self.scenarios)
+
+
+class TimeExport(Benchmark):
+    def setup(self, n_datasets):
+        super().setup(n_datasets)
+        self.directory = Path(tempfile.mkdtemp())
+        self.export = Export(self.db, MODEL, PATHWAY, YEAR, self.directory)
+
+    def time_export_db_to_matrices(self, n_datasets):
+        self.export.export_db_to_matrices()
+
+    def time_export_db_to_simapro(self, n_datasets):
+        self.export.export_db_to_simapro()
+
+    def time_matrix_store(self, n_datasets):
+        # Three scenarios sharing the same index and pattern
+        MatrixStore((MODEL, PATHWAY, year, self.db) for year in (2030, 2040, 2050)).write(self.directory)
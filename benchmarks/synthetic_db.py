@@ -0,0 +1,358 @@
+"""
+Generators of synthetic, ecoinvent-shaped inventory databases and REMIND result files,
+so that `premise` transformations can be benchmarked without an ecoinvent licence
+or access to IAM outputs.
+
+Datasets that the transformations look for (power plants, electricity markets, clinker,
+cement and steel production and markets) are named after the filters and data files of `premise`.
+The rest of the database is filled up with generic datasets, so that its size can be chosen freely.
+All technosphere exchanges point to datasets of the database, and all biosphere exchanges
+to flows of the biosphere flows list used by :class:`premise.export.Export`.
+"""
+
+import csv
+import random
+from premise import DATA_DIR
+from premise.activity_maps import InventorySet
+from premise.export import FILEPATH_BIOSPHERE_FLOWS
+
+REGION_MAPPING_FILEPATH = DATA_DIR / "regionmappingH12.csv"
+CLINKER_RATIO_ECOINVENT_36 = DATA_DIR / "cement" / "clinker_ratio_ecoinvent_36.csv"
+IAM_ELEC_MARKETS = DATA_DIR / "electricity" / "electricity_markets.csv"
+IAM_ELEC_EFFICIENCIES = DATA_DIR / "electricity" / "electricity_efficiencies.csv"
+
+# Countries not known to `constructive_geometries`
+COUNTRIES_NOT_FOUND = ["CC", "CX", "GG", "JE", "BL"]
+
+UNITS = ["kilogram", "kilowatt hour", "megajoule", "unit", "cubic meter", "ton kilometer"]
+
+STEEL_DATASETS = [
+    ("market for steel, low-alloyed", "steel, low-alloyed"),
+    ("market for steel, chromium steel 18/8", "steel, chromium steel 18/8"),
+    ("market for steel, unalloyed", "steel, unalloyed"),
+    ("steel production, converter, low-alloyed", "steel, low-alloyed"),
+    ("steel production, converter, unalloyed", "steel, unalloyed"),
+    ("steel production, electric, low-alloyed", "steel, low-alloyed"),
+    ("steel production, electric, chromium steel 18/8", "steel, chromium steel 18/8"),
+]
+
+FOSSIL_CO2 = ("Carbon dioxide, fossil", "air", "unspecified", "kilogram", "349b29d1-3e58-4c66-98b9-9d1a076efd2e")
+
+ELECTRICITY_MARKETS = [
+    ("market for electricity, high voltage", "electricity, high voltage"),
+    ("market for electricity, medium voltage", "electricity, medium voltage"),
+    ("market for electricity, low voltage", "electricity, low voltage"),
+    ("market group for electricity, high voltage", "electricity, high voltage"),
+    ("market group for electricity, medium voltage", "electricity, medium voltage"),
+    ("market group for electricity, low voltage", "electricity, low voltage"),
+]
+
+
+def get_country_codes():
+    """
+    Return the ISO codes of the countries of the REMIND region mapping.
+
+    :return: list of ISO country codes
+    :rtype: list
+    """
+    with open(REGION_MAPPING_FILEPATH) as f:
+        f.readline()
+        codes = [r[1].strip() for r in csv.reader(f, delimiter=";")]
+    return sorted(set(c for c in codes if c not in COUNTRIES_NOT_FOUND))
+
+
+def get_biosphere_flows():
+    """
+    Return the biosphere flows known to :class:`premise.export.Export`.
+
+    :return: list of (name, category, sub-category, unit, code) tuples
+    :rtype: list
+    """
+    with open(FILEPATH_BIOSPHERE_FLOWS) as f:
+        return [tuple(r) for r in csv.reader(f, delimiter=";")]
+
+
+def get_powerplant_names():
+    """
+    Return the names of the datasets matched by the power plant filters of :class:`premise.activity_maps.InventorySet`.
+
+    :return: list of dataset names
+    :rtype: list
+    """
+    names = []
+    for filters in InventorySet.powerplant_filters.values():
+        fltr = filters["fltr"]
+        if isinstance(fltr, str):
+            names.append(fltr)
+        elif isinstance(fltr, list):
+            names.extend(fltr)
+    return sorted(set(names))
+
+
+def get_cement_datasets():
+    """
+    Return the (name, location) of the cement markets supplying "cement, unspecified",
+    as listed in the clinker-to-cement ratio file of ecoinvent 3.6+.
+
+    :return: list of (name, location) tuples
+    :rtype: list
+    """
+    with open(CLINKER_RATIO_ECOINVENT_36) as f:
+        return [(r[0], r[1]) for r in csv.reader(f)]
+
+
+def get_anchor_datasets(locations):
+    """
+    Return the (name, reference product, unit, location) of the datasets
+    that `premise` transformations look for.
+
+    :param locations: ecoinvent locations to place the power plants and markets in
+    :type locations: list
+    :return: list of (name, reference product, unit, location) tuples
+    :rtype: list
+    """
+    anchors = []
+
+    for name in get_powerplant_names():
+        anchors.extend((name, "electricity, high voltage", "kilowatt hour", loc) for loc in locations)
+
+    for name, ref_prod in ELECTRICITY_MARKETS:
+        anchors.extend((name, ref_prod, "kilowatt hour", loc) for loc in locations)
+
+    for name, ref_prod in STEEL_DATASETS:
+        anchors.extend((name, ref_prod, "kilogram", loc) for loc in ["GLO", "RER", "RoW"])
+
+    cement_markets = get_cement_datasets()
+    for name, loc in cement_markets:
+        ref_prod = name.replace("market for ", "")
+        anchors.append((name, ref_prod, "kilogram", loc))
+        anchors.append((name.replace("market for cement", "cement production"), ref_prod, "kilogram", loc))
+
+    for loc in sorted(set(loc for _, loc in cement_markets)):
+        anchors.append(
+            ("cement, all types to generic market for cement, unspecified", "cement, unspecified", "kilogram", loc)
+        )
+        anchors.append(("clinker production", "clinker", "kilogram", loc))
+        anchors.append(("market for clinker", "clinker", "kilogram", loc))
+
+    return list(dict.fromkeys(anchors))
+
+
+def get_exchange(act, amount):
+    return {
+        "name": act["name"],
+        "product": act["reference product"],
+        "unit": act["unit"],
+        "location": act["location"],
+        "amount": amount,
+        "type": "technosphere",
+        "uncertainty type": 0,
+        "input": (act["database"], act["code"]),
+    }
+
+
+def get_biosphere_exchange(flow, amount):
+    name, cat, subcat, unit, code = flow
+    return {
+        "name": name,
+        "categories": (cat, subcat) if subcat != "unspecified" else (cat,),
+        "unit": unit,
+        "amount": amount,
+        "type": "biosphere",
+        "uncertainty type": 0,
+        "input": ("biosphere3", code),
+    }
+
+
+def generate_database(
+    n_datasets=1000,
+    n_exchanges=10,
+    n_locations=20,
+    biosphere_share=0.3,
+    missing_locations_share=0.0,
+    seed=0,
+):
+    """
+    Generate an ecoinvent-shaped database.
+
+    :param n_datasets: number of datasets. The database contains at least the datasets
+        looked for by `premise` transformations, in which case it may be larger.
+    :type n_datasets: int
+    :param n_exchanges: number of technosphere and biosphere exchanges per dataset, on top of the production exchange
+    :type n_exchanges: int
+    :param n_locations: number of countries in which generic datasets, power plants and electricity markets are located
+    :type n_locations: int
+    :param biosphere_share: share of biosphere exchanges
+    :type biosphere_share: float
+    :param missing_locations_share: share of technosphere exchanges without a `location` field,
+        as found in databases imported from ecospold files
+    :type missing_locations_share: float
+    :param seed: seed of the random number generator, for the database to be reproducible
+    :type seed: int
+    :return: wurst inventory database
+    :rtype: list
+    """
+    rng = random.Random(seed)
+
+    countries = get_country_codes()
+    locations = rng.sample(countries, min(n_locations, len(countries)))
+
+    keys = get_anchor_datasets(locations)
+    keys.extend(
+        (
+            "synthetic activity {}".format(i),
+            "synthetic product {}".format(i),
+            rng.choice(UNITS),
+            rng.choice(locations + ["GLO", "RoW"]),
+        )
+        for i in range(max(n_datasets - len(keys), 0))
+    )
+
+    db = [
+        {
+            "name": name,
+            "reference product": ref_prod,
+            "unit": unit,
+            "location": loc,
+            "database": "synthetic",
+            "code": "{:032x}".format(rng.getrandbits(128)),
+            "comment": "Synthetic dataset.",
+            "parameters": {},
+        }
+        for name, ref_prod, unit, loc in keys
+    ]
+
+    by_name = {}
+    for act in db:
+        by_name.setdefault(act["name"], []).append(act)
+
+    flows = get_biosphere_flows()
+    cement_markets = {
+        loc: [a for n, l in get_cement_datasets() if l == loc for a in by_name[n] if a["location"] == loc]
+        for loc in set(l for _, l in get_cement_datasets())
+    }
+
+    for act in db:
+        exchanges = [
+            {
+                "name": act["name"],
+                "product": act["reference product"],
+                "unit": act["unit"],
+                "location": act["location"],
+                "amount": 1,
+                "type": "production",
+                "uncertainty type": 0,
+                "production volume": rng.uniform(1, 1e6),
+                "input": (act["database"], act["code"]),
+            }
+        ]
+
+        if act["name"] == "cement, all types to generic market for cement, unspecified":
+            # Supplied by the cement markets which clinker-to-cement ratio is known
+            suppliers = cement_markets[act["location"]]
+            exchanges.extend(get_exchange(s, 1 / len(suppliers)) for s in suppliers)
+
+        elif act["name"].startswith(("market for electricity", "market group for electricity")):
+            voltage = act["reference product"].split(", ")[1]
+            if voltage == "high voltage":
+                suppliers = [a for n in get_powerplant_names() for a in by_name[n] if a["location"] == act["location"]]
+            else:
+                suppliers = [
+                    a for a in by_name["market for electricity, {}".format(
+                        "high voltage" if voltage == "medium voltage" else "medium voltage"
+                    )]
+                    if a["location"] == act["location"]
+                ]
+            exchanges.extend(get_exchange(s, 1 / len(suppliers)) for s in suppliers)
+
+        else:
+            for _ in range(n_exchanges):
+                if rng.random() < biosphere_share:
+                    exchanges.append(get_biosphere_exchange(rng.choice(flows), rng.uniform(0, 1)))
+                else:
+                    exc = get_exchange(rng.choice(db), rng.uniform(0, 1))
+                    if rng.random() < missing_locations_share:
+                        exc.pop("location")
+                    exchanges.append(exc)
+
+            if act["name"] == "clinker production" or act["name"].startswith("steel production"):
+                # Combustion and process emissions, rescaled by the transformations
+                exchanges.append(get_biosphere_exchange(FOSSIL_CO2, rng.uniform(0, 1)))
+
+        act["exchanges"] = exchanges
+
+    return db
+
+
+def as_ecospold(db):
+    """
+    Return a copy of a database shaped as :class:`bw2io.SingleOutputEcospold2Importer` leaves it:
+    parameters are given as lists, and exchanges have neither product nor, for technosphere exchanges, location.
+
+    :param db: wurst inventory database
+    :type db: list
+    :return: database
+    :rtype: list
+    """
+    return [
+        {
+            **ds,
+            "parameters": [{"name": k, "amount": v} for k, v in ds["parameters"].items()],
+            "exchanges": [
+                {
+                    k: v
+                    for k, v in exc.items()
+                    if k != "product" and not (k == "location" and exc["type"] == "technosphere")
+                }
+                for exc in ds["exchanges"]
+            ],
+        }
+        for ds in db
+    ]
+
+
+def write_remind_file(directory, pathway="SSP2-Base", seed=0):
+    """
+    Write a synthetic REMIND result file, with the variables read by `premise`, for all REMIND regions.
+    It can be read by :class:`premise.data_collection.IAMDataCollection` with `model="remind"`.
+
+    :param directory: directory to write `remind_<pathway>.mif` in
+    :type directory: pathlib.Path
+    :param pathway: name of the pathway
+    :type pathway: str
+    :param seed: seed of the random number generator
+    :type seed: int
+    :return: path of the file written
+    :rtype: pathlib.Path
+    """
+    rng = random.Random(seed)
+
+    with open(REGION_MAPPING_FILEPATH) as f:
+        f.readline()
+        regions = sorted(set(r[2].strip() for r in csv.reader(f, delimiter=";"))) + ["World"]
+
+    variables = {}
+    for filepath, unit in ((IAM_ELEC_MARKETS, "EJ/yr"), (IAM_ELEC_EFFICIENCIES, "%")):
+        with open(filepath) as f:
+            for row in csv.reader(f, delimiter=";"):
+                if row[0] == "remind":
+                    variables[row[2]] = unit
+    variables["Emi|CO2|FFaI|Industry|Cement"] = "Mt CO2/yr"
+    variables["Emi|CCO2|FFaI|Industry|Cement"] = "Mt CO2/yr"
+
+    years = list(range(2005, 2055, 5)) + list(range(2060, 2110, 10))
+
+    filepath = directory / "remind_{}.mif".format(pathway)
+    with open(filepath, "w") as f:
+        f.write(";".join(["Model", "Scenario", "Region", "Variable", "Unit"] + [str(y) for y in years]) + ";\n")
+        for region in regions:
+            for variable, unit in sorted(variables.items()):
+                values = [
+                    rng.uniform(30, 60) if unit == "%" else rng.uniform(0, 10)
+                    for _ in years
+                ]
+                f.write(
+                    ";".join(["REMIND", pathway, region, variable, unit] + ["{:.4f}".format(v) for v in values]) + ";\n"
+                )
+
+    return filepath
@@ -1,15 +1,43 @@
 __all__ = (
     "NewDatabase",
     "Geomap",
+    "Electricity",
+    "SolarPV",
+    "Cement",
+    "Steel",
+    "Cars",
     "DATA_DIR",
     "INVENTORY_DIR"
 )
 __version__ = (0, 2, 0)
 
 from pathlib import Path
+import importlib
 
 DATA_DIR = Path(__file__).resolve().parent / "data"
 INVENTORY_DIR = Path(__file__).resolve().parent / "data" / "additional_inventories"
 
-from .ecoinvent_modification import NewDatabase
-from .geomap import Geomap
+# Classes exposed at the package level, and the submodule that defines them.
+# Submodules are only imported when one of these classes is first accessed,
+# so that `import premise` stays cheap.
+_LAZY_IMPORTS = {
+    "NewDatabase": ".ecoinvent_modification",
+    "Geomap": ".geomap",
+    "Electricity": ".electricity",
+    "SolarPV": ".renewables",
+    "Cement": ".cement",
+    "Steel": ".steel",
+    "Cars": ".cars",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        value = getattr(importlib.import_module(_LAZY_IMPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_IMPORTS))
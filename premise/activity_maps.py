@@ -1,4 +1,5 @@
 from . import DATA_DIR
+from .data_registry import registry
 import csv
 
 REMIND_TO_ECOINVENT_EMISSION_FILEPATH = (DATA_DIR / "ecoinvent_to_gains_emission_mappping.csv")
@@ -484,6 +485,7 @@ class InventorySet:
         return self.generate_sets_from_filters(self.fuel_filters)
 
     @staticmethod
+    @registry.memoize(REMIND_TO_ECOINVENT_EMISSION_FILEPATH)
     def get_remind_to_ecoinvent_emissions():
         """
         Retrieve the correspondence between REMIND and ecoinvent emission labels.
@@ -0,0 +1,458 @@
+from bw2data import Database, config, databases, geomapping, mapping
+from bw2data.backends.peewee import sqlite3_lci_db
+from bw2data.errors import InvalidExchange, UnknownObject, UntypedExchange
+from bw2data.search import IndexManager
+from bw2data.utils import MAX_INT_32, TYPE_DICTIONARY
+from wurst.errors import InvalidLink, NonuniqueCode
+from wurst.searching import reference_product
+from pprint import pformat
+import copy
+import datetime
+import numpy as np
+import pickle
+import sqlite3
+
+# Fields by which exchanges without an `input` are linked to the reference product of a dataset
+LINKING_FIELDS = ("name", "product", "location", "unit")
+
+INSERT_ACTIVITIES = (
+    'INSERT INTO "activitydataset" ("data", "code", "database", "location", "name", "product", "type") '
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+INSERT_EXCHANGES = (
+    'INSERT INTO "exchangedataset" ("data", "input_code", "input_database", "output_code", "output_database", "type") '
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+
+SELECT_ACTIVITIES = (
+    'SELECT "data", "code", "database", "location", "name", "product", "type" '
+    'FROM "activitydataset" WHERE "database" IN ({})'
+)
+SELECT_EXCHANGES = (
+    'SELECT "data", "input_code", "input_database", "output_code", "output_database", "type" '
+    'FROM "exchangedataset" WHERE "output_database" IN ({})'
+)
+
+# Exchange fields kept by :func:`extract_brightway2_database`, as by `wurst`
+UNCERTAINTY_FIELDS = ("uncertainty type", "loc", "scale", "shape", "minimum", "maximum", "amount", "pedigree")
+
+# Number of rows fetched from SQLite and unpickled at a time
+FETCH_SIZE = 10000
+
+
+def link_database(data, name):
+    """
+    Rename the database of the datasets of `data` to `name`, and link their exchanges, in place.
+
+    As :func:`wurst.linking.change_db_name`, :func:`wurst.linking.link_internal`,
+    :func:`wurst.linking.check_internal_linking` and :func:`wurst.linking.check_duplicate_codes`
+    would do in turn, but with a single index of the datasets, built once.
+
+    :param data: wurst inventory database
+    :type data: list
+    :param name: name of the new database
+    :type name: str
+    :return: database names the exchanges point to, other than `name`
+    :rtype: set
+    """
+    old_names = {ds["database"] for ds in data}
+    products = {}
+    codes = set()
+
+    for ds in data:
+        if ds["code"] in codes:
+            raise NonuniqueCode("Code {} seen at least twice".format(ds["code"]))
+        codes.add(ds["code"])
+        ds["database"] = name
+        ref = reference_product(ds)
+        products[tuple(ref[f] for f in LINKING_FIELDS)] = (name, ds["code"])
+
+    dependents = set()
+
+    for ds in data:
+        for exc in ds["exchanges"]:
+            if exc.get("input"):
+                if exc["input"][0] in old_names:
+                    exc["input"] = (name, exc["input"][1])
+                    if exc["input"][1] not in codes:
+                        raise InvalidLink(
+                            "Exchange links to non-existent activity:\n{}".format(pformat(exc))
+                        )
+                else:
+                    dependents.add(exc["input"][0])
+                continue
+
+            if exc["type"] == "biosphere":
+                raise ValueError("Unlinked biosphere exchange:\n{}".format(pformat(exc)))
+
+            try:
+                exc["input"] = products[tuple(exc[f] for f in LINKING_FIELDS)]
+            except KeyError:
+                raise KeyError(
+                    "Can't find linking activity for exchange:\n{}".format(pformat(exc))
+                )
+
+    return dependents
+
+
+def as_text(value):
+    """
+    Return `value` as it is stored in the text columns of the brightway2 SQLite tables.
+    """
+    if value is None or isinstance(value, str):
+        return value
+    return str(value)
+
+
+def insert_datasets(data, name):
+    """
+    Insert the datasets of `data` and their exchanges into the brightway2 SQLite database,
+    in one transaction, with the indices of the tables dropped for the time of the insertion.
+
+    :param data: linked wurst inventory database
+    :type data: list
+    :param name: name of the database
+    :type name: str
+    """
+
+    def activity_rows():
+        for ds in data:
+            act = {k: v for k, v in ds.items() if k != "exchanges"}
+            yield (
+                pickle.dumps(act, protocol=pickle.HIGHEST_PROTOCOL),
+                ds["code"],
+                name,
+                as_text(ds.get("location")),
+                as_text(ds.get("name")),
+                as_text(ds.get("reference product")),
+                ds.get("type", "process"),
+            )
+
+    def exchange_rows():
+        for ds in data:
+            key = (name, ds["code"])
+            for exc in ds["exchanges"]:
+                exc["output"] = key
+                yield (
+                    pickle.dumps(exc, protocol=pickle.HIGHEST_PROTOCOL),
+                    exc["input"][1],
+                    exc["input"][0],
+                    key[1],
+                    name,
+                    exc["type"],
+                )
+
+    db = Database(name)
+    db._drop_indices()
+    try:
+        with sqlite3_lci_db.atomic():
+            connection = sqlite3_lci_db.db.connection()
+            connection.executemany(INSERT_ACTIVITIES, activity_rows())
+            connection.executemany(INSERT_EXCHANGES, exchange_rows())
+    finally:
+        db._add_indices()
+
+
+def process_database(data, name):
+    """
+    Write the processed arrays of the database `name`, as :meth:`bw2data.backends.peewee.SQLiteBackend.process`
+    would do, but from the datasets of `data` rather than from the SQLite database.
+
+    :param data: wurst inventory database, as linked by :func:`link_database`
+    :type data: list
+    :param name: name of the database
+    :type name: str
+    """
+    db = Database(name)
+    gl = config.global_location
+
+    geo_rows = [
+        (
+            mapping[(name, ds["code"])],
+            geomapping[ds.get("location") or gl],
+            MAX_INT_32, MAX_INT_32,
+            0, 1, np.NaN, np.NaN, np.NaN, np.NaN, np.NaN, False,
+        )
+        for ds in data
+        if ds.get("type", "process") == "process"
+    ]
+    dtype = db.dtype_fields_geomapping + db.base_uncertainty_fields
+    arr = np.array(geo_rows, dtype=dtype)
+    arr.sort(order=db.dtype_field_order(dtype))
+    np.save(db.filepath_geomapping(), arr, allow_pickle=False)
+
+    rows = []
+    for ds in data:
+        key = (name, ds["code"])
+        output = mapping[key]
+        production_found = False
+
+        for exc in ds["exchanges"]:
+            if "type" not in exc:
+                raise UntypedExchange
+            if "amount" not in exc or "input" not in exc:
+                raise InvalidExchange
+            if exc["type"] == "production":
+                production_found = True
+
+            uncertainty_type = exc.get("uncertainty type", 0)
+            try:
+                rows.append(
+                    (
+                        mapping[exc["input"]],
+                        output,
+                        MAX_INT_32,
+                        MAX_INT_32,
+                        TYPE_DICTIONARY[exc["type"]],
+                        uncertainty_type,
+                        exc["amount"],
+                        exc["amount"] if uncertainty_type in (0, 1) else exc.get("loc", np.NaN),
+                        exc.get("scale", np.NaN),
+                        exc.get("shape", np.NaN),
+                        exc.get("minimum", np.NaN),
+                        exc.get("maximum", np.NaN),
+                        exc["amount"] < 0,
+                    )
+                )
+            except KeyError:
+                raise UnknownObject(
+                    "Exchange between {} and {} is invalid - one of these objects is unknown "
+                    "(i.e. doesn't exist as a process dataset)".format(exc["input"], key)
+                )
+
+        if not production_found and ds.get("type", "process") == "process":
+            rows.append(
+                (
+                    output, output,
+                    MAX_INT_32, MAX_INT_32, TYPE_DICTIONARY["production"],
+                    0, 1, 1, np.NaN, np.NaN, np.NaN, np.NaN, False,
+                )
+            )
+
+    arr = np.array(rows, dtype=db.dtype)
+    invalid = ~np.isfinite(arr["amount"])
+    if invalid.any():
+        raise ValueError("Invalid amount in exchange {}".format(rows[int(np.argmax(invalid))]))
+    arr.sort(order=db.dtype_field_order())
+    np.save(db.filepath_processed(), arr, allow_pickle=False)
+
+
+def write_brightway2_database(data, name):
+    """
+    Write `data` as a new brightway2 database named `name`, in the current project.
+
+    Replaces :func:`wurst.write_brightway2_database`, which it mirrors: datasets are moved to the new
+    database, exchanges without an `input` are linked by name, product, location and unit,
+    and links and codes are checked. The processed arrays and the search index are then built
+    from `data` directly, rather than read back from SQLite, and datasets and exchanges
+    are inserted in bulk into the SQLite backend.
+
+    :param data: wurst inventory database, which is modified in place
+    :type data: list
+    :param name: name of the new database
+    :type name: str
+    """
+    assert name not in databases, "This database already exists"
+
+    # Restore parameters to Brightway2 format which allows for uncertainty and comments
+    for ds in data:
+        if "parameters" in ds:
+            ds["parameters"] = {
+                k: {"amount": v} for k, v in ds["parameters"].items()
+            }
+
+    dependents = link_database(data, name)
+
+    db = Database(name)
+    db.register(format="premise")
+    try:
+        mapping.add((name, ds["code"]) for ds in data)
+        geomapping.add({ds["location"] for ds in data if ds.get("location")})
+        process_database(data, name)
+        insert_datasets(data, name)
+        IndexManager(db.filename).delete_database()
+        IndexManager(db.filename).add_datasets(data)
+    except:
+        del databases[name]
+        raise
+
+    databases[name]["number"] = len(data)
+    databases[name]["searchable"] = True
+    databases[name]["depends"] = sorted(dependents)
+    databases[name]["processed"] = datetime.datetime.now().isoformat()
+    databases.set_modified(name)
+    databases.flush()
+
+    print("Created database: {}".format(name))
+
+
+def list_or_dict(obj):
+    """
+    Yield the parameters of a brightway2 dataset, given as a list, or as a dictionary by name.
+    """
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            cp = copy.deepcopy(value)
+            cp["name"] = key
+            yield cp
+    else:
+        yield from obj
+
+
+def fetch_rows(sql, params):
+    """
+    Run a query on the brightway2 SQLite database of the current project, with a connection of its own,
+    and yield the rows fetched in batches of `FETCH_SIZE`.
+    """
+    connection = sqlite3.connect(sqlite3_lci_db._filepath)
+    try:
+        cursor = connection.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        connection.close()
+
+
+def read_activities(names):
+    """
+    Read the datasets of the databases `names`, without their exchanges, in the format of `wurst`.
+    """
+    activities = []
+    sql = SELECT_ACTIVITIES.format(", ".join("?" * len(names)))
+
+    for data, code, database, location, name, product, kind in fetch_rows(sql, names):
+        data = pickle.loads(data)
+        activities.append(
+            {
+                "classifications": data.get("classifications", []),
+                "comment": data.get("comment", ""),
+                "location": location,
+                "database": database,
+                "code": code,
+                "categories": data.get("categories"),
+                "name": name,
+                "reference product": product,
+                "unit": data.get("unit", ""),
+                "exchanges": [],
+                "parameters": {
+                    p["name"]: p["amount"] for p in list_or_dict(data.get("parameters", []))
+                },
+                "parameters full": list(list_or_dict(data.get("parameters", []))),
+                "type": kind,
+            }
+        )
+    return activities
+
+
+def read_exchanges(names):
+    """
+    Read the exchanges of the datasets of the databases `names`, in the format of `wurst`.
+
+    :return: list of the keys of the datasets the exchanges belong to, and of the exchanges
+    :rtype: list
+    """
+    exchanges = []
+    sql = SELECT_EXCHANGES.format(", ".join("?" * len(names)))
+
+    for data, input_code, input_database, output_code, output_database, kind in fetch_rows(sql, names):
+        data = pickle.loads(data)
+        exc = {key: data[key] for key in UNCERTAINTY_FIELDS if key in data}
+        assert "amount" in exc, "Exchange has no `amount` field"
+        if "uncertainty type" not in exc:
+            exc["uncertainty type"] = 0
+            exc["loc"] = exc["amount"]
+        exc["type"] = kind
+        exc["production volume"] = data.get("production volume")
+        exc["input"] = (input_database, input_code)
+        exchanges.append(((output_database, output_code), exc))
+    return exchanges
+
+
+def read_inputs(keys):
+    """
+    Read the name, product, unit, location and categories of the datasets `keys` of other databases.
+
+    :param keys: (database, code) keys
+    :type keys: set
+    :return: fields, by key
+    :rtype: dict
+    """
+    inputs = {}
+    sql = SELECT_ACTIVITIES.format("?")
+
+    for database in {key[0] for key in keys}:
+        for data, code, _, location, name, product, _ in fetch_rows(sql, [database]):
+            if (database, code) in keys:
+                data = pickle.loads(data)
+                inputs[(database, code)] = {
+                    "name": name,
+                    "product": product,
+                    "unit": data.get("unit"),
+                    "location": location,
+                    "database": database,
+                    "categories": data.get("categories"),
+                }
+    return inputs
+
+
+def extract_brightway2_database(names):
+    """
+    Extract brightway2 databases of the current project, in the format of `wurst`.
+
+    Returns the same datasets as :func:`wurst.extract_brightway2_databases`, but reads the `activitydataset`
+    and `exchangedataset` tables of the SQLite database directly, in batches, instead of through the bw2data ORM.
+    Details of the datasets exchanges point to are looked up in the datasets read,
+    or read at once for each other database.
+
+    :param names: name of a database, or list of names
+    :type names: str or list
+    :return: list of datasets
+    :rtype: list
+    """
+    names = [names] if isinstance(names, str) else list(names)
+    for name in names:
+        if name not in databases or databases[name].get("backend", "sqlite") != "sqlite":
+            raise NameError("{} is not a brightway2 SQLite database".format(name))
+
+    print("Getting activity data")
+    activities = read_activities(names)
+    lookup = {(ds["database"], ds["code"]): ds for ds in activities}
+
+    print("Adding exchange data to activities")
+    for output, exc in read_exchanges(names):
+        lookup[output]["exchanges"].append(exc)
+
+    print("Filling out exchange data")
+    external = set()
+    for ds in activities:
+        for exc in ds["exchanges"]:
+            if exc["input"][0] not in names:
+                external.add(exc["input"])
+                continue
+            obj = lookup[exc["input"]]
+            exc["product"] = obj.get("reference product")
+            exc["name"] = obj.get("name")
+            exc["unit"] = obj.get("unit")
+            exc["location"] = obj.get("location")
+            exc["database"] = obj.get("database")
+            if exc["type"] == "biosphere":
+                exc["categories"] = obj.get("categories")
+            del exc["input"]
+
+    inputs = read_inputs(external)
+    for ds in activities:
+        for exc in ds["exchanges"]:
+            if "input" in exc:
+                fields = inputs[exc["input"]]
+                exc["name"] = fields["name"]
+                exc["product"] = fields["product"]
+                exc["unit"] = fields["unit"]
+                exc["location"] = fields["location"]
+                exc["database"] = fields["database"]
+                if exc["type"] == "biosphere":
+                    exc["categories"] = fields["categories"]
+
+    return activities
@@ -1,8 +1,8 @@
 from .geomap import Geomap
 
 import wurst.searching as ws
-import uuid
-import copy
+from .utils import copy_dataset, get_dataset_code
+from .profiling import profiler
 
 
 class Cars:
@@ -25,6 +25,7 @@ class Cars:
         self.pathway = pathway
         self.year = year
         self.model = model
+        self.suppliers = {}
 
     @staticmethod
     def _create_local_copy(old_act, region):
@@ -32,11 +33,9 @@ class Cars:
         Create a local copy of an activity.
         Update also the production exchange.
         """
-        act = copy.deepcopy(old_act)
-        act.update({
-            "location": region,
-            "code": str(uuid.uuid4().hex)
-        })
+        act = copy_dataset(old_act)
+        act["location"] = region
+        act["code"] = get_dataset_code(act)
 
         # update production exchange
         prods = list(ws.production(
@@ -49,6 +48,7 @@ class Cars:
                 .format(old_act["name"]))
         return act
 
+    @profiler.profile()
     def link_local_electricity_supply(self):
         """Create LDV activities for REMIND regions and relink
         existing electricity exchanges for BEVs and PHEVs
@@ -82,20 +82,56 @@ class Cars:
             except ws.NoResults:
                 pass
 
+    def _index_suppliers(self, names):
+        """
+        Index the datasets which name is in `names` by name and location,
+        in a single pass through the database.
+        Names already indexed are not looked up again: the table is never rebuilt, and assumes
+        that datasets with these names are not added to or removed from :attr:`db` after the first lookup.
+        """
+        missing = set(names) - set(self.suppliers)
+        if not missing:
+            return
+
+        for name in missing:
+            self.suppliers[name] = {}
+
+        for ds in self.db:
+            if ds["name"] in missing:
+                self.suppliers[ds["name"]].setdefault(ds["location"], []).append(ds)
+
+    def _get_supplier(self, name, location=None):
+        """
+        Return the indexed dataset with `name` and, if given, `location`.
+        Like `ws.get_one`, raise an error if there is not exactly one.
+        """
+        self._index_suppliers([name])
+
+        if location is None:
+            producers = [p for locs in self.suppliers[name].values() for p in locs]
+        else:
+            producers = self.suppliers[name].get(location, [])
+
+        if len(producers) == 0:
+            raise ws.NoResults("No dataset found for {} in {}.".format(name, location))
+        if len(producers) > 1:
+            raise ws.MultipleResults("Multiple datasets found for {} in {}.".format(name, location))
+        return producers[0]
+
     def _find_local_supplier(self, region, name):
         """
         Use geomatcher to find a supplier with `name` first strictly
         within the region, then in an intersecting region and
         eventually *any* activity with this name.
         """
+        self._index_suppliers([name])
+
         def producer_in_locations(locs):
 
-            possible_producers = list(ws.get_many(
-                self.db,
-                ws.equals("name", name),
-                ws.either(*[
-                    ws.equals("location", loc) for loc in locs
-                ])))
+            possible_producers = [
+                p for loc in dict.fromkeys(locs)
+                for p in self.suppliers[name].get(loc, [])
+            ]
 
             if len(possible_producers) == 1:
                 selected_producer = possible_producers[0]
@@ -127,9 +163,7 @@ class Cars:
 
             if prod is None:
                 # let's use "any" dataset
-                producers = list(ws.get_many(
-                    self.db,
-                    ws.equals("name", name)))
+                producers = [p for locs in self.suppliers[name].values() for p in locs]
                 if len(producers) == 0:
                     raise ValueError("No producers found for {}.".format(name))
                 prod = producers[0]
@@ -140,69 +174,77 @@ class Cars:
                       .format(name, region, prod["location"]))
         return prod
 
+    @profiler.profile()
     def link_local_liquid_fuel_markets(self):
         """
         Use IAM fuel markets to update the mix of bio-, syn-
         and fossil liquids in gasoline and diesel.
 
+        Suppliers are looked up in a table indexed by name and location,
+        built in a single pass through the database and reused for all regions.
+
         """
+        synfuels = {
+            "diesel": "Diesel, synthetic, from electrolysis-based hydrogen, energy allocation, at fuelling station",
+            "gasoline": "Gasoline, synthetic, from MTG, hydrogen from electrolysis, energy allocation, at fuelling station"
+        }
+
+        self._index_suppliers([
+            "Biodiesel, from used cooking oil, at fuelling station",
+            "Ethanol, from wheat straw pellets, at fuelling station",
+            "market for petrol, low-sulfur",
+            "market group for diesel",
+            *synfuels.values(),
+            *["fuel supply for {} vehicles, {}".format(ftype, self.year) for ftype in ["gasoline", "diesel"]]
+        ])
+
         new_producers = {
             "diesel": {
                 # biodiesel is only from cooking oil from RER,
                 # as this is not the focus for now
                 # to be improved!
-                "Biomass": ws.get_one(
-                    self.db,
-                    ws.equals("name", "Biodiesel, from used cooking oil, at fuelling station"))
+                "Biomass": self._get_supplier(
+                    "Biodiesel, from used cooking oil, at fuelling station")
             },
             "gasoline": {
                 # only ethanol from European wheat straw as biofuel
-                "Biomass": ws.get_one(
-                    self.db,
-                    ws.equals("name", "Ethanol, from wheat straw pellets, at fuelling station"),
-                    ws.equals("location", "RER"))
+                "Biomass": self._get_supplier(
+                    "Ethanol, from wheat straw pellets, at fuelling station", "RER")
             }
         }
 
+        # two regions for gasoline and diesel production
+        fossil_producers = {}
+        for regions, (petrol_loc, diesel_loc) in [
+            ("european", ("Europe without Switzerland", "RER")),
+            ("other", ("RoW", "GLO"))
+        ]:
+            try:
+                fossil_producers[regions] = {
+                    "gasoline": self._get_supplier("market for petrol, low-sulfur", petrol_loc),
+                    "diesel": self._get_supplier("market group for diesel", diesel_loc)
+                }
+            except ws.NoResults:
+                pass
+
         for region in self.iam_data.regions:
             try:
                 supply = {
-                    ftype: ws.get_one(
-                        self.db,
-                        ws.equals("location", region),
-                        ws.equals(
-                            "name", "fuel supply for {} vehicles, {}"
-                            .format(ftype, self.year))) for ftype in ["gasoline", "diesel"]
+                    ftype: self._get_supplier(
+                        "fuel supply for {} vehicles, {}".format(ftype, self.year),
+                        region) for ftype in ["gasoline", "diesel"]
                 }
 
-                # two regions for gasoline and diesel production
-                if region in ("EUR", "NEU", "WEU", "CEU"):
-                    new_producers["gasoline"]["Fossil"] = ws.get_one(
-                        self.db,
-                        ws.equals("name", "market for petrol, low-sulfur"),
-                        ws.equals("location", "Europe without Switzerland"))
-                    new_producers["diesel"]["Fossil"] = ws.get_one(
-                        self.db,
-                        ws.equals("name", "market group for diesel"),
-                        ws.equals("location", "RER"))
-                else:
-                    new_producers["gasoline"]["Fossil"] = ws.get_one(
-                        self.db,
-                        ws.equals("name", "market for petrol, low-sulfur"),
-                        ws.equals("location", "RoW"))
-                    new_producers["diesel"]["Fossil"] = ws.get_one(
-                        self.db,
-                        ws.equals("name", "market group for diesel"),
-                        ws.equals("location", "GLO"))
-
-                # local syndiesel
-                new_producers["diesel"]["Hydrogen"] = self._find_local_supplier(
-                    region,
-                    "Diesel, synthetic, from electrolysis-based hydrogen, energy allocation, at fuelling station")
-
-                new_producers["gasoline"]["Hydrogen"] = self._find_local_supplier(
-                    region,
-                    "Gasoline, synthetic, from MTG, hydrogen from electrolysis, energy allocation, at fuelling station")
+                regions = "european" if region in ("EUR", "NEU", "WEU", "CEU") else "other"
+                if regions not in fossil_producers:
+                    raise ws.NoResults("No fossil fuel markets found for {}.".format(region))
+
+                for ftype in ["gasoline", "diesel"]:
+                    new_producers[ftype]["Fossil"] = fossil_producers[regions][ftype]
+
+                    # local synfuel
+                    new_producers[ftype]["Hydrogen"] = self._find_local_supplier(
+                        region, synfuels[ftype])
 
                 supply_search = {
                     "gasoline": {
@@ -1,5 +1,4 @@
-import copy
-import uuid
+import os
 import numpy as np
 import wurst
 from wurst import searching as ws
@@ -7,6 +6,7 @@ from .activity_maps import InventorySet
 from .geomap import Geomap
 from .utils import *
 from datetime import date
+from .profiling import profiler
 
 class Cement:
     """
@@ -71,9 +71,9 @@ class Cement:
                     ws.equals("location", d_iam_to_eco[d]),
                 )
 
-                d_act[d] = copy.deepcopy(ds)
+                d_act[d] = copy_dataset(ds)
                 d_act[d]["location"] = d
-                d_act[d]["code"] = str(uuid.uuid4().hex)
+                d_act[d]["code"] = get_dataset_code(d_act[d])
 
                 if "input" in d_act[d]:
                     d_act[d].pop("input")
@@ -200,48 +200,32 @@ class Cement:
 
         return dict_act
 
-    def update_pollutant_emissions(self, ds):
+    def update_pollutant_emissions(self, datasets):
         """
         Update pollutant emissions based on GAINS data.
-        :return:
-        """
-
-        # Update biosphere exchanges according to GAINS emission values
-        for exc in ws.biosphere(
-                ds, ws.either(*[ws.contains("name", x) for x in self.emissions_map])
-            ):
-            iam_emission_label = self.emissions_map[exc["name"]]
-
-            try:
-                iam_emission = self.iam_data.cement_emissions.loc[
-                    dict(
-                        region=ds["location"],
-                        pollutant=iam_emission_label
-                    )
-                ].values.item(0)
-            except KeyError:
-                # TODO: fix this.
-                # GAINS does not have a 'World' region, hence we use Europe as a temporary fix
-                iam_emission = self.iam_data.cement_emissions.loc[
-                    dict(
-                        region=self.geo.iam_to_GAINS_region("World"),
-                        pollutant=iam_emission_label
-                    )
-                ].values.item(0)
+        GAINS does not have a 'World' region, hence the 'World' GAINS region (Europe) is used
+        for datasets which region is not covered.
 
+        :param datasets: list of cement or clinker production datasets, located in IAM regions
+        :type datasets: list
+        :return: the updated datasets
+        :rtype: list
+        """
 
-            if exc["amount"] == 0:
-                wurst.rescale_exchange(
-                    exc, iam_emission / 1, remove_uncertainty=True
-                )
-            else:
-                wurst.rescale_exchange(exc, iam_emission / exc["amount"])
-        return ds
+        return rescale_pollutant_emissions(
+            datasets,
+            self.iam_data.cement_emissions,
+            self.emissions_map,
+            regions=[ds["location"] for ds in datasets],
+            # TODO: fix this.
+            fallback_region=self.geo.iam_to_GAINS_region("World"),
+        )
 
     def build_clinker_market_datasets(self):
         # Fetch clinker market activities and store them in a dictionary
         return self.fetch_proxies('market for clinker', 'clinker')
 
+    @profiler.profile()
     def build_clinker_production_datasets(self):
         """
         Builds clinker production datasets for each IAM region.
@@ -260,101 +244,84 @@ class Cement:
         # Remove fuel and electricity exchanges in each activity
         d_act_clinker = self.remove_exchanges(d_act_clinker, list_fuels)
 
-        for k, v in d_act_clinker.items():
-            # Production volume by kiln type
-            energy_input_per_kiln_type = self.iam_data.gnr_data.sel(
-                region=self.geo.iam_to_iam_region(k) if self.model == "image" else k,
-                variables=[
-                    v
-                    for v in self.iam_data.gnr_data.variables.values
-                    if "Production volume share" in v
-                ]
-            ).clip(0, 1)
-            # Energy input per ton of clinker, in MJ, per kiln type
-            energy_input_per_kiln_type /= energy_input_per_kiln_type.sum(axis=0)
-
-            energy_eff_per_kiln_type = self.iam_data.gnr_data.sel(
-                region=self.geo.iam_to_iam_region(k) if self.model == "image" else k,
-                variables=[
-                    v
-                    for v in self.iam_data.gnr_data.variables.values
-                    if "Thermal energy consumption" in v
-                ]
-            )
-
-            # Weighted average energy input per ton clinker, in MJ
-            energy_input_per_ton_clinker = (
-                    energy_input_per_kiln_type.values * energy_eff_per_kiln_type.values
-            )
-
-            # Fuel mix (waste, biomass, fossil)
-            fuel_mix = self.iam_data.gnr_data.sel(
-                variables=[
-                    "Share waste fuel",
-                    "Share biomass fuel",
-                    "Share fossil fuel",
-                ],
-                region=self.geo.iam_to_iam_region(k) if self.model == "image" else k
-            ).clip(0, 1)
-
-            fuel_mix /= fuel_mix.sum(axis=0)
-
-            # Calculate quantities (in kg) of fuel, per type of fuel, per ton of clinker
-            # MJ per ton of clinker * fuel mix * (1 / lower heating value)
-            fuel_qty_per_type = (
-                    energy_input_per_ton_clinker.sum()
-                    * fuel_mix
-                    * 1
-                    / np.array(
-                [
-                    float(self.fuels_lhv["waste"]),
-                    float(self.fuels_lhv["wood pellet"]),
-                    float(self.fuels_lhv["hard coal"]),
-                ]
-            )
-            )
+        # GNR data is given for REMIND regions
+        gnr_regions = [
+            self.geo.iam_to_iam_region(k) if self.model == "image" else k
+            for k in d_act_clinker
+        ]
+        gnr_data = self.iam_data.gnr_data.sel(region=gnr_regions).transpose("region", "variables")
+
+        # Production volume share, per region and per kiln type
+        share_per_kiln_type = gnr_data.sel(
+            variables=[
+                v
+                for v in gnr_data.variables.values
+                if "Production volume share" in v
+            ]
+        ).clip(0, 1).values
+        share_per_kiln_type /= share_per_kiln_type.sum(axis=1)[:, None]
+
+        # Energy input per ton of clinker, in MJ, per region and per kiln type
+        energy_eff_per_kiln_type = gnr_data.sel(
+            variables=[
+                v
+                for v in gnr_data.variables.values
+                if "Thermal energy consumption" in v
+            ]
+        ).values
+
+        # Weighted average energy input per ton clinker, in MJ, per region
+        energy_input_per_ton_clinker = (share_per_kiln_type * energy_eff_per_kiln_type).sum(axis=1)
+
+        # Fuel mix (waste, biomass, fossil), per region
+        fuel_mix = gnr_data.sel(
+            variables=[
+                "Share waste fuel",
+                "Share biomass fuel",
+                "Share fossil fuel",
+            ]
+        ).clip(0, 1).values
+        fuel_mix /= fuel_mix.sum(axis=1)[:, None]
+
+        fuels = ["waste", "wood pellet", "hard coal"]
+
+        # MJ of each type of fuel per ton of clinker, per region
+        fuel_energy_per_type = energy_input_per_ton_clinker[:, None] * fuel_mix
+
+        # Calculate quantities (in kg) of fuel, per type of fuel, per ton of clinker
+        # MJ per ton of clinker * fuel mix * (1 / lower heating value)
+        fuel_qty_per_type = fuel_energy_per_type / np.array(
+            [float(self.fuels_lhv[f]) for f in fuels]
+        )
+
+        fuel_fossil_co2_per_type = fuel_energy_per_type * np.array(
+            [self.fuels_co2[f]["co2"] * (1 - self.fuels_co2[f]["bio_share"]) for f in fuels]
+        )
+
+        fuel_biogenic_co2_per_type = fuel_energy_per_type * np.array(
+            [self.fuels_co2[f]["co2"] * self.fuels_co2[f]["bio_share"] for f in fuels]
+        )
+
+        # Carbon capture rate: share of total CO2 captured, per region
+        # Note: only if variables exist in IAM data
+        if all(x in self.iam_data.data.variables.values
+               for x in ['Emi|CCO2|FFaI|Industry|Cement',
+                         'Emi|CO2|FFaI|Industry|Cement']):
+            iam_emissions = self.iam_data.data.sel(
+                variables=['Emi|CCO2|FFaI|Industry|Cement', 'Emi|CO2|FFaI|Industry|Cement'],
+                region=gnr_regions
+            ).interp(year=self.year).transpose("region", "variables").values
+            with np.errstate(divide="ignore", invalid="ignore"):
+                carbon_capture_rate = np.nan_to_num(iam_emissions[:, 0] / iam_emissions[:, 1])
+        else:
+            carbon_capture_rate = np.zeros(len(gnr_regions))
 
-            fuel_fossil_co2_per_type = (
-                    energy_input_per_ton_clinker.sum()
-                    * fuel_mix
-                    * np.array(
-                [
-                    (
-                            self.fuels_co2["waste"]["co2"]
-                            * (1 - self.fuels_co2["waste"]["bio_share"])
-                    ),
-                    (
-                            self.fuels_co2["wood pellet"]["co2"]
-                            * (1 - self.fuels_co2["wood pellet"]["bio_share"])
-                    ),
-                    (
-                            self.fuels_co2["hard coal"]["co2"]
-                            * (1 - self.fuels_co2["hard coal"]["bio_share"])
-                    ),
-                ]
-            )
-            )
+        # Heat recovered on site, in MJ per ton of clinker, per region
+        excess_heat_generation = gnr_data.sel(
+            variables='Share of recovered energy, per ton clinker'
+        ).values * energy_input_per_ton_clinker
 
-            fuel_biogenic_co2_per_type = (
-                    energy_input_per_ton_clinker.sum()
-                    * fuel_mix
-                    * np.array(
-                    [
-                        (
-                                self.fuels_co2["waste"]["co2"]
-                                * (self.fuels_co2["waste"]["bio_share"])
-                        ),
-                        (
-                                self.fuels_co2["wood pellet"]["co2"]
-                                * (self.fuels_co2["wood pellet"]["bio_share"])
-                        ),
-                        (
-                                self.fuels_co2["hard coal"]["co2"]
-                                * (self.fuels_co2["hard coal"]["bio_share"])
-                        ),
-                    ]
-                )
-            )
+        for r, (k, v) in enumerate(d_act_clinker.items()):
 
             for f, fuel in enumerate([('waste', 'waste plastic, mixture'),
                          ('wood pellet', 'wood pellet, measured as dry mass'),
@@ -380,7 +347,7 @@ class Cement:
                         {
                             "uncertainty type": 0,
                             "loc": 1,
-                            "amount": (fuel_suppliers[supplier] * fuel_qty_per_type[f].values) / 1000,
+                            "amount": (fuel_suppliers[supplier] * fuel_qty_per_type[r, f]) / 1000,
                             "type": "technosphere",
                             "production volume": 0,
                             "product": supplier[2],
@@ -393,28 +360,14 @@ class Cement:
 
             v['exchanges'] = [v for v in v["exchanges"] if v]
 
-            # Add carbon capture-related energy exchanges
-            # Carbon capture rate: share of total CO2 captured
-            # Note: only if variables exist in IAM data
-            if all(x in self.iam_data.data.variables.values
-                   for x in ['Emi|CCO2|FFaI|Industry|Cement',
-                             'Emi|CO2|FFaI|Industry|Cement']):
-                carbon_capture_rate = (self.iam_data.data.sel(
-                    variables='Emi|CCO2|FFaI|Industry|Cement',
-                    region=self.geo.iam_to_iam_region(k) if self.model == "image" else k
-                ).interp(year=self.year) / self.iam_data.data.sel(
-                    variables='Emi|CO2|FFaI|Industry|Cement',
-                    region=self.geo.iam_to_iam_region(k) if self.model == "image" else k
-                ).interp(year=self.year)).values
-            else:
-                carbon_capture_rate = 0
+            fossil_co2 = fuel_fossil_co2_per_type[r].sum()
+            biogenic_co2 = fuel_biogenic_co2_per_type[r].sum()
 
-            if carbon_capture_rate > 0:
+            # Add carbon capture-related energy exchanges
+            if carbon_capture_rate[r] > 0:
 
                 # CO2 effectively captured per kg of clinker
-                carbon_capture_abs = carbon_capture_rate * ((fuel_biogenic_co2_per_type.sum().values
-                                                             + fuel_fossil_co2_per_type.sum().values + 525)
-                                                            / 1000)
+                carbon_capture_abs = carbon_capture_rate[r] * ((biogenic_co2 + fossil_co2 + 525) / 1000)
 
                 # Electricity: 0.024 kWh/kg CO2 for capture, 0.146 kWh/kg CO2 for compression
                 carbon_capture_electricity = carbon_capture_abs * (0.146 + 0.024)
@@ -434,12 +387,7 @@ class Cement:
 
 
                 # Heat, as steam: 3.48 MJ/kg CO2 captured, minus excess heat generated on site
-                excess_heat_generation = self.iam_data.gnr_data.sel(
-                    variables='Share of recovered energy, per ton clinker',
-                    region=self.geo.iam_to_iam_region(k) if self.model == "image" else k
-                ).values * energy_input_per_ton_clinker.sum()
-
-                carbon_capture_heat = (carbon_capture_abs * 3.48) - (excess_heat_generation / 1000)
+                carbon_capture_heat = (carbon_capture_abs * 3.48) - (excess_heat_generation[r] / 1000)
 
                 new_exchanges.append(
                             {
@@ -459,20 +407,20 @@ class Cement:
 
             # Update fossil CO2 exchange, add 525 kg of fossil CO_2 from calcination, minus CO2 captured
             fossil_co2_exc = [e for e in v["exchanges"] if e['name'] == 'Carbon dioxide, fossil'][0]
-            fossil_co2_exc['amount'] = ((fuel_fossil_co2_per_type.sum().values + 525) / 1000) * (1 - carbon_capture_rate)
+            fossil_co2_exc['amount'] = ((fossil_co2 + 525) / 1000) * (1 - carbon_capture_rate[r])
             fossil_co2_exc['uncertainty type'] = 0
 
             try:
                 # Update biogenic CO2 exchange, minus CO2 captured
                 biogenic_co2_exc = [e for e in v["exchanges"] if e['name'] == 'Carbon dioxide, non-fossil'][0]
-                biogenic_co2_exc['amount'] = (fuel_biogenic_co2_per_type.sum().values / 1000) * (1 - carbon_capture_rate)
+                biogenic_co2_exc['amount'] = (biogenic_co2 / 1000) * (1 - carbon_capture_rate[r])
                 biogenic_co2_exc['uncertainty type'] = 0
             except IndexError:
                 # There isn't a biogenic CO2 emissions exchange
                 biogenic_co2_exc = {
                     "uncertainty type": 0,
                     "loc": 1,
-                    "amount": (fuel_biogenic_co2_per_type.sum().values / 1000) * (1 - carbon_capture_rate),
+                    "amount": (biogenic_co2 / 1000) * (1 - carbon_capture_rate[r]),
                     "type": "biosphere",
                     "production volume": 0,
                     "name": "Carbon dioxide, non-fossil",
@@ -490,19 +438,19 @@ class Cement:
                         "WARNING: Dataset modified by `premise` based on WBCSD's GNR data and IEA roadmap " +
                         " for the cement industry.\n" +
                         "Calculated energy input per kg clinker: {} MJ/kg clinker.\n".format(
-                            np.round(energy_input_per_ton_clinker.sum(), 1) / 1000) +
-                        "Share of biomass fuel energy-wise: {} pct.\n".format(int(fuel_mix[1] * 100)) +
-                        "Share of waste fuel energy-wise: {} pct.\n".format(int(fuel_mix[0] * 100)) +
+                            np.round(energy_input_per_ton_clinker[r], 1) / 1000) +
+                        "Share of biomass fuel energy-wise: {} pct.\n".format(int(fuel_mix[r, 1] * 100)) +
+                        "Share of waste fuel energy-wise: {} pct.\n".format(int(fuel_mix[r, 0] * 100)) +
                         "Share of fossil carbon in waste fuel energy-wise: {} pct.\n".format(int(self.fuels_co2["waste"]["bio_share"] * 100)) +
                         "Share of fossil CO2 emissions from fuel combustion: {} pct.\n".format(int(
-                            (fuel_fossil_co2_per_type.sum() / np.sum(fuel_fossil_co2_per_type.sum() + 525)) * 100)) +
+                            (fossil_co2 / (fossil_co2 + 525)) * 100)) +
                         "Share of fossil CO2 emissions from calcination: {} pct.\n".format(100 - int(
-                            (fuel_fossil_co2_per_type.sum() / np.sum(fuel_fossil_co2_per_type.sum() + 525)) * 100)) +
-                        "Rate of carbon capture: {} pct.\n".format(int(carbon_capture_rate * 100))
+                            (fossil_co2 / (fossil_co2 + 525)) * 100)) +
+                        "Rate of carbon capture: {} pct.\n".format(int(carbon_capture_rate[r] * 100))
                         ) + v["comment"]
 
         # TODO: not sure about the GAINS unit. Check first.
-        #d_act_clinker = {k:self.update_pollutant_emissions(v) for k,v in d_act_clinker.items()}
+        #self.update_pollutant_emissions(list(d_act_clinker.values()))
 
         return d_act_clinker
 
@@ -552,60 +500,53 @@ class Cement:
         """ Adjust the cement suppliers composition for "cement, unspecified", in order to reach
         the average clinker-to-cement ratio given by the IAM.
 
-        The supply of the cement with the highest clinker-to-cement ratio is decreased by 1% to the favor of
-        the supply of the cement with the lowest clinker-to-cement ratio, and the average clinker-to-cement ratio
-        is calculated.
-
-        This operation is repeated until the average clinker-to-cement ratio aligns with that given by the IAM.
-        When the supply of the cement with the highest clinker-to-cement ratio goes below 1%,
+        The supply of the cements with the highest clinker-to-cement ratio is shifted to the favor of
+        the cement with the lowest clinker-to-cement ratio, until the average clinker-to-cement ratio
+        aligns with that given by the IAM.
+        When the supply of the cement with the highest clinker-to-cement ratio is exhausted,
         the cement with the second highest clinker-to-cement ratio becomes affected and so forth.
 
-        """
-
-        for d in d_act:
-
-            ratio_to_reach = self.clinker_ratio_remind.sel(dict(
-                region=self.geo.iam_to_iam_region(d) if self.model == "image" else d
-            )).values
-
-            share = []
-            ratio = []
-
-            for exc in d_act[d]['exchanges']:
-                if 'cement' in exc['product'] and exc['type'] == "technosphere":
-                    share.append(exc['amount'])
-                    ratio.append(self.clinker_ratio_eco[(exc['name'], exc['location'])])
+        All IAM regions are solved at once, as a (region x cement type) matrix,
+        by :func:`premise.utils.adjust_clinker_shares`.
 
-            share = np.array(share)
-            ratio = np.array(ratio)
+        """
 
-            average_ratio = (share * ratio).sum()
+        regions = list(d_act.keys())
 
-            iteration = 0
-            while average_ratio > ratio_to_reach and iteration < 100:
-                share[share == 0] = np.nan
+        cement_exchanges = [
+            [
+                exc for exc in d_act[d]['exchanges']
+                if 'cement' in exc['product'] and exc['type'] == "technosphere"
+            ]
+            for d in regions
+        ]
 
-                ratio = np.where(share >= 0.001, ratio, np.nan)
+        n_cements = max([len(excs) for excs in cement_exchanges], default=0)
 
-                highest_ratio = np.nanargmax(ratio)
-                lowest_ratio = np.nanargmin(ratio)
+        share = np.zeros((len(regions), n_cements))
+        ratio = np.full((len(regions), n_cements), np.nan)
 
-                share[highest_ratio] -= .01
-                share[lowest_ratio] += .01
+        for r, excs in enumerate(cement_exchanges):
+            for c, exc in enumerate(excs):
+                share[r, c] = exc['amount']
+                ratio[r, c] = self.clinker_ratio_eco[(exc['name'], exc['location'])]
 
-                average_ratio = (np.nan_to_num(ratio) * np.nan_to_num(share)).sum()
-                iteration += 1
+        ratio_to_reach = np.array([
+            self.clinker_ratio_remind.sel(dict(
+                region=self.geo.iam_to_iam_region(d) if self.model == "image" else d
+            )).values.item(0)
+            for d in regions
+        ])
 
-            share = np.nan_to_num(share)
+        share = adjust_clinker_shares(share, ratio, ratio_to_reach)
 
-            count = 0
-            for exc in d_act[d]['exchanges']:
-                if 'cement' in exc['product'] and exc['type'] == "technosphere":
-                    exc['amount'] = share[count]
-                    count += 1
+        for r, excs in enumerate(cement_exchanges):
+            for c, exc in enumerate(excs):
+                exc['amount'] = share[r, c]
 
         return d_act
 
+    @profiler.profile()
     def update_cement_production_datasets(self, name, ref_prod):
         """
         Update electricity use (mainly for grinding).
@@ -691,6 +632,7 @@ class Cement:
 
         return d_act
 
+    @profiler.profile()
     def add_datasets_to_database(self):
 
         print("\nStart integration of cement data...\n")
@@ -701,6 +643,9 @@ class Cement:
         print('Log of deleted cement datasets saved in {}'.format(DATA_DIR / 'logs'))
         print('Log of created cement datasets saved in {}'.format(DATA_DIR / 'logs'))
 
+        if not os.path.exists(DATA_DIR / "logs"):
+            os.makedirs(DATA_DIR / "logs")
+
         with open(DATA_DIR / "logs/log deleted cement datasets {} {} {}-{}.csv".format(
                 self.model, self.scenario, self.year, date.today()
             ), "w") as csv_file:
@@ -0,0 +1,122 @@
+from . import DATA_DIR, __version__
+from pathlib import Path
+import hashlib
+import pickle
+
+# Data files read by each transformation step, on top of the files at the root of `DATA_DIR`
+STEP_INPUTS = {
+    "update_electricity": [DATA_DIR / "electricity", DATA_DIR / "GAINS_emission_factors"],
+    "update_cement": [DATA_DIR / "cement", DATA_DIR / "GAINS_emission_factors"],
+    "update_steel": [DATA_DIR / "steel", DATA_DIR / "GAINS_emission_factors"],
+    "update_solar_PV": [DATA_DIR / "renewables"],
+    "update_cars": [],
+    "update_trucks": [],
+}
+
+_files_hashes = {}
+
+
+def get_file_hash(filepath):
+    """
+    Return the SHA-256 hash of a file's content.
+    Hashes are kept for the rest of the process, as long as the file modification time does not change.
+
+    :param filepath: path to a file
+    :type filepath: pathlib.Path
+    :return: hexadecimal hash
+    :rtype: str
+    """
+    filepath = Path(filepath)
+    key = (str(filepath), filepath.stat().st_mtime)
+
+    if key not in _files_hashes:
+        sha = hashlib.sha256()
+        with open(filepath, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+        _files_hashes[key] = sha.hexdigest()
+
+    return _files_hashes[key]
+
+
+def get_hash(*items):
+    """
+    Return a hash of `items`. Paths to existing files or directories are hashed by their content,
+    directories recursively. Other items are hashed by their representation.
+
+    :return: hexadecimal hash
+    :rtype: str
+    """
+    sha = hashlib.sha256()
+
+    for item in items:
+        if isinstance(item, Path) and item.is_dir():
+            for f in sorted(p for p in item.rglob("*") if p.is_file()):
+                sha.update(str(f.relative_to(item)).encode())
+                sha.update(get_file_hash(f).encode())
+        elif isinstance(item, Path) and item.is_file():
+            sha.update(get_file_hash(item).encode())
+        else:
+            sha.update(repr(item).encode())
+
+    return sha.hexdigest()
+
+
+def get_step_key(previous_key, step, scenario):
+    """
+    Return the key of the checkpoint taken after a transformation step.
+    It depends on the key of the previous checkpoint, on the premise version,
+    and on the data files read by the step.
+
+    :param previous_key: key of the previous checkpoint
+    :type previous_key: str
+    :param step: name of the transformation step, e.g., `update_cement`
+    :type step: str
+    :param scenario: scenario dictionary, from :attr:`.NewDatabase.scenarios`
+    :type scenario: dict
+    :return: hexadecimal key
+    :rtype: str
+    """
+    inputs = [
+        *sorted(p for p in DATA_DIR.iterdir() if p.is_file()),
+        *STEP_INPUTS.get(step, []),
+    ]
+
+    fleet = {
+        "update_cars": scenario.get("passenger cars"),
+        "update_trucks": scenario.get("trucks"),
+    }.get(step)
+
+    if fleet:
+        inputs.extend([sorted((k, str(v)) for k, v in fleet.items()), Path(fleet["fleet file"])])
+
+    return get_hash(previous_key, __version__, step, *inputs)
+
+
+def save_checkpoint(filepath, db):
+    """
+    Save a database to a checkpoint file.
+
+    :param filepath: path to the checkpoint file
+    :type filepath: pathlib.Path
+    :param db: database
+    :type db: list
+    """
+    tmp_filepath = filepath.with_name(filepath.name + ".tmp")
+    with open(tmp_filepath, "wb") as f:
+        pickle.dump(db, f, protocol=pickle.HIGHEST_PROTOCOL)
+    # Only complete checkpoints are given their final name
+    tmp_filepath.replace(filepath)
+
+
+def load_checkpoint(filepath):
+    """
+    Load a database from a checkpoint file.
+
+    :param filepath: path to the checkpoint file
+    :type filepath: pathlib.Path
+    :return: database
+    :rtype: list
+    """
+    with open(filepath, "rb") as f:
+        return pickle.load(f)
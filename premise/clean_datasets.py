@@ -1,15 +1,135 @@
 from . import DATA_DIR
+from .data_registry import registry
 
 from wurst import searching as ws
 import csv
-import pprint
+import multiprocessing
+import os
 import wurst
 import bw2io
+from bw2io import strategies
+from bw2io.extractors.ecospold2 import Ecospold2DataExtractor
 from bw2data.database import DatabaseChooser
+from .brightway import extract_brightway2_database
+from .profiling import profiler
+from .utils import intern_strings
 
 FILEPATH_FIX_NAMES = (DATA_DIR / "fix_names.csv")
 FILEPATH_BIOSPHERE_FLOWS = (DATA_DIR / "dict_biosphere.txt")
 
+# Import strategies which only look at one dataset at a time, and do not need the current brightway project.
+# They can be applied in the worker processes, to each batch of extracted datasets.
+DATASET_STRATEGIES = (
+    strategies.normalize_units,
+    strategies.update_ecoinvent_locations,
+    strategies.remove_zero_amount_coproducts,
+    strategies.remove_zero_amount_inputs_with_no_activity,
+    strategies.remove_unnamed_parameters,
+    strategies.es2_assign_only_product_with_amount_as_reference_product,
+    strategies.assign_single_product_as_activity,
+    strategies.create_composite_code,
+    strategies.drop_unspecified_subcategories,
+)
+
+
+def extract_ecospold_files(dirpath, filenames, db_name, dataset_strategies):
+    """
+    Extract a batch of ecospold2 files, and apply import strategies to the extracted datasets.
+    Executed by the worker processes of :class:`ParallelEcospold2Importer`.
+
+    :param dirpath: directory of the ecospold2 files
+    :type dirpath: str
+    :param filenames: names of the files to extract
+    :type filenames: list
+    :param db_name: name of the database
+    :type db_name: str
+    :param dataset_strategies: import strategies to apply
+    :type dataset_strategies: list
+    :return: list of datasets
+    :rtype: list
+    """
+    data = [
+        Ecospold2DataExtractor.extract_activity(dirpath, filename, db_name)
+        for filename in filenames
+    ]
+    for strategy in dataset_strategies:
+        data = strategy(data)
+    return data
+
+
+class ParallelEcospold2Importer(bw2io.SingleOutputEcospold2Importer):
+    """
+    Importer for ecospold2 files, which extracts the files in batches across a pool of processes.
+
+    The leading strategies of the importer which only look at one dataset at a time (see `DATASET_STRATEGIES`)
+    are applied in the worker processes, to each batch. The other strategies (e.g., linking) are left
+    in :attr:`strategies`, to be applied with :meth:`apply_strategies` as with `bw2io.SingleOutputEcospold2Importer`.
+    Datasets are returned in the order of their file names.
+
+    :ivar processes: number of processes. If None, the number of CPUs. If 1, the files are extracted in this process.
+    :vartype processes: int
+    :ivar batch_size: number of files extracted by a process at a time
+    :vartype batch_size: int
+
+    """
+
+    def __init__(self, dirpath, db_name, processes=None, batch_size=100):
+        self.processes = processes
+        self.batch_size = batch_size
+        # `SingleOutputEcospold2Importer.__init__` sets the strategies, then calls `self.extract()`
+        super().__init__(dirpath, db_name, extractor=self)
+
+    def extract(self, dirpath, db_name, use_mp=True):
+        """
+        Extract the ecospold2 files of `dirpath`.
+
+        :param dirpath: directory of the ecospold2 files, or path to one file
+        :type dirpath: str
+        :param db_name: name of the database
+        :type db_name: str
+        :param use_mp: if False, the files are extracted in this process
+        :type use_mp: bool
+        :return: list of datasets
+        :rtype: list
+        """
+        if os.path.isdir(dirpath):
+            filenames = sorted(
+                filename
+                for filename in os.listdir(dirpath)
+                if os.path.isfile(os.path.join(dirpath, filename))
+                and filename.split(".")[-1].lower() == "spold"
+            )
+        elif os.path.isfile(dirpath):
+            dirpath, filenames = os.path.split(dirpath)
+            filenames = [filenames]
+        else:
+            raise FileNotFoundError("Can't find the ecospold2 files in {}".format(dirpath))
+
+        n_strategies = 0
+        while (
+            n_strategies < len(self.strategies)
+            and self.strategies[n_strategies] in DATASET_STRATEGIES
+        ):
+            n_strategies += 1
+        dataset_strategies = self.strategies[:n_strategies]
+        self.strategies = self.strategies[n_strategies:]
+
+        batches = [
+            filenames[i : i + self.batch_size]
+            for i in range(0, len(filenames), self.batch_size)
+        ]
+        args = [(dirpath, batch, db_name, dataset_strategies) for batch in batches]
+
+        print("Extracting XML data from {} datasets".format(len(filenames)))
+        if not use_mp or self.processes == 1 or len(batches) < 2:
+            results = [extract_ecospold_files(*a) for a in args]
+        else:
+            processes = min(self.processes or multiprocessing.cpu_count(), len(batches))
+            with multiprocessing.Pool(processes=processes) as pool:
+                results = pool.starmap(extract_ecospold_files, args)
+
+        return [ds for batch in results for ds in batch]
+
 
 class DatabaseCleaner:
     """
@@ -22,28 +142,39 @@ class DatabaseCleaner:
     :vartype source_db: str
     :ivar source_file_path: filepath of the database if `source_type` == 'ecospold'.
     :vartype source_file_path: str
+    :ivar processes: number of processes to extract the ecospold2 files with, if `source_type` == 'ecospold'.
+        If None, the number of CPUs.
+    :vartype processes: int
+    :ivar unresolved_locations: technosphere exchanges which location could not be set,
+        grouped by name and unit, with the locations found and the datasets they belong to.
+    :vartype unresolved_locations: list
 
     """
 
-    def __init__(self, source_db, source_type, source_file_path):
+    def __init__(self, source_db, source_type, source_file_path, processes=None):
+
+        self.unresolved_locations = []
+        # Cleaning rules specific to the source, applied with the others by :meth:`prepare_datasets`
+        self.dataset_rules = []
+        self.exchange_rules = []
 
         if source_type == 'brightway':
             # Check that database exists
             if len(DatabaseChooser(source_db)) == 0:
                 raise NameError('The database selected is empty. Make sure the name is correct')
-            self.db = wurst.extract_brightway2_databases(source_db)
+            self.db = extract_brightway2_database(source_db)
 
         if source_type == 'ecospold':
             # The ecospold data needs to be formatted
-            ei = bw2io.SingleOutputEcospold2Importer(source_file_path, source_db)
+            ei = ParallelEcospold2Importer(source_file_path, source_db, processes=processes)
             ei.apply_strategies()
             self.db = ei.data
+            # Parameter field is converted from a list to a dictionary
+            self.dataset_rules.append(self.transform_dataset_parameter_field)
             # Location field is added to exchanges
-            self.add_location_field_to_exchanges()
+            self.exchange_rules.append(self.set_exchange_location_from_input)
             # Product field is added to exchanges
-            self.add_product_field_to_exchanges()
-            # Parameter field is converted from a list to a dictionary
-            self.transform_parameter_field()
+            self.exchange_rules.append(self.set_exchange_product_and_name)
 
     def add_negative_CO2_flows_for_biomass_ccs(self):
         """
@@ -62,6 +193,7 @@ class DatabaseCleaner:
                 wurst.rescale_exchange(exc, (0.9 / -0.1), remove_uncertainty=True)
 
     @staticmethod
+    @registry.memoize(FILEPATH_FIX_NAMES)
     def get_fix_names_dict():
         """
         Loads a csv file into a dictionary. This dictionary contains a few location names
@@ -92,9 +224,9 @@ class DatabaseCleaner:
         :type db: list
 
         """
-        exists = lambda x: {k: v for k, v in x.items() if v is not None}
         for ds in db:
-            ds["exchanges"] = [exists(exc) for exc in ds["exchanges"]]
+            for exc in ds["exchanges"]:
+                DatabaseCleaner.remove_none_values(ds, exc)
 
     def find_product_given_lookup_dict(self, lookup_dict):
         """
@@ -113,23 +245,6 @@ class DatabaseCleaner:
             )
         ]
 
-    def find_location_given_lookup_dict(self, lookup_dict):
-        """
-        Return a list of location names, given the filtering conditions given in `lookup_dict`.
-        It is, for example, used to return a list of location names based on the name and the unit of a dataset.
-
-
-        :param lookup_dict: a dictionary with filtering conditions
-        :return: a list of location names
-        :rtype: list
-        """
-        return [
-            x["location"]
-            for x in wurst.searching.get_many(
-                self.db, *[ws.equals(k, v) for k, v in lookup_dict.items()]
-            )
-        ]
-
     def add_location_field_to_exchanges(self):
         """Add the `location` key to the production and
         technosphere exchanges in :attr:`db`.
@@ -137,12 +252,7 @@ class DatabaseCleaner:
         :raises IndexError: if no corresponding activity (and reference product) can be found.
 
         """
-        d_location = {(a['database'], a['code']): a['location'] for a in self.db}
-        for a in self.db:
-            for e in a['exchanges']:
-                if e['type'] == 'technosphere':
-                    exc_input = e['input']
-                    e['location'] = d_location[exc_input]
+        self.apply_rules(exchange_rules=[self.set_exchange_location_from_input])
 
     def add_product_field_to_exchanges(self):
         """Add the `product` key to the production and
@@ -155,41 +265,12 @@ class DatabaseCleaner:
         :raises IndexError: if no corresponding activity (and reference product) can be found.
 
         """
-        # Create a dictionary that contains the 'code' field as key and the 'product' field as value
-        d_product = {a['code']: (a['reference product'], a['name']) for a in self.db}
-        # Add a `product` field to the production exchange
-        for x in self.db:
-            for y in x["exchanges"]:
-                if y["type"] == "production":
-                    if "product" not in y:
-                        y["product"] = x["reference product"]
-
-                    if y["name"] != x["name"]:
-                        y["name"] = x["name"]
-
-        # Add a `product` field to technosphere exchanges
-        for x in self.db:
-            for y in x["exchanges"]:
-                if y["type"] == "technosphere":
-                    # Check if the field 'product' is present
-                    if 'product' not in y:
-                        y['product'] = d_product[y['input'][1]][0]
-
-                    # If a 'reference product' field is present, we make sure it matches with the new 'product' field
-                    if 'reference product' in y:
-                        try:
-                            assert y['product'] == y['reference product']
-                        except AssertionError:
-                            y['product'] = d_product[y['input'][1]][0]
-
-                    # Ensure the name is correct
-                    y['name'] = d_product[y['input'][1]][1]
+        self.apply_rules(exchange_rules=[self.set_exchange_product_and_name])
 
     def transform_parameter_field(self):
         # When handling ecospold files directly, the parameter field is a list.
         # It is here transformed into a dictionary
-        for x in self.db:
-            x['parameters'] = {k['name']: k['amount'] for k in x['parameters']}
+        self.apply_rules(dataset_rules=[self.transform_dataset_parameter_field])
 
     # Functions to clean up Wurst import and additional technologies
     def fix_unset_technosphere_and_production_exchange_locations(
@@ -200,30 +281,190 @@ class DatabaseCleaner:
         they belong to.
         Modifies in place (does not return anything).
 
+        Technosphere exchanges are given the location of the only dataset with the same `matching_fields`.
+        Exchanges for which no dataset, or several, are found are left as they are,
+        and listed in :attr:`unresolved_locations`.
+
         :param matching_fields: filter conditions
         :type matching_fields: tuple
 
         """
+        self.apply_rules(
+            exchange_rules=[self.set_unset_exchange_location],
+            matching_fields=matching_fields,
+        )
+
+    def apply_rules(self, dataset_rules=(), exchange_rules=(), matching_fields=("name", "unit")):
+        """
+        Apply cleaning rules to :attr:`db`, traversing its exchanges only once, whatever the number of rules.
+
+        Dataset rules are called as `rule(ds)`, on each dataset. In the same pass over datasets,
+        the lookup dictionaries shared by exchange rules are built (see :meth:`build_lookups`).
+        Exchange rules are then called as `rule(ds, exc)`, on each exchange, in the order given.
+        A new cleaning step is therefore added as a rule, rather than as a new pass over the database.
+        Modifies in place (does not return anything).
+
+        :param dataset_rules: functions called on each dataset
+        :type dataset_rules: list
+        :param exchange_rules: functions called on each exchange
+        :type exchange_rules: list
+        :param matching_fields: dataset fields :meth:`set_unset_exchange_location` looks technosphere exchanges up with
+        :type matching_fields: tuple
+
+        """
+        self.lookups = {"location": {}, "product": {}, "locations by fields": {}}
+        self.matching_fields = matching_fields
+        self.unresolved = {}
+
         for ds in self.db:
+            for rule in dataset_rules:
+                rule(ds)
+            self.build_lookups(ds)
+
+        if exchange_rules:
+            exchange_rules = list(exchange_rules)
+            for ds in self.db:
+                for exc in ds["exchanges"]:
+                    for rule in exchange_rules:
+                        rule(ds, exc)
+
+        if self.set_unset_exchange_location in exchange_rules:
+            self.report_unresolved_locations()
+
+    def build_lookups(self, ds):
+        """
+        Add a dataset to the lookup dictionaries shared by exchange rules:
+
+        * `location`: location of datasets, by (database, code)
+        * `product`: reference product and name of datasets, by code
+        * `locations by fields`: locations of datasets, by values of :attr:`matching_fields`
+
+        :param ds: dataset
+        :type ds: dict
+        """
+        self.lookups["location"][(ds.get("database"), ds.get("code"))] = ds.get("location")
+        self.lookups["product"][ds.get("code")] = (ds.get("reference product"), ds.get("name"))
+        self.lookups["locations by fields"].setdefault(
+            tuple(ds.get(k) for k in self.matching_fields), []
+        ).append(ds.get("location"))
+
+    @staticmethod
+    def transform_dataset_parameter_field(ds):
+        """
+        Dataset rule. When handling ecospold files directly, the parameter field is a list.
+        It is here transformed into a dictionary.
+        """
+        ds['parameters'] = {k['name']: k['amount'] for k in ds['parameters']}
+
+    @staticmethod
+    def set_default_global_location(ds):
+        """
+        Dataset rule. Set a missing location to ``GLO``.
+        """
+        if ds.get("location") is None:
+            ds["location"] = "GLO"
+
+    def set_exchange_location_from_input(self, ds, exc):
+        """
+        Exchange rule. Give technosphere exchanges the location of the dataset they link to.
+        """
+        if exc['type'] == 'technosphere':
+            exc['location'] = self.lookups["location"][exc['input']]
+
+    def set_exchange_product_and_name(self, ds, exc):
+        """
+        Exchange rule. Add the `product` key to production and technosphere exchanges, and correct their name.
+        For production exchanges, use the reference product of the dataset.
+        For technosphere exchanges, use the reference product of the dataset they link to.
+        """
+        if exc["type"] == "production":
+            if "product" not in exc:
+                exc["product"] = ds["reference product"]
 
-            # collect production exchanges that simply do not have a location key and set it to
-            # the location of the dataset
-            for exc in wurst.production(ds):
-                if "location" not in exc:
-                    exc["location"] = ds["location"]
-
-            for exc in wurst.technosphere(ds):
-                if "location" not in exc:
-                    locs = self.find_location_given_lookup_dict({k: exc.get(k) for k in matching_fields})
-                    if len(locs) == 1:
-                        exc["location"] = locs[0]
-                    else:
-                        print(
-                            "No unique location found for exchange:\n{}\nFound: {}".format(
-                                pprint.pformat(exc), locs
-                            )
-                        )
+            if exc["name"] != ds["name"]:
+                exc["name"] = ds["name"]
 
+        elif exc["type"] == "technosphere":
+            product, name = self.lookups["product"][exc['input'][1]]
+
+            # Check if the field 'product' is present
+            if 'product' not in exc:
+                exc['product'] = product
+
+            # If a 'reference product' field is present, we make sure it matches with the new 'product' field
+            if 'reference product' in exc and exc['product'] != exc['reference product']:
+                exc['product'] = product
+
+            # Ensure the name is correct
+            exc['name'] = name
+
+    def set_unset_exchange_location(self, ds, exc):
+        """
+        Exchange rule. Give a production exchange without location the location of its dataset,
+        and a technosphere exchange without location the location of the only dataset with the same
+        :attr:`matching_fields`. Other technosphere exchanges are reported by :meth:`report_unresolved_locations`.
+        """
+        if "location" in exc:
+            return
+
+        if exc["type"] == "production":
+            exc["location"] = ds["location"]
+
+        elif exc["type"] == "technosphere":
+            key = tuple(exc.get(k) for k in self.matching_fields)
+            locs = self.lookups["locations by fields"].get(key, [])
+            if len(locs) == 1:
+                exc["location"] = locs[0]
+            else:
+                self.unresolved.setdefault(key, []).append((ds["name"], ds["location"]))
+
+    @staticmethod
+    def remove_none_values(ds, exc):
+        """
+        Exchange rule. Remove the fields of an exchange which value is None.
+        """
+        if None in exc.values():
+            for k in [k for k, v in exc.items() if v is None]:
+                del exc[k]
+
+    @staticmethod
+    def intern_exchange_strings(ds, exc):
+        """
+        Exchange rule. Intern the identifier strings of an exchange (see :func:`premise.utils.intern_strings`).
+        """
+        intern_strings(exc)
+
+    def report_unresolved_locations(self):
+        """
+        Gather the technosphere exchanges which location could not be set in :attr:`unresolved_locations`,
+        grouped by :attr:`matching_fields`, and print a summary.
+        """
+        self.unresolved_locations = [
+            {
+                **dict(zip(self.matching_fields, key)),
+                "locations found": self.lookups["locations by fields"].get(key, []),
+                "consumers": consumers,
+            }
+            for key, consumers in self.unresolved.items()
+        ]
+
+        if self.unresolved_locations:
+            print(
+                "No unique location found for {} exchange(s), of {} different product(s):".format(
+                    sum(len(u["consumers"]) for u in self.unresolved_locations),
+                    len(self.unresolved_locations),
+                )
+            )
+            for u in self.unresolved_locations:
+                print(
+                    "{}: found {}, in {} dataset(s)".format(
+                        ", ".join(str(u[k]) for k in self.matching_fields),
+                        u["locations found"] or "none",
+                        len(u["consumers"]),
+                    )
+                )
+
+    @profiler.profile()
     def prepare_datasets(self):
         """
         Clean datasets for all databases listed in scenarios: fix location names, remove
@@ -233,15 +474,18 @@ class DatabaseCleaner:
 
         """
 
-        # Set missing locations to ```GLO``` for datasets in ``database``
-        print("Set missing location of datasets to global scope.")
-        wurst.default_global_location(self.db)
-        # Set missing locations to ```GLO``` for exchanges in ``datasets``
-        print("Set missing location of production exchanges to scope of dataset.")
-        print("Correct missing location of technosphere exchanges.")
-        self.fix_unset_technosphere_and_production_exchange_locations()
-        # Remove empty exchanges
-        print("Remove empty exchanges.")
-        self.remove_nones(self.db)
+        # All cleaning steps are applied in a single traversal of the database
+        if self.exchange_rules:
+            print("Format ecospold datasets, set missing locations and remove empty exchanges.")
+        else:
+            print("Set missing locations and remove empty exchanges.")
+        self.apply_rules(
+            dataset_rules=self.dataset_rules + [self.set_default_global_location, intern_strings],
+            exchange_rules=self.exchange_rules + [
+                self.set_unset_exchange_location,
+                self.remove_none_values,
+                self.intern_exchange_strings,
+            ],
+        )
 
         return self.db
@@ -0,0 +1,228 @@
+import copy
+import numpy as np
+
+# Exchange fields stored as numbers
+NUMBER_FIELDS = ("amount", "loc", "scale", "minimum", "maximum", "production volume")
+# Exchange fields stored as IDs of values in a pool
+POOLED_FIELDS = ("name", "product", "location", "unit", "type", "categories", "input", "uncertainty type")
+
+# Kinds of the values of the number fields
+MISSING, FLOAT, INT = 0, 1, 2
+
+# Number of datasets expanded at a time when iterating
+BLOCK_SIZE = 1000
+
+
+class ValuePool:
+    """
+    Stores each distinct hashable value (e.g., a string, or a tuple such as an exchange input key) once,
+    and gives it an integer ID.
+
+    Values are told apart by their type as well, so that, e.g., `0` and `False` get different IDs.
+    """
+
+    def __init__(self):
+        self.values = []
+        self.ids = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, i):
+        return self.values[i]
+
+    def add(self, value):
+        """
+        Add a value to the pool, if it is not in it yet.
+
+        :param value: a hashable value
+        :return: the ID of the value
+        :rtype: int
+        """
+        key = (type(value), value)
+        try:
+            return self.ids[key]
+        except KeyError:
+            self.ids[key] = len(self.values)
+            self.values.append(value)
+            return self.ids[key]
+
+
+class CompactDatabase:
+    """
+    Compact representation of a wurst inventory database.
+
+    Exchanges are stored in typed columns: NumPy arrays of numbers for amounts and uncertainty parameters,
+    and arrays of integer IDs pointing to a :class:`ValuePool` for names, products, locations, units, types,
+    categories and inputs. Other exchange fields (e.g., `comment` or `pedigree`) are kept in a dictionary
+    for the exchanges which have them. Datasets fields, other than `exchanges`, are kept as dictionaries.
+
+    The database is a read-only sequence of datasets: indexing and iterating yield new dataset dictionaries,
+    which can be searched with `wurst`, but which changes are not stored.
+    :meth:`to_database` expands the whole database back into a list of datasets.
+
+    Usage::
+
+        compact_db = CompactDatabase(db)
+        del db
+        ...
+        db = compact_db.to_database()
+
+    :ivar pool: values of the pooled exchange fields
+    :vartype pool: ValuePool
+    :ivar datasets: datasets, without their exchanges
+    :vartype datasets: list
+    :ivar offsets: the exchanges of the dataset `i` are stored in the rows `offsets[i]` to `offsets[i + 1]`
+    :vartype offsets: numpy.ndarray
+    :ivar numbers: values of the number fields, by field
+    :vartype numbers: dict
+    :ivar kinds: kind of the values of the number fields (`MISSING`, `FLOAT` or `INT`), by field
+    :vartype kinds: dict
+    :ivar ids: IDs of the values of the pooled fields (-1 if missing), by field
+    :vartype ids: dict
+    :ivar extra: other fields, by row
+    :vartype extra: dict
+
+    """
+
+    def __init__(self, db):
+        """
+        :param db: wurst inventory database, which is not modified
+        :type db: list
+        """
+        self.pool = ValuePool()
+        self.datasets = []
+        self.extra = {}
+
+        offsets = [0]
+        numbers = {f: [] for f in NUMBER_FIELDS}
+        kinds = {f: [] for f in NUMBER_FIELDS}
+        ids = {f: [] for f in POOLED_FIELDS}
+        row = 0
+
+        for ds in db:
+            self.datasets.append(
+                copy.deepcopy({k: v for k, v in ds.items() if k != "exchanges"})
+            )
+
+            for exc in ds["exchanges"]:
+                extra = {}
+
+                for field in NUMBER_FIELDS:
+                    value = exc.get(field)
+                    if type(value) is float:
+                        numbers[field].append(value)
+                        kinds[field].append(FLOAT)
+                    elif type(value) is int and abs(value) < 2 ** 53:
+                        numbers[field].append(value)
+                        kinds[field].append(INT)
+                    else:
+                        numbers[field].append(0.0)
+                        kinds[field].append(MISSING)
+                        if field in exc:
+                            extra[field] = value
+
+                for field in POOLED_FIELDS:
+                    if field not in exc:
+                        ids[field].append(-1)
+                        continue
+                    try:
+                        ids[field].append(self.pool.add(exc[field]))
+                    except TypeError:
+                        # Unhashable value
+                        ids[field].append(-1)
+                        extra[field] = exc[field]
+
+                for key, value in exc.items():
+                    if key not in NUMBER_FIELDS and key not in POOLED_FIELDS:
+                        extra[key] = value
+
+                if extra:
+                    self.extra[row] = copy.deepcopy(extra)
+                row += 1
+
+            offsets.append(row)
+
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.numbers = {f: np.array(v, dtype=np.float64) for f, v in numbers.items()}
+        self.kinds = {f: np.array(v, dtype=np.int8) for f, v in kinds.items()}
+        self.ids = {f: np.array(v, dtype=np.int32) for f, v in ids.items()}
+
+    def __len__(self):
+        return len(self.datasets)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        return self.expand_dataset(i, self.get_columns(int(self.offsets[i]), int(self.offsets[i + 1])))
+
+    def __iter__(self):
+        for block in range(0, len(self), BLOCK_SIZE):
+            end = min(block + BLOCK_SIZE, len(self))
+            columns = self.get_columns(int(self.offsets[block]), int(self.offsets[end]))
+            for i in range(block, end):
+                yield self.expand_dataset(i, columns)
+
+    def get_columns(self, start, end):
+        """
+        Return the values of the rows `start` to `end` of the columns, as lists of Python objects.
+
+        :return: number values, number kinds and pooled values, by field, and the offset `start`
+        :rtype: tuple
+        """
+        values = self.pool.values
+        return (
+            {f: self.numbers[f][start:end].tolist() for f in NUMBER_FIELDS},
+            {f: self.kinds[f][start:end].tolist() for f in NUMBER_FIELDS},
+            {
+                f: [values[i] if i >= 0 else None for i in self.ids[f][start:end].tolist()]
+                for f in POOLED_FIELDS
+            },
+            {f: (self.ids[f][start:end] >= 0).tolist() for f in POOLED_FIELDS},
+            start,
+        )
+
+    def expand_dataset(self, i, columns):
+        """
+        Return the dataset `i` as a new dictionary, with its exchanges.
+
+        :param i: index of the dataset
+        :type i: int
+        :param columns: columns, as returned by :meth:`get_columns`, which include the rows of the dataset
+        :type columns: tuple
+        :return: dataset
+        :rtype: dict
+        """
+        numbers, kinds, pooled, present, start = columns
+        ds = copy.deepcopy(self.datasets[i])
+        exchanges = []
+
+        for row in range(int(self.offsets[i]), int(self.offsets[i + 1])):
+            r = row - start
+            exc = {}
+            for field in POOLED_FIELDS:
+                if present[field][r]:
+                    exc[field] = pooled[field][r]
+            for field in NUMBER_FIELDS:
+                kind = kinds[field][r]
+                if kind == FLOAT:
+                    exc[field] = numbers[field][r]
+                elif kind == INT:
+                    exc[field] = int(numbers[field][r])
+            if row in self.extra:
+                exc.update(copy.deepcopy(self.extra[row]))
+            exchanges.append(exc)
+
+        ds["exchanges"] = exchanges
+        return ds
+
+    def to_database(self):
+        """
+        Expand the database into a list of datasets, as a wurst inventory database.
+
+        :return: wurst inventory database
+        :rtype: list
+        """
+        return list(self)
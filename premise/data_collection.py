@@ -1,7 +1,9 @@
 from . import DATA_DIR
 import pandas as pd
+import xarray as xr
 from pathlib import Path
 import csv
+import hashlib
 
 IAM_ELEC_MARKETS = DATA_DIR / "electricity" / "electricity_markets.csv"
 IAM_ELEC_EFFICIENCIES = DATA_DIR / "electricity" / "electricity_efficiencies.csv"
@@ -118,15 +120,13 @@ class IAMDataCollection:
         filepath = Path(self.filepath_iam_files) / file_ext[self.model]
 
         if self.model == "remind":
-            df = pd.read_csv(
-                filepath, sep=";", index_col=["Region", "Variable", "Unit"]
-            ).drop(columns=["Model", "Scenario"])
-
             # Filter the dataframe
             list_var = ("SE", "Tech", "FE", "Production", "Emi|CCO2", "Emi|CO2")
 
+            df = self.read_mif_file(filepath, list_var)
+
         elif self.model == "image":
-            df = pd.read_excel(filepath, index_col=[2, 3, 4]).drop(
+            df = self.read_image_file(filepath).drop(
                 columns=["Model", "Scenario"]
             )
 
@@ -136,33 +136,129 @@ class IAMDataCollection:
                 "Efficiency",
                 "Final Energy",
             )
-        else:
-            raise ValueError("The IAM model name {} is not valid. Currently supported: 'remind' or 'image'".format(self.model))
 
-        if len(df.columns == 20):
-            df.drop(columns=df.columns[-1], inplace=True)
-        df.columns = df.columns.astype(int)
-        df = df.reset_index()
+            if len(df.columns == 20):
+                df.drop(columns=df.columns[-1], inplace=True)
+            df = df.reset_index()
+
+            df = df.loc[df["Variable"].str.startswith(list_var)]
 
-        df = df.loc[df["Variable"].str.startswith(list_var)]
+        else:
+            raise ValueError("The IAM model name {} is not valid. Currently supported: 'remind' or 'image'".format(self.model))
 
         df = df.rename(
             columns={"Region": "region", "Variable": "variables", "Unit": "unit"}
         )
 
-        array = (
-            df.melt(
-                id_vars=["region", "variables", "unit"],
-                var_name="year",
-                value_name="value",
-            )[["region", "variables", "year", "value"]]
-            .groupby(["region", "variables", "year"])["value"]
-            .mean()
-            .to_xarray()
+        # Average values reported for the same region and variable, year by year
+        df = df.drop(columns="unit").groupby(["region", "variables"]).mean()
+        df.columns = df.columns.astype(int)
+        df = df.sort_index(axis=1)
+
+        regions = df.index.get_level_values("region").unique().sort_values()
+        variables = df.index.get_level_values("variables").unique().sort_values()
+        df = df.reindex(pd.MultiIndex.from_product([regions, variables]))
+
+        array = xr.DataArray(
+            df.values.reshape(len(regions), len(variables), len(df.columns)),
+            coords={"region": regions, "variables": variables, "year": df.columns},
+            dims=["region", "variables", "year"],
+            name="value",
         )
 
         return array
 
+    @staticmethod
+    def read_mif_file(filepath, list_var, chunksize=20000):
+        """
+        Read a REMIND .mif file by chunks of `chunksize` rows, and only keep the rows
+        which variable starts with any of the prefixes in `list_var`.
+        This way, the entire file never needs to be held in memory.
+
+        :param filepath: path to the .mif file
+        :type filepath: pathlib.Path
+        :param list_var: prefixes of the variables to keep
+        :type list_var: tuple
+        :param chunksize: number of rows read at once
+        :type chunksize: int
+        :return: a dataframe with `Region`, `Variable`, `Unit` and one column per year
+        :rtype: pandas.DataFrame
+        """
+
+        with open(filepath) as f:
+            header = f.readline().strip().split(";")
+
+        # Columns are: Model, Scenario, Region, Variable, Unit, and years.
+        # Lines usually end with a trailing separator, which adds an unnamed empty column.
+        years = [c for c in header[5:] if c.strip()]
+
+        chunks = pd.read_csv(
+            filepath,
+            sep=";",
+            usecols=["Region", "Variable", "Unit", *years],
+            dtype={"Region": str, "Variable": str, "Unit": str, **{y: float for y in years}},
+            na_values=["N/A"],
+            chunksize=chunksize,
+        )
+
+        return pd.concat(
+            [chunk.loc[chunk["Variable"].str.startswith(list_var)] for chunk in chunks],
+            ignore_index=True,
+        )
+
+    @staticmethod
+    def read_image_file(filepath):
+        """
+        Read an IMAGE .xls result file.
+        Parsing the workbook is slow, so its content is stored, the first time it is read,
+        in a cache file next to it (same name, with a `.cache` suffix).
+        The cache is used as long as the workbook has not changed, that is, as long as
+        its modification time and size, or else its SHA-256 hash, are the same.
+        If the cache cannot be written (e.g., read-only directory), the workbook is simply read.
+
+        :param filepath: path to the .xls file
+        :type filepath: pathlib.Path
+        :return: a dataframe indexed by region, variable and unit
+        :rtype: pandas.DataFrame
+        """
+
+        filepath = Path(filepath)
+        cache_filepath = filepath.with_name(filepath.name + ".cache")
+
+        stat = filepath.stat()
+        stamp = {"mtime": stat.st_mtime, "size": stat.st_size}
+
+        def get_hash():
+            with open(filepath, "rb") as f:
+                return hashlib.sha256(f.read()).hexdigest()
+
+        def write_cache(cache):
+            tmp_filepath = cache_filepath.with_name(cache_filepath.name + ".tmp")
+            try:
+                pd.to_pickle(cache, tmp_filepath)
+                # Only a complete cache is given its final name
+                tmp_filepath.replace(cache_filepath)
+            except OSError:
+                print("The IMAGE file {} could not be cached.".format(filepath))
+
+        if cache_filepath.is_file():
+            try:
+                cache = pd.read_pickle(cache_filepath)
+                if cache["stamp"] == stamp:
+                    return cache["data"]
+                if cache["hash"] == get_hash():
+                    # The workbook was touched but not changed: the new stamp spares hashing it next time
+                    write_cache(dict(cache, stamp=stamp))
+                    return cache["data"]
+            except Exception:
+                # An empty, truncated or outdated cache is replaced
+                pass
+
+        df = pd.read_excel(filepath, index_col=[2, 3, 4])
+        write_cache({"stamp": stamp, "hash": get_hash(), "data": df})
+
+        return df
+
     @staticmethod
     def get_gains_data():
         """
@@ -0,0 +1,140 @@
+import copy
+import functools
+import importlib
+import os
+import pickle
+from pathlib import Path
+
+
+# Modules which functions parse data files
+MODULES = (
+    ".utils",
+    ".activity_maps",
+    ".clean_datasets",
+    ".electricity",
+    ".inventory_imports",
+)
+
+
+class DataRegistry:
+    """
+    Process-wide registry of the reference data bundled in `premise/data`.
+
+    Functions that parse a data file are decorated with :meth:`memoize`.
+    The file is then parsed the first time the function is called, and the parsed object is kept
+    for the rest of the process. Callers receive a copy, so that they can modify it freely.
+
+    The parsed objects can be saved to a snapshot file with :meth:`save_snapshot` and loaded
+    back with :meth:`load_snapshot`, for example by worker processes, which then do not need to parse
+    any data file. A snapshot entry is ignored if the data file it was read from has changed since.
+
+    """
+
+    def __init__(self):
+        self.loaders = {}
+        self.data = {}
+
+    def memoize(self, *filepaths, preload_args=((),)):
+        """
+        Decorator that memoizes the result of a function that parses the data file(s) `filepaths`.
+        Results are stored per function and per arguments.
+
+        :param filepaths: path(s) of the data file(s) the function reads
+        :type filepaths: pathlib.Path
+        :param preload_args: tuples of positional arguments the function is called with by :meth:`preload`
+        :type preload_args: tuple
+        :return: decorator
+        """
+
+        def decorator(func):
+            name = "{}.{}".format(func.__module__, func.__qualname__)
+            self.loaders[name] = (func, [Path(f) for f in filepaths], preload_args)
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                key = (name, args, tuple(sorted(kwargs.items())))
+                if key not in self.data:
+                    self.data[key] = func(*args, **kwargs)
+                return self.copy(self.data[key])
+
+            return wrapper
+
+        return decorator
+
+    @staticmethod
+    def copy(value):
+        """
+        Return a copy of a parsed object. Dictionaries are copied recursively,
+        immutable values are returned as they are, and other objects are deep-copied.
+        """
+        if isinstance(value, dict):
+            return {k: DataRegistry.copy(v) for k, v in value.items()}
+        if isinstance(value, (str, int, float, bool, tuple)):
+            return value
+        return copy.deepcopy(value)
+
+    def preload(self):
+        """
+        Parse all the registered data files, e.g., before saving a snapshot.
+        """
+        for module in MODULES:
+            importlib.import_module(module, "premise")
+
+        for name, (func, _, preload_args) in self.loaders.items():
+            for args in preload_args:
+                key = (name, args, ())
+                if key not in self.data:
+                    self.data[key] = func(*args)
+
+    def clear(self):
+        """
+        Forget all parsed data. Data files will be parsed again on next access.
+        """
+        self.data = {}
+
+    @staticmethod
+    def get_file_stamps(filepaths):
+        return {
+            str(f): os.path.getmtime(f) if os.path.isfile(f) else None
+            for f in filepaths
+        }
+
+    def save_snapshot(self, filepath):
+        """
+        Save all the data parsed so far into a snapshot file.
+
+        :param filepath: path of the snapshot file
+        :type filepath: str or pathlib.Path
+        """
+        snapshot = {}
+        for key, value in self.data.items():
+            name = key[0]
+            filepaths = self.loaders[name][1] if name in self.loaders else []
+            snapshot[key] = (self.get_file_stamps(filepaths), value)
+
+        with open(filepath, "wb") as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load_snapshot(self, filepath):
+        """
+        Load parsed data from a snapshot file created by :meth:`save_snapshot`.
+        Entries which data file has been modified since the snapshot was saved are skipped.
+
+        :param filepath: path of the snapshot file
+        :type filepath: str or pathlib.Path
+        :return: number of entries loaded
+        :rtype: int
+        """
+        with open(filepath, "rb") as f:
+            snapshot = pickle.load(f)
+
+        count = 0
+        for key, (stamps, value) in snapshot.items():
+            if self.get_file_stamps(stamps) == stamps:
+                self.data[key] = value
+                count += 1
+
+        return count
+
+
+registry = DataRegistry()
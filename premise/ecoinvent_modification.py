@@ -1,4 +1,4 @@
-from . import DATA_DIR, INVENTORY_DIR
+from . import DATA_DIR, INVENTORY_DIR, __version__
 from .clean_datasets import DatabaseCleaner
 from .data_collection import IAMDataCollection
 from .electricity import Electricity
@@ -21,13 +21,18 @@ from .inventory_imports import (
 from .cement import Cement
 from .steel import Steel
 from .cars import Cars
-from .export import Export
-from .utils import eidb_label, add_modified_tags
+from .export import Export, MatrixStore
+from .brightway import write_brightway2_database
+from .utils import eidb_label, add_modified_tags, build_superstructure_database
+from .checkpoints import get_hash, get_step_key, save_checkpoint, load_checkpoint
+from .compact import CompactDatabase
 import wurst
 from pathlib import Path
 import copy
 import os
 import contextlib
+import datetime
+from .profiling import profiler
 
 
 FILEPATH_CARMA_INVENTORIES = INVENTORY_DIR / "lci-Carma-CCS.xlsx"
@@ -384,6 +389,17 @@ class NewDatabase:
     :vartype source_db: str
     :ivar source_version: version of the ecoinvent source database. Currently works with ecoinvent 3.5, 3.6, 3.7, 3.7.1.
     :vartype source_version: str
+    :ivar checkpoint_dir: if given, directory where the databases are saved after extraction and after each
+        transformation step. Checkpoints are keyed by a hash of their inputs (source database, IAM file,
+        data files, premise version and previous checkpoint), so that a re-run resumes from the last valid checkpoint
+        and only re-applies the steps which inputs have changed. The content of a brightway source database
+        is not hashed: only its name.
+    :vartype checkpoint_dir: str
+    :ivar compact: if True, the scenario databases are kept as :class:`premise.compact.CompactDatabase`
+        between transformation steps, and only expanded into datasets while they are transformed or exported.
+        This reduces memory use when many scenarios are processed, at the cost of expanding and compacting
+        the databases at each step.
+    :vartype compact: bool
 
     """
 
@@ -394,7 +410,9 @@ class NewDatabase:
         source_version="3.7.1",
         source_type="brightway",
         source_file_path=None,
-        additional_inventories=None
+        additional_inventories=None,
+        checkpoint_dir=None,
+        compact=False
     ):
 
         self.source = source_db
@@ -413,14 +431,39 @@ class NewDatabase:
         else:
             self.additional_inventories = None
 
-        print(
-            "\n////////////////////// EXTRACTING SOURCE DATABASE ///////////////////////"
-        )
-        self.db = self.clean_database()
-        print(
-            "\n/////////////////// IMPORTING DEFAULT INVENTORIES ////////////////////"
+        self.compact = compact
+
+        if checkpoint_dir:
+            self.checkpoint_dir = Path(checkpoint_dir)
+            self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        else:
+            self.checkpoint_dir = None
+
+        source_key = get_hash(
+            __version__,
+            self.source,
+            self.source_type,
+            self.version,
+            self.source_file_path,
+            *[Path(i["filepath"]) for i in self.additional_inventories or []],
         )
-        self.import_inventories()
+
+        if self.checkpoint_dir and (self.checkpoint_dir / (source_key + ".pickle")).is_file():
+            print("\nLoading the source database from checkpoint {}.".format(source_key))
+            self.db = load_checkpoint(self.checkpoint_dir / (source_key + ".pickle"))
+
+        else:
+            print(
+                "\n////////////////////// EXTRACTING SOURCE DATABASE ///////////////////////"
+            )
+            self.db = self.clean_database()
+            print(
+                "\n/////////////////// IMPORTING DEFAULT INVENTORIES ////////////////////"
+            )
+            self.import_inventories()
+
+            if self.checkpoint_dir:
+                save_checkpoint(self.checkpoint_dir / (source_key + ".pickle"), self.db)
 
         for scenario in self.scenarios:
             scenario["external data"] = IAMDataCollection(
@@ -429,8 +472,114 @@ class NewDatabase:
                 year=scenario["year"],
                 filepath_iam_files=scenario["filepath"],
             )
-            scenario["database"] = copy.deepcopy(self.db)
 
+            if self.checkpoint_dir:
+                iam_file = Path(scenario["filepath"]) / "{}_{}{}".format(
+                    scenario["model"],
+                    scenario["pathway"],
+                    ".mif" if scenario["model"] == "remind" else ".xls",
+                )
+                scenario["checkpoint"] = get_hash(
+                    source_key,
+                    scenario["model"],
+                    scenario["pathway"],
+                    scenario["year"],
+                    iam_file,
+                )
+                # The database is only copied when a transformation step needs to run
+                scenario["checkpoint file"] = None
+            elif self.compact:
+                scenario["database"] = CompactDatabase(self.db)
+            else:
+                scenario["database"] = copy.deepcopy(self.db)
+
+    def restore_database(self, scenario):
+        """
+        Make sure that the database of a scenario is loaded, from its latest checkpoint
+        or, if there is none, from the source database, and expanded if it is compact.
+
+        :param scenario: scenario dictionary, from :attr:`scenarios`
+        :type scenario: dict
+        """
+        if "database" not in scenario:
+            if scenario["checkpoint file"] is None:
+                scenario["database"] = copy.deepcopy(self.db)
+            else:
+                scenario["database"] = load_checkpoint(scenario["checkpoint file"])
+
+        if isinstance(scenario["database"], CompactDatabase):
+            scenario["database"] = scenario["database"].to_database()
+
+    def compact_database(self, scenario):
+        """
+        If :attr:`compact` is True, store the database of a scenario as a :class:`premise.compact.CompactDatabase`.
+
+        :param scenario: scenario dictionary, from :attr:`scenarios`
+        :type scenario: dict
+        """
+        if self.compact and isinstance(scenario.get("database"), list):
+            scenario["database"] = CompactDatabase(scenario["database"])
+
+    def restore_databases(self):
+        """
+        Make sure that the databases of all scenarios are loaded.
+        """
+        for scenario in self.scenarios:
+            self.restore_database(scenario)
+
+    def resume_from_checkpoint(self, scenario, step):
+        """
+        Check whether a valid checkpoint exists for the transformation step `step` of a scenario.
+        If so, the step can be skipped: the scenario database will be loaded from that checkpoint
+        when it is next needed.
+        Otherwise, load the database from the latest checkpoint, so that the step can be applied.
+
+        :param scenario: scenario dictionary, from :attr:`scenarios`
+        :type scenario: dict
+        :param step: name of the transformation step, e.g., `update_cement`
+        :type step: str
+        :return: True if the step can be skipped
+        :rtype: bool
+        """
+        if not self.checkpoint_dir:
+            self.restore_database(scenario)
+            return False
+
+        key = get_step_key(scenario["checkpoint"], step, scenario)
+        filepath = self.checkpoint_dir / (key + ".pickle")
+
+        if filepath.is_file():
+            print("Resuming {} {} {} from checkpoint {} ({}).".format(
+                scenario["model"], scenario["pathway"], scenario["year"], key, step)
+            )
+            scenario.pop("database", None)
+            scenario["checkpoint file"] = filepath
+            scenario["checkpoint"] = key
+            return True
+
+        self.restore_database(scenario)
+        return False
+
+    def save_checkpoint(self, scenario, step):
+        """
+        Save the database of a scenario after the transformation step `step` has been applied,
+        and compact it if :attr:`compact` is True.
+
+        :param scenario: scenario dictionary, from :attr:`scenarios`
+        :type scenario: dict
+        :param step: name of the transformation step, e.g., `update_cement`
+        :type step: str
+        """
+        if self.checkpoint_dir:
+            key = get_step_key(scenario["checkpoint"], step, scenario)
+            filepath = self.checkpoint_dir / (key + ".pickle")
+            save_checkpoint(filepath, scenario["database"])
+            scenario["checkpoint file"] = filepath
+            scenario["checkpoint"] = key
+
+        self.compact_database(scenario)
+
+    @profiler.profile()
     def clean_database(self):
         """
         Extracts the ecoinvent database, loads it into a dictionary and does a little bit of housekeeping
@@ -441,6 +590,7 @@ class NewDatabase:
             self.source, self.source_type, self.source_file_path
         ).prepare_datasets()
 
+    @profiler.profile()
     def import_inventories(self):
         """
         This method will trigger the import of a number of inventories
@@ -530,12 +680,16 @@ class NewDatabase:
 
 
 
+    @profiler.profile()
     def update_electricity(self):
 
         print("\n/////////////////// ELECTRICITY ////////////////////")
 
         for scenario in self.scenarios:
             if "exclude" not in scenario or "update_electricity" not in scenario["exclude"]:
+                if self.resume_from_checkpoint(scenario, "update_electricity"):
+                    continue
+
                 electricity = Electricity(
                     db=scenario["database"],
                     iam_data=scenario["external data"],
@@ -545,12 +699,16 @@ class NewDatabase:
                 )
                 scenario["database"] = electricity.update_electricity_markets()
                 scenario["database"] = electricity.update_electricity_efficiency()
+                self.save_checkpoint(scenario, "update_electricity")
 
+    @profiler.profile()
     def update_cement(self):
         print("\n/////////////////// CEMENT ////////////////////")
 
         for scenario in self.scenarios:
             if "exclude" not in scenario or "update_cement" not in scenario["exclude"]:
+                if self.resume_from_checkpoint(scenario, "update_cement"):
+                    continue
 
                 cement = Cement(
                     db=scenario["database"],
@@ -562,7 +720,9 @@ class NewDatabase:
                 )
 
                 scenario["database"] = cement.add_datasets_to_database()
+                self.save_checkpoint(scenario, "update_cement")
 
+    @profiler.profile()
     def update_steel(self):
         print("\n/////////////////// STEEL ////////////////////")
 
@@ -579,6 +739,8 @@ class NewDatabase:
 
             for scenario in self.scenarios:
                 if "exclude" not in scenario or "update_steel" not in scenario["exclude"]:
+                    if self.resume_from_checkpoint(scenario, "update_steel"):
+                        continue
 
                     steel = Steel(
                         db=scenario["database"],
@@ -587,6 +749,7 @@ class NewDatabase:
                         year=scenario["year"],
                     )
                     scenario["database"] = steel.generate_activities()
+                    self.save_checkpoint(scenario, "update_steel")
         else:
             print(
                 "The IAM pathway chosen does not contain any data related to the steel sector.\n"
@@ -595,6 +758,8 @@ class NewDatabase:
             )
             for scenario in self.scenarios:
                 if "exclude" not in scenario or "update_steel" not in scenario["exclude"]:
+                    if self.resume_from_checkpoint(scenario, "update_steel"):
+                        continue
 
                     steel = Steel(
                         db=scenario["database"],
@@ -603,7 +768,9 @@ class NewDatabase:
                         year=scenario["year"],
                     )
                     scenario["database"] = steel.generate_activities(industry_module_present=False)
+                    self.save_checkpoint(scenario, "update_steel")
 
+    @profiler.profile()
     def update_cars(self):
         print("\n/////////////////// PASSENGER CARS ////////////////////")
 
@@ -611,6 +778,8 @@ class NewDatabase:
             if "exclude" not in scenario or "update_cars" not in scenario["exclude"]:
 
                 if scenario["passenger cars"]:
+                    if self.resume_from_checkpoint(scenario, "update_cars"):
+                        continue
 
                     # Import `carculator` inventories if wanted
                     cars = CarculatorInventory(
@@ -634,9 +803,11 @@ class NewDatabase:
                         model=scenario["model"],
                     )
                     scenario["database"] = crs.update_cars()
+                    self.save_checkpoint(scenario, "update_cars")
 
 
 
+    @profiler.profile()
     def update_trucks(self):
 
         print("\n/////////////////// MEDIUM AND HEAVY DUTY TRUCKS ////////////////////")
@@ -644,6 +815,8 @@ class NewDatabase:
         for scenario in self.scenarios:
             if "exclude" not in scenario or "update_trucks" not in scenario["exclude"]:
                 if scenario["trucks"]:
+                    if self.resume_from_checkpoint(scenario, "update_trucks"):
+                        continue
 
                     # Import `carculator_truck` inventories if wanted
 
@@ -659,16 +832,22 @@ class NewDatabase:
                         filters=scenario["trucks"]["filters"],
                        )
                     scenario["database"] = trucks.merge_inventory()
+                    self.save_checkpoint(scenario, "update_trucks")
 
 
+    @profiler.profile()
     def update_solar_PV(self):
         print("\n/////////////////// SOLAR PV ////////////////////")
 
         for scenario in self.scenarios:
             if "exclude" not in scenario or "update_solar_PV" not in scenario["exclude"]:
+                if self.resume_from_checkpoint(scenario, "update_solar_PV"):
+                    continue
+
                 solar_PV = SolarPV(db=scenario["database"], year=scenario["year"])
                 print("Update efficiency of solar PVs.\n")
                 scenario["database"] = solar_PV.update_efficiency_of_solar_PV()
+                self.save_checkpoint(scenario, "update_solar_PV")
 
     def update_all(self):
         """
@@ -683,17 +862,60 @@ class NewDatabase:
         self.update_steel()
 
 
+    @profiler.profile()
     def write_db_to_brightway(self):
         """
         Register the new database into an open brightway2 project.
         """
         print("Write new database(s) to Brightway2.")
         for scenario in self.scenarios:
-            wurst.write_brightway2_database(
+            self.restore_database(scenario)
+            write_brightway2_database(
                 scenario["database"],
                 eidb_label(scenario["model"], scenario["pathway"], scenario["year"]),
             )
+            self.compact_database(scenario)
+
+    @profiler.profile()
+    def write_superstructure_db_to_brightway(self, name=None, filepath=None):
+        """
+        Register a single superstructure database into an open brightway2 project, which contains every dataset
+        and exchange of the scenario databases, with the amounts of the first scenario.
+        The amounts of the exchanges which differ between scenarios are exported in a scenario difference file,
+        with one column by scenario.
+
+        :param name: name of the superstructure database. Defaults to `super_db_` followed by the date.
+        :type name: str
+        :param filepath: directory to store the scenario difference file in
+        :type filepath: str
+
+        """
+        print("Write superstructure database to Brightway2.")
+        if name is None:
+            name = "super_db_" + datetime.date.today().strftime("%Y%m%d")
+
+        self.restore_databases()
+        db, differences = build_superstructure_database(self.scenarios, name)
+        for scenario in self.scenarios:
+            self.compact_database(scenario)
+
+        write_brightway2_database(db, name)
+
+        if filepath is not None:
+            filepath = Path(filepath)
+        else:
+            filepath = DATA_DIR / "export" / "scenario diff files"
+        if not os.path.exists(filepath):
+            os.makedirs(filepath)
+
+        differences.to_csv(filepath / "scenario_diff_{}.csv".format(name), sep=";", index=False)
+        print(
+            "{} exchanges differ between scenarios. Scenario difference file saved in {}.".format(
+                len(differences), filepath
+            )
+        )
 
+    @profiler.profile()
     def write_db_to_matrices(self, filepath=None):
         """
 
@@ -706,6 +928,7 @@ class NewDatabase:
         """
         print("Write new database(s) to matrix.")
         for scenario in self.scenarios:
+            self.restore_database(scenario)
             Export(
                 scenario["database"],
                 scenario["model"],
@@ -713,7 +936,34 @@ class NewDatabase:
                 scenario["year"],
                 filepath,
             ).export_db_to_matrices()
+            self.compact_database(scenario)
+
+    @profiler.profile()
+    def write_db_to_matrix_store(self, filepath=None):
+        """
+        Exports the new databases as one :class:`premise.export.MatrixStore`: a single index of activities
+        and a single sparsity pattern for all scenarios, and a vector of values by scenario,
+        in NumPy binary files which can be memory-mapped.
+
+        :param filepath: path provided by the user to store the matrix store
+        :type filepath: str
+        :return: matrix store
+        :rtype: premise.export.MatrixStore
+
+        """
+        print("Write new database(s) to a matrix store.")
+
+        def read_databases():
+            for scenario in self.scenarios:
+                self.restore_database(scenario)
+                yield scenario["model"], scenario["pathway"], scenario["year"], scenario["database"]
+                self.compact_database(scenario)
+
+        store = MatrixStore(read_databases())
+        store.write(filepath if filepath is not None else DATA_DIR / "export" / "matrix store")
+        return store
 
+    @profiler.profile()
     def write_db_to_simapro(self, filepath=None):
         """
         Exports database as a CSV file to be imported in Simapro 9.x
@@ -725,6 +975,7 @@ class NewDatabase:
 
         print("Write Simapro import file(s).")
         for scenario in self.scenarios:
+            self.restore_database(scenario)
             Export(
                 scenario["database"],
                 scenario["model"],
@@ -732,12 +983,15 @@ class NewDatabase:
                 scenario["year"],
                 filepath,
             ).export_db_to_simapro()
+            self.compact_database(scenario)
 
+    @profiler.profile()
     def write_db_to_brightway25(self):
         """
         Register the new database into the current brightway2.5 project.
         """
         print('Write new database to Brightway2.5')
+        self.restore_databases()
         # We first need to check for differences between the source database
         # and the new ones
         # We add a `modified` label to any new activity or any new or modified exchange
@@ -5,10 +5,11 @@ from .geomap import Geomap
 from wurst import searching as ws
 import csv
 import numpy as np
-import uuid
 import wurst
-from .utils import get_lower_heating_values
+from .utils import get_dataset_code, get_lower_heating_values, rescale_pollutant_emissions
+from .data_registry import registry
 from datetime import date
+from .profiling import profiler
 
 PRODUCTION_PER_TECH = (
     DATA_DIR / "electricity" / "electricity_production_volumes_per_tech.csv"
@@ -69,6 +70,7 @@ class Electricity:
         )
 
     @staticmethod
+    @registry.memoize(LOSS_PER_COUNTRY)
     def get_losses_per_country_dict():
         """
         Create a dictionary with ISO country codes as keys and loss ratios as values.
@@ -93,6 +95,7 @@ class Electricity:
         return csv_dict
 
     @staticmethod
+    @registry.memoize(PRODUCTION_PER_TECH)
     def get_production_per_tech_dict():
         """
         Create a dictionary with tuples (technology, country) as keys and production volumes as values.
@@ -248,9 +251,9 @@ class Electricity:
                 "reference product": "electricity, low voltage",
                 "unit": "kilowatt hour",
                 "database": self.db[1]["database"],
-                "code": str(uuid.uuid4().hex),
                 "comment": "Dataset produced from REMIND pathway output results",
             }
+            new_dataset["code"] = get_dataset_code(new_dataset)
 
             # First, add the reference product exchange
             new_exchanges = [
@@ -472,9 +475,9 @@ class Electricity:
                 "reference product": "electricity, medium voltage",
                 "unit": "kilowatt hour",
                 "database": self.db[1]["database"],
-                "code": str(uuid.uuid1().hex),
                 "comment": "Dataset produced from REMIND pathway output results",
             }
+            new_dataset["code"] = get_dataset_code(new_dataset)
 
             # First, add the reference product exchange
             new_exchanges = [
@@ -630,9 +633,9 @@ class Electricity:
                 "reference product": "electricity, high voltage",
                 "unit": "kilowatt hour",
                 "database": self.db[1]["database"],
-                "code": str(uuid.uuid4().hex),
                 "comment": "Dataset produced from REMIND pathway output results",
             }
+            new_dataset["code"] = get_dataset_code(new_dataset)
 
             new_exchanges = [
                 {
@@ -1014,6 +1017,7 @@ class Electricity:
             for tech in self.iam_data.electricity_efficiency_labels.keys()
         }
 
+    @profiler.profile()
     def update_electricity_efficiency(self):
         """
         This method modifies each ecoinvent coal, gas,
@@ -1073,33 +1077,21 @@ class Electricity:
                     [ws.doesnt_contain_any("name", self.emissions_map)],
                 )
 
-                # Update biosphere exchanges according to GAINS emission values
-                for exc in ws.biosphere(
-                    ds, ws.either(*[ws.contains("name", x) for x in self.emissions_map])
-                ):
-                    remind_emission_label = self.emissions_map[exc["name"]]
-
-                    remind_emission = self.iam_data.electricity_emissions.loc[
-                        dict(
-                            region=self.geo.iam_to_GAINS_region(
-                                self.geo.ecoinvent_to_iam_location(ds["location"])
-                            ),
-                            pollutant=remind_emission_label,
-                            sector=self.iam_data.electricity_emission_labels[
-                                remind_technology
-                            ],
-                        )
-                    ].values.item(0)
-
-                    if exc["amount"] == 0:
-                        wurst.rescale_exchange(
-                            exc, remind_emission / 1, remove_uncertainty=True
-                        )
-                    else:
-                        wurst.rescale_exchange(exc, remind_emission / exc["amount"])
+            # Update biosphere exchanges according to GAINS emission values
+            rescale_pollutant_emissions(
+                datasets,
+                self.iam_data.electricity_emissions,
+                self.emissions_map,
+                regions=[
+                    self.geo.iam_to_GAINS_region(self.geo.ecoinvent_to_iam_location(ds["location"]))
+                    for ds in datasets
+                ],
+                sector=self.iam_data.electricity_emission_labels[remind_technology],
+            )
 
         return self.db
 
+    @profiler.profile()
     def update_electricity_markets(self):
         """
         Delete electricity markets. Create high, medium and low voltage market groups for electricity.
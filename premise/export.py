@@ -4,7 +4,9 @@ import csv
 from pathlib import Path
 import datetime
 import json
+import numpy as np
 import re
+from .profiling import profiler
 
 FILEPATH_BIOSPHERE_FLOWS = DATA_DIR / "flows_biosphere_37.csv"
 
@@ -185,6 +187,7 @@ class Export:
 
 
 
+    @profiler.profile()
     def export_db_to_matrices(self):
 
         if self.filepath is not None:
@@ -281,7 +284,8 @@ class Export:
             raise FileNotFoundError(
                 "The dictionary of Simapro categories could not be found."
             )
-        with open(filepath) as f:
+        # The file is encoded in Windows-1252
+        with open(filepath, encoding="cp1252") as f:
             csv_list = [[val.strip() for val in r.split(";")] for r in f.readlines()]
         header, *data = csv_list
 
@@ -382,7 +386,8 @@ class Export:
             raise FileNotFoundError(
                 "The dictionary of references could not be found."
             )
-        with open(filepath) as f:
+        # The file is encoded in Windows-1252
+        with open(filepath, encoding="cp1252") as f:
             csv_list = [[val.strip() for val in r.split(";")] for r in f.readlines()]
         header, *data = csv_list
 
@@ -396,6 +401,7 @@ class Export:
 
         return dict_reference
 
+    @profiler.profile()
     def export_db_to_simapro(self):
 
         if not os.path.exists(self.filepath):
@@ -846,3 +852,196 @@ class Export:
         csvFile.close()
 
         print("Simapro CSV files saved in {}.".format(self.filepath))
+
+
+def share_sparsity_pattern(coordinates, n_cols):
+    """
+    Give sparse matrices of the same shape one sparsity pattern, the union of theirs.
+
+    :param coordinates: (rows, columns, values) arrays of each matrix. Values at the same coordinates are summed.
+    :type coordinates: list
+    :param n_cols: number of columns of the matrices
+    :type n_cols: int
+    :return: row and column indices of the pattern, as an array of shape (2, n),
+        and values of each matrix aligned to it, as an array of shape (number of matrices, n)
+    :rtype: tuple
+    """
+    keys = [rows * n_cols + cols for rows, cols, _ in coordinates]
+    pattern = np.unique(np.concatenate(keys)) if keys else np.zeros(0, dtype=np.int64)
+
+    values = np.zeros((len(coordinates), len(pattern)))
+    for k, (key, (_, _, vals)) in enumerate(zip(keys, coordinates)):
+        values[k] = np.bincount(np.searchsorted(pattern, key), weights=vals, minlength=len(pattern))
+
+    return np.vstack(np.divmod(pattern, n_cols)), values
+
+
+class MatrixStore:
+    """
+    A and B matrices of several scenario databases, in a sparse representation which all scenarios share.
+
+    Activities of all scenario databases are given one index, used for the rows and columns of the A matrices
+    and for the rows of the B matrices. The coordinates of the non-zero values of all scenarios form one sparsity
+    pattern by matrix, and each scenario is a vector of values aligned to it, with zeros where an exchange is missing
+    from the scenario. Values follow the conventions of :meth:`Export.create_A_matrix_coordinates` and
+    :meth:`Export.create_B_matrix_coordinates`. As the index covers the activities of all scenarios,
+    :attr:`activities_in_scenarios` records which activities each scenario contains: an activity missing
+    from a scenario has an empty row and column in the A matrix of that scenario.
+
+    :meth:`write` stores the matrices in NumPy binary files, which values can be memory-mapped::
+
+        store = MatrixStore.load(filepath)
+        values = store.A_values[k]  # values of the A matrix of scenario k, read from the disk
+
+    :ivar scenarios: model, pathway and year of each scenario
+    :vartype scenarios: list
+    :ivar activities: (name, reference product, unit, location) of each activity, by index
+    :vartype activities: list
+    :ivar activities_in_scenarios: True where a scenario contains an activity,
+        as an array of shape (number of scenarios, number of activities)
+    :vartype activities_in_scenarios: numpy.ndarray
+    :ivar flows: (name, category, sub-category, unit) of each biosphere flow, by index
+    :vartype flows: list
+    :ivar A_indices: indices of the activities and of the products of the non-zero values of the A matrices,
+        as an array of shape (2, n)
+    :vartype A_indices: numpy.ndarray
+    :ivar A_values: values of the A matrices, as an array of shape (number of scenarios, n)
+    :vartype A_values: numpy.ndarray
+    :ivar B_indices: indices of the activities and of the biosphere flows of the non-zero values of the B matrices
+    :vartype B_indices: numpy.ndarray
+    :ivar B_values: values of the B matrices
+    :vartype B_values: numpy.ndarray
+
+    """
+
+    def __init__(self, scenarios):
+        """
+        :param scenarios: model, pathway, year and database of each scenario.
+            Databases are read in turn, and can be loaded one at a time by a generator.
+        :type scenarios: iterable
+        """
+        index_A = {}
+        index_B = create_codes_index_of_B_matrix()
+        coordinates_A, coordinates_B = [], []
+        activities_in_scenarios = []
+        self.scenarios = []
+
+        for model, pathway, year, db in scenarios:
+            self.scenarios.append((model, pathway, year))
+            rows_A, cols_A, values_A = [], [], []
+            rows_B, cols_B, values_B = [], [], []
+
+            # Datasets of the scenario are indexed first, so that exchanges can only link to one of them
+            db = list(db)
+            rows = [
+                index_A.setdefault((ds["name"], ds["reference product"], ds["unit"], ds["location"]), len(index_A))
+                for ds in db
+            ]
+            in_scenario = set(rows)
+            activities_in_scenarios.append(rows)
+
+            for ds, row in zip(db, rows):
+                for exc in ds["exchanges"]:
+                    if exc["type"] in ("production", "technosphere"):
+                        col = index_A.get((exc["name"], exc["product"], exc["unit"], exc["location"]))
+                        if col not in in_scenario:
+                            raise KeyError(
+                                "Can't find the supplier of exchange {} of dataset {} in scenario {}.".format(
+                                    (exc["name"], exc["product"], exc["unit"], exc["location"]),
+                                    (ds["name"], ds["location"]),
+                                    (model, pathway, year),
+                                )
+                            )
+                        rows_A.append(row)
+                        cols_A.append(col)
+                        values_A.append(exc["amount"] if exc["type"] == "production" else exc["amount"] * -1)
+
+                    elif exc["type"] == "biosphere":
+                        try:
+                            cols_B.append(index_B[exc["input"][1]])
+                        except KeyError:
+                            print("Cannot find the biosphere flow", exc["name"], exc.get("categories"))
+                            continue
+                        rows_B.append(row)
+                        values_B.append(exc["amount"] * -1)
+
+            coordinates_A.append(
+                (np.array(rows_A, dtype=np.int64), np.array(cols_A, dtype=np.int64), np.array(values_A, dtype=float))
+            )
+            coordinates_B.append(
+                (np.array(rows_B, dtype=np.int64), np.array(cols_B, dtype=np.int64), np.array(values_B, dtype=float))
+            )
+
+        self.activities = list(index_A)
+        self.activities_in_scenarios = np.zeros((len(self.scenarios), len(self.activities)), dtype=bool)
+        for k, rows in enumerate(activities_in_scenarios):
+            self.activities_in_scenarios[k, rows] = True
+        self.flows = [None] * len(index_B)
+        for flow, i in create_index_of_B_matrix().items():
+            self.flows[i] = flow
+
+        self.A_indices, self.A_values = share_sparsity_pattern(coordinates_A, len(self.activities))
+        self.B_indices, self.B_values = share_sparsity_pattern(coordinates_B, len(self.flows))
+
+    @classmethod
+    def load(cls, filepath, mmap_mode="r"):
+        """
+        Load a matrix store written by :meth:`write`.
+
+        :param filepath: directory of the store
+        :type filepath: str
+        :param mmap_mode: memory-map mode of the values, as for `numpy.load`. If None, values are read into memory.
+        :type mmap_mode: str
+        :return: matrix store
+        :rtype: MatrixStore
+        """
+        filepath = Path(filepath)
+        store = cls.__new__(cls)
+
+        with open(filepath / "scenarios.csv") as f:
+            store.scenarios = [(row[0], row[1], int(row[2])) for row in csv.reader(f, delimiter=";")]
+        with open(filepath / "A_matrix_index.csv") as f:
+            store.activities = [tuple(row[:4]) for row in csv.reader(f, delimiter=";")]
+        with open(filepath / "B_matrix_index.csv") as f:
+            store.flows = [tuple(row[:4]) for row in csv.reader(f, delimiter=";")]
+
+        store.activities_in_scenarios = np.load(filepath / "activities_in_scenarios.npy")
+        for matrix in ("A", "B"):
+            setattr(store, matrix + "_indices", np.load(filepath / "{}_matrix_indices.npy".format(matrix)))
+            setattr(
+                store,
+                matrix + "_values",
+                np.load(filepath / "{}_matrix_values.npy".format(matrix), mmap_mode=mmap_mode),
+            )
+        return store
+
+    def write(self, filepath):
+        """
+        Write the store into the directory `filepath`: indices of activities and biosphere flows, and scenarios,
+        as csv files, and sparsity patterns, values and activities of each scenario as NumPy binary files.
+
+        :param filepath: directory of the store
+        :type filepath: str
+        """
+        filepath = Path(filepath)
+        if not os.path.exists(filepath):
+            os.makedirs(filepath)
+
+        with open(filepath / "scenarios.csv", "w") as f:
+            writer = csv.writer(f, delimiter=";", lineterminator="\n",)
+            for k, scenario in enumerate(self.scenarios):
+                writer.writerow(list(scenario) + [k])
+
+        for name, index in (("A_matrix_index.csv", self.activities), ("B_matrix_index.csv", self.flows)):
+            with open(filepath / name, "w") as f:
+                writer = csv.writer(f, delimiter=";", lineterminator="\n",)
+                for i, d in enumerate(index):
+                    writer.writerow(list(d) + [i])
+
+        np.save(filepath / "activities_in_scenarios.npy", self.activities_in_scenarios)
+        for matrix in ("A", "B"):
+            np.save(filepath / "{}_matrix_indices.npy".format(matrix), getattr(self, matrix + "_indices"))
+            np.save(filepath / "{}_matrix_values.npy".format(matrix), getattr(self, matrix + "_values"))
+
+        print("Matrix store saved in {}.".format(filepath))
+
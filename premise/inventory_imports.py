@@ -3,13 +3,13 @@ import wurst
 from prettytable import PrettyTable
 from wurst import searching as ws
 from bw2io import ExcelImporter, Migration
-import carculator
-import carculator_truck
 from pathlib import Path
 import csv
-import uuid
 import numpy as np
 from .geomap import Geomap
+from .data_registry import registry
+from .profiling import profiler
+from .utils import get_dataset_code, intern_database_strings
 
 FILEPATH_BIOSPHERE_FLOWS = DATA_DIR / "dict_biosphere.txt"
 
@@ -732,6 +732,7 @@ class BaseInventoryImport:
             if (x["name"], x["reference product"], x["location"]) not in self.db_names
         ]
 
+    @profiler.profile()
     def merge_inventory(self):
         """Prepare :attr:`import_db` and merge the inventory to the ecoinvent :attr:`db`.
 
@@ -741,7 +742,7 @@ class BaseInventoryImport:
 
         """
         self.prepare_inventory()
-        self.db.extend(self.import_db)
+        self.db.extend(intern_database_strings(self.import_db.data))
 
     def search_exchanges(self, srchdict):
         """Search :attr:`import_db` by field values.
@@ -777,6 +778,7 @@ class BaseInventoryImport:
         return results
 
     @staticmethod
+    @registry.memoize(FILEPATH_BIOSPHERE_FLOWS)
     def get_biosphere_code():
         """
         Retrieve a dictionary with biosphere flow names and uuid codes.
@@ -841,7 +843,7 @@ class BaseInventoryImport:
         # Add a `code` field if missing
         for x in self.import_db.data:
             if "code" not in x:
-                x["code"] = str(uuid.uuid4().hex)
+                x["code"] = get_dataset_code(x)
 
     def correct_product_field(self, exc):
         """
@@ -1481,6 +1483,9 @@ class CarculatorInventory(BaseInventoryImport):
         """Create `carculator` fleet average inventories for a given range of years.
         """
 
+        # Only imported when passenger cars are updated, as it is slow to import
+        import carculator
+
         cip = carculator.CarInputParameters()
         cip.static()
         _, array = carculator.fill_xarray_from_input_parameters(cip)
@@ -1663,6 +1668,7 @@ class CarculatorInventory(BaseInventoryImport):
         # Check for duplicates
         self.check_for_duplicates()
 
+    @profiler.profile()
     def merge_inventory(self):
         self.prepare_inventory()
 
@@ -1673,7 +1679,7 @@ class CarculatorInventory(BaseInventoryImport):
         ]
 
         self.db = [x for x in self.db if not any(y for y in activities_to_remove if y in x["name"])]
-        self.db.extend(self.import_db)
+        self.db.extend(intern_database_strings(self.import_db.data))
 
         exchanges_to_modify = [
             'market for transport, passenger car, large size, petol, EURO 4',
@@ -1757,6 +1763,9 @@ class TruckInventory(BaseInventoryImport):
         """Create `carculator_truck` fleet average inventories for a given range of years.
         """
 
+        # Only imported when trucks are updated, as it is slow to import
+        import carculator_truck
+
         fleet_array = carculator_truck.create_fleet_composition_from_IAM_file(
             self.fleet_file
         )
@@ -1929,6 +1938,7 @@ class TruckInventory(BaseInventoryImport):
         # Check for duplicates
         self.check_for_duplicates()
 
+    @profiler.profile()
     def merge_inventory(self):
         self.prepare_inventory()
 
@@ -1937,7 +1947,7 @@ class TruckInventory(BaseInventoryImport):
         ]
 
         self.db = [x for x in self.db if not any(y for y in activities_to_remove if y in x["name"])]
-        self.db.extend(self.import_db)
+        self.db.extend(intern_database_strings(self.import_db.data))
 
 
         for ds in self.db:
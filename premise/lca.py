@@ -0,0 +1,193 @@
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import LinearOperator, gmres, splu
+
+
+class ScenarioLCA:
+    """
+    Life cycle assessment of functional units, in each scenario of a :class:`premise.export.MatrixStore`,
+    for one impact category.
+
+    The technosphere matrix of a scenario is factorized once (sparse LU decomposition, by SuperLU),
+    and the factorization is reused for all demand vectors, solved together as the columns of one matrix.
+    Scores do not need the inventories: the transposed system is solved once by scenario for the characterized
+    biosphere matrix, and the score of each functional unit is then a dot product with its demand vector.
+
+    Scenario matrices differ only slightly from each other. With `iterative`, only the first scenario
+    is factorized for scores; the transposed systems of the other scenarios are solved with GMRES, started from
+    the solution of the first scenario and preconditioned by its factorization. GMRES solves one right-hand side
+    at a time, so inventories of several demands are still computed from the factorization of each scenario.
+
+    Usage::
+
+        store = ndb.write_db_to_matrix_store()
+        lca = ScenarioLCA(store, {("Carbon dioxide, fossil", "air", "unspecified", "kilogram"): 1})
+        scores = lca.lcia_scenarios([{activity: 1} for activity in store.activities])
+
+    :ivar store: matrices of the scenarios
+    :vartype store: premise.export.MatrixStore
+    :ivar characterization: characterization factor of each biosphere flow of the store, by index
+    :vartype characterization: numpy.ndarray
+    :ivar iterative: if True, solve the systems of all scenarios but the first one iteratively, for scores
+    :vartype iterative: bool
+    :ivar tolerance: relative tolerance of the iterative solver
+    :vartype tolerance: float
+
+    """
+
+    def __init__(self, store, characterization_factors, iterative=False, tolerance=1e-10):
+        """
+        :param store: matrices of the scenarios
+        :type store: premise.export.MatrixStore
+        :param characterization_factors: characterization factors, by (name, category, sub-category, unit)
+            of biosphere flow
+        :type characterization_factors: dict
+        :param iterative: if True, solve the systems of all scenarios but the first one iteratively, for scores
+        :type iterative: bool
+        :param tolerance: relative tolerance of the iterative solver
+        :type tolerance: float
+        """
+        self.store = store
+        self.iterative = iterative
+        self.tolerance = tolerance
+        self.characterization = np.array(
+            [characterization_factors.get(tuple(flow), 0) for flow in store.flows], dtype=float
+        )
+        self.factorizations = {}
+        self.adjoints = {}
+
+    def technosphere_matrix(self, k):
+        """
+        Return the technosphere matrix of scenario `k`: products in rows, activities in columns,
+        production amounts positive and inputs negative.
+        Activities of the store which are not part of the scenario produce one unit of their product and nothing else,
+        so that the matrix stays invertible.
+
+        :rtype: scipy.sparse.csc_matrix
+        """
+        n = len(self.store.activities)
+        activities, products = self.store.A_indices
+        matrix = sparse.csc_matrix((np.asarray(self.store.A_values[k]), (products, activities)), shape=(n, n))
+        missing = ~np.asarray(self.store.activities_in_scenarios[k])
+        return (matrix + sparse.diags(missing.astype(float))).tocsc()
+
+    def biosphere_matrix(self, k):
+        """
+        Return the biosphere matrix of scenario `k`: biosphere flows in rows, activities in columns,
+        emissions positive.
+
+        :rtype: scipy.sparse.csr_matrix
+        """
+        activities, flows = self.store.B_indices
+        return sparse.csr_matrix(
+            (np.asarray(self.store.B_values[k]) * -1, (flows, activities)),
+            shape=(len(self.store.flows), len(self.store.activities)),
+        )
+
+    def factorize(self, k):
+        """
+        Return the LU factorization of the technosphere matrix of scenario `k`, computed on the first call.
+
+        :rtype: scipy.sparse.linalg.SuperLU
+        """
+        if k not in self.factorizations:
+            self.factorizations[k] = splu(self.technosphere_matrix(k))
+        return self.factorizations[k]
+
+    def demand_matrix(self, demands):
+        """
+        Return demand vectors as the columns of a matrix.
+
+        :param demands: list of demands, as dictionaries of amounts by activity of the store,
+            or (sparse) array of demand vectors, of shape (number of activities,)
+            or (number of activities, number of demands)
+        :type demands: list or numpy.ndarray
+        :rtype: scipy.sparse.csc_matrix
+        """
+        if isinstance(demands, list):
+            index = {tuple(activity): i for i, activity in enumerate(self.store.activities)}
+            rows, cols, values = [], [], []
+            for j, demand in enumerate(demands):
+                for activity, amount in demand.items():
+                    rows.append(index[tuple(activity)])
+                    cols.append(j)
+                    values.append(amount)
+            return sparse.csc_matrix(
+                (np.array(values, dtype=float), (rows, cols)), shape=(len(index), len(demands))
+            )
+
+        if sparse.issparse(demands):
+            return sparse.csc_matrix(demands, dtype=float)
+
+        demands = np.asarray(demands, dtype=float)
+        return sparse.csc_matrix(demands.reshape(len(demands), -1))
+
+    def solve(self, k, b, transposed=False, x0=None):
+        """
+        Solve the technosphere system of scenario `k`, or its transpose, for one or several right-hand sides.
+        With :attr:`iterative`, the system of a scenario other than the first is solved for a single right-hand side
+        with GMRES, started from `x0` and preconditioned by the factorization of the first scenario.
+        Otherwise, or if GMRES does not converge, the matrix of the scenario is factorized.
+
+        :param b: right-hand sides, of shape (number of activities,) or (number of activities, number of demands)
+        :type b: numpy.ndarray
+        :param transposed: if True, solve the transposed system
+        :type transposed: bool
+        :param x0: initial guess of GMRES, of shape (number of activities,)
+        :type x0: numpy.ndarray
+        :rtype: numpy.ndarray
+        """
+        trans = "T" if transposed else "N"
+
+        n = len(self.store.activities)
+        if not self.iterative or k == 0 or k in self.factorizations or b.size != n:
+            return self.factorize(k).solve(b, trans=trans)
+
+        matrix = self.technosphere_matrix(k)
+        if transposed:
+            matrix = matrix.T.tocsr()
+        base = self.factorize(0)
+        preconditioner = LinearOperator((n, n), matvec=lambda x: base.solve(x, trans=trans))
+
+        column = b.reshape(n)
+        if x0 is None:
+            x0 = base.solve(column, trans=trans)
+        x, info = gmres(matrix, column, x0=x0.reshape(n), M=preconditioner, rtol=self.tolerance, atol=0)
+        if info != 0:
+            print("GMRES did not converge for scenario {}. Factorizing its matrix.".format(k))
+            return self.factorize(k).solve(b, trans=trans)
+        return x.reshape(b.shape)
+
+    def lci(self, k, demands):
+        """
+        Return the supply of each activity, in scenario `k`, for each demand.
+
+        :param demands: see :meth:`demand_matrix`
+        :return: supply vectors, of shape (number of activities, number of demands)
+        :rtype: numpy.ndarray
+        """
+        return self.solve(k, self.demand_matrix(demands).toarray())
+
+    def lcia(self, k, demands):
+        """
+        Return the score of each demand in scenario `k`.
+
+        :param demands: see :meth:`demand_matrix`
+        :return: scores, of shape (number of demands,)
+        :rtype: numpy.ndarray
+        """
+        if k not in self.adjoints:
+            characterized = self.biosphere_matrix(k).T @ self.characterization
+            self.adjoints[k] = self.solve(k, characterized, transposed=True, x0=self.adjoints.get(0))
+        return self.demand_matrix(demands).T @ self.adjoints[k]
+
+    def lcia_scenarios(self, demands):
+        """
+        Return the score of each demand in each scenario.
+
+        :param demands: see :meth:`demand_matrix`
+        :return: scores, of shape (number of scenarios, number of demands)
+        :rtype: numpy.ndarray
+        """
+        demands = self.demand_matrix(demands)
+        return np.vstack([self.lcia(k, demands) for k in range(len(self.store.scenarios))])
@@ -0,0 +1,233 @@
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from wurst import searching as ws
+from .compact import CompactDatabase
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+# `wurst` search functions which calls are counted
+WURST_SEARCH_FUNCTIONS = ("get_one", "get_many")
+
+
+def get_peak_rss():
+    """
+    Return the peak resident set size of the process so far, in megabytes,
+    or None if it cannot be measured on this platform.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+def count_datasets_and_exchanges(obj):
+    """
+    Return the number of datasets and exchanges of the database(s) held by `obj`:
+    either a database, an object with a `db` attribute (e.g., :class:`premise.cement.Cement`),
+    or an object with `scenarios` (e.g., :class:`premise.ecoinvent_modification.NewDatabase`).
+    """
+    if isinstance(obj, list):
+        dbs = [obj]
+    elif isinstance(getattr(obj, "scenarios", None), list):
+        dbs = [s["database"] for s in obj.scenarios if "database" in s]
+    elif isinstance(getattr(obj, "db", None), list):
+        dbs = [obj.db]
+    else:
+        return None, None
+
+    def count_exchanges(db):
+        if isinstance(db, CompactDatabase):
+            # Read from the offsets of the exchanges, rather than by expanding the datasets
+            return int(db.offsets[-1])
+        return sum(len(ds.get("exchanges", [])) for ds in db)
+
+    return sum(len(db) for db in dbs), sum(count_exchanges(db) for db in dbs)
+
+
+class Profiler:
+    """
+    Records the wall time, peak memory use, database size and number of `wurst` search calls
+    of the transformation stages and their sub-steps.
+
+    It is disabled by default, in which case instrumented stages run without overhead.
+    Records can be exported as JSON, or as a Chrome trace (to open in chrome://tracing or https://ui.perfetto.dev).
+
+    Usage::
+
+        from premise.profiling import profiler
+        profiler.enable()
+        ndb.update_all()
+        profiler.to_chrome_trace("premise_trace.json")
+
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.cprofile_dir = None
+        self.records = []
+        self.stack = []
+        self.wurst_calls = 0
+        self.origin = time.perf_counter()
+        self._wurst_functions = {}
+
+    def enable(self, cprofile_dir=None):
+        """
+        Start recording.
+
+        :param cprofile_dir: if given, each outermost stage is also profiled with `cProfile`,
+            and its statistics are saved in that directory as `<stage>_<record number>.prof`.
+        :type cprofile_dir: str
+        """
+        self.enabled = True
+        self.cprofile_dir = Path(cprofile_dir) if cprofile_dir else None
+        if self.cprofile_dir:
+            self.cprofile_dir.mkdir(parents=True, exist_ok=True)
+
+        for name in WURST_SEARCH_FUNCTIONS:
+            if name not in self._wurst_functions:
+                self._wurst_functions[name] = getattr(ws, name)
+                setattr(ws, name, self._count_calls(self._wurst_functions[name]))
+
+    def disable(self):
+        """
+        Stop recording. Records are kept.
+        """
+        self.enabled = False
+        for name, func in self._wurst_functions.items():
+            setattr(ws, name, func)
+        self._wurst_functions = {}
+
+    def reset(self):
+        """
+        Forget all records.
+        """
+        self.records = []
+        self.origin = time.perf_counter()
+
+    def _count_calls(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            self.wurst_calls += 1
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    @contextlib.contextmanager
+    def stage(self, name, obj=None):
+        """
+        Context manager that records a stage.
+
+        :param name: name of the stage
+        :type name: str
+        :param obj: database, or object holding database(s), which size is recorded at the end of the stage
+        """
+        if not self.enabled:
+            yield
+            return
+
+        cprofile = None
+        if self.cprofile_dir and not self.stack:
+            cprofile = cProfile.Profile()
+
+        self.stack.append(name)
+        start = time.perf_counter()
+        wurst_calls = self.wurst_calls
+
+        try:
+            if cprofile:
+                cprofile.enable()
+            yield
+        finally:
+            if cprofile:
+                cprofile.disable()
+                cprofile.dump_stats(self.cprofile_dir / "{}_{}.prof".format(name, len(self.records)))
+
+            end = time.perf_counter()
+            self.stack.pop()
+            datasets, exchanges = count_datasets_and_exchanges(obj)
+
+            self.records.append(
+                {
+                    "name": name,
+                    "parent": self.stack[-1] if self.stack else None,
+                    "depth": len(self.stack),
+                    "start": start - self.origin,
+                    "wall time": end - start,
+                    "peak RSS": get_peak_rss(),
+                    "datasets": datasets,
+                    "exchanges": exchanges,
+                    "wurst search calls": self.wurst_calls - wurst_calls,
+                }
+            )
+
+    def profile(self, name=None):
+        """
+        Decorator that records each call to a method as a stage.
+        The size of the database(s) held by the instance is recorded at the end of the call.
+
+        :param name: name of the stage, by default the qualified name of the method
+        :type name: str
+        """
+
+        def decorator(func):
+            stage_name = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.stage(stage_name, args[0] if args else None):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def to_json(self, filepath):
+        """
+        Export the records to a JSON file.
+
+        :param filepath: path of the JSON file
+        :type filepath: str
+        """
+        with open(filepath, "w") as f:
+            json.dump(self.records, f, indent=2)
+
+    def to_chrome_trace(self, filepath):
+        """
+        Export the records to a JSON file in the Chrome trace event format.
+
+        :param filepath: path of the JSON file
+        :type filepath: str
+        """
+        events = [
+            {
+                "name": r["name"],
+                "ph": "X",
+                "ts": r["start"] * 1e6,
+                "dur": r["wall time"] * 1e6,
+                "pid": os.getpid(),
+                "tid": 0,
+                "args": {
+                    k: r[k] for k in ("peak RSS", "datasets", "exchanges", "wurst search calls")
+                },
+            }
+            for r in self.records
+        ]
+
+        with open(filepath, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, indent=2)
+
+
+profiler = Profiler()
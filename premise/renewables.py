@@ -1,6 +1,7 @@
 from wurst import searching as ws
 from .utils import *
 import re
+from .profiling import profiler
 
 class SolarPV:
     """
@@ -24,6 +25,7 @@ class SolarPV:
         self.db = db
         self.year = year
 
+    @profiler.profile()
     def update_efficiency_of_solar_PV(self):
         """
         Update the efficiency of solar PV modules.
@@ -44,8 +46,16 @@ class SolarPV:
             ]
         )
 
-        for d in ds:
-            power = float(re.findall('\d+', d["name"])[0])
+        ds = list(ds)
+        powers = [float(re.findall('\d+', d["name"])[0]) for d in ds]
+
+        if not powers:
+            return self.db
+
+        # Projected efficiencies of all installations, in one interpolation
+        new_effs = get_efficiency_ratio_solar_PV(self.year, powers).values
+
+        for d, power, new_eff in zip(ds, powers, new_effs):
 
             for exc in ws.technosphere(d, *[
                 ws.contains('name', 'photovoltaic'),
@@ -55,7 +65,6 @@ class SolarPV:
                 surface = float(exc["amount"])
                 max_power = surface # in kW, since we assume a constant 1,000W/m^2
                 current_eff = power / max_power
-                new_eff = get_efficiency_ratio_solar_PV(self.year, power).values
 
                 # We only update the efficiency if it is higher than the current one.
                 if new_eff > current_eff:
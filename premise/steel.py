@@ -5,10 +5,7 @@ import itertools
 from .geomap import Geomap
 from .activity_maps import InventorySet
 from .utils import *
-import uuid
-import copy
-import os
-import contextlib
+from .profiling import profiler
 
 
 
@@ -100,9 +97,9 @@ class Steel:
 
                 raise
 
-            d_act[d] = copy.deepcopy(ds)
+            d_act[d] = copy_dataset(ds)
             d_act[d]["location"] = d
-            d_act[d]["code"] = str(uuid.uuid4().hex)
+            d_act[d]["code"] = get_dataset_code(d_act[d])
 
             if "input" in d_act[d]:
                 d_act[d].pop("input")
@@ -241,43 +238,26 @@ class Steel:
                         exc['location'] = act['location']
 
 
-    def update_pollutant_emissions(self, ds):
+    def update_pollutant_emissions(self, datasets):
         """
         Update pollutant emissions based on GAINS data.
-        :return:
-        """
-
-        # Update biosphere exchanges according to GAINS emission values
-        for exc in ws.biosphere(
-                ds, ws.either(*[ws.contains("name", x) for x in self.emissions_map])
-            ):
-            remind_emission_label = self.emissions_map[exc["name"]]
-
-            try:
-                remind_emission = self.iam_data.steel_emissions.loc[
-                    dict(
-                        region=ds["location"],
-                        pollutant=remind_emission_label
-                    )
-                ].values.item(0)
-            except KeyError:
-                # TODO: fix this.
-                # GAINS does not have a 'World' region, hence we use China as a temporary fix
-                remind_emission = self.iam_data.steel_emissions.loc[
-                    dict(
-                        region='CHA',
-                        pollutant=remind_emission_label
-                    )
-                ].values.item(0)
+        GAINS does not have a 'World' region, hence China is used
+        for datasets which region is not covered.
 
+        :param datasets: list of steel production datasets, located in IAM regions
+        :type datasets: list
+        :return: the updated datasets
+        :rtype: list
+        """
 
-            if exc["amount"] == 0:
-                wurst.rescale_exchange(
-                    exc, remind_emission / 1, remove_uncertainty=True
-                )
-            else:
-                wurst.rescale_exchange(exc, remind_emission / exc["amount"])
-        return ds
+        return rescale_pollutant_emissions(
+            datasets,
+            self.iam_data.steel_emissions,
+            self.emissions_map,
+            regions=[ds["location"] for ds in datasets],
+            # TODO: fix this.
+            fallback_region="CHA",
+        )
 
     def adjust_recycled_steel_share(self, dict_act):
         """
@@ -346,6 +326,7 @@ class Steel:
 
         return dict_act
 
+    @profiler.profile()
     def generate_activities(self, industry_module_present=True):
         """
         This function generates new activities for primary and secondary steel production and add them to the ecoinvent db.
@@ -608,7 +589,7 @@ class Steel:
 
 
                 # Update non fuel-related emissions according to GAINS
-                d_act_steel[d] = {k: self.update_pollutant_emissions(v) for k, v in d_act_steel[d].items()}
+                self.update_pollutant_emissions(list(d_act_steel[d].values()))
 
                 self.db.extend([v for v in d_act_steel[d].values()])
 
@@ -642,7 +623,7 @@ class Steel:
             #                     ws.contains("name", "steel production, electric")),
             #           ws.contains("reference product", "steel")]
             # ):
-            #     self.update_pollutant_emissions(ds)
+            #     self.update_pollutant_emissions([ds])
             #
             #
 
@@ -654,6 +635,7 @@ class Steel:
 
         return self.db
 
+    @profiler.profile()
     def create_new_steel_markets(self):
 
         d_act = {}
@@ -671,14 +653,14 @@ class Steel:
                     ws.equals("location", "GLO"),
                 )
 
-                d_act[loc] = copy.deepcopy(ds)
+                d_act[loc] = copy_dataset(ds)
 
             for d in d_act:
                 total_production_share = int(self.recycling_rates.sel(region=d)["world_share"].sum(dim="type").values.item(0) * 100)
                 total_production_bof = int(self.recycling_rates.sel(region=d)["world_share"].sum(dim="type").values.item(0) * 100)
                 total_production_ef = 100 - total_production_bof
                 d_act[d]["location"] = d
-                d_act[d]["code"] = str(uuid.uuid4().hex)
+                d_act[d]["code"] = get_dataset_code(d_act[d])
                 d_act[d]["production volume"] = total_production_share
                 d_act[d]["comment"] = f"This market activity has been created by `premise` to represent the steel supply from the region {d}." \
                     f"This region supplies the equivalent of {total_production_share} pct. of the world crude steel production ({total_production_bof} pct from Blast oxygen furnace and " \
@@ -826,343 +808,151 @@ class Steel:
 
             self.db.extend([v for v in d_act.values()])
 
-    def relink_to_new_steel_markets(self):
-
-        with open(os.devnull, "w") as f, contextlib.redirect_stdout(f):
-
-            # Loop through datasets that are not steel markets
-            for ds in ws.get_many(
-                        self.db,
-                        ws.doesnt_contain_any("name", ["market for steel, low-alloyed"])
-            ):
-                # Loop through technosphere exchanges that receive an input from the steel market
-                excs = (exc for exc in ws.technosphere(ds) if exc["name"] == "market for steel, low-alloyed")
-
-                for exc in excs:
-
-                    # First, try to find a steel market that has the same location as the dataset
-                    try:
-                        new_supplier = ws.get_one(
-                            self.db,
-                            ws.equals("name", "market for steel, low-alloyed"),
-                            ws.equals("location", ds["location"]),
-                            ws.contains("reference product", "steel")
-                        )
-
-                        exc["location"] = new_supplier["location"]
-
-                    # If it fails
-                    except ws.NoResults:
-
-                        try:
-                            # If the dataset location is a region of the IAM model
-                            # Let's try to find a steel market dataset which location
-                            # is included in that IAM region
-                            if ds["location"] in self.iam_data.regions:
-                                new_supplier = ws.get_one(
-                                    self.db,
-                                    *[
-                                        ws.contains("name", "market for steel, low-alloyed"),
-                                        ws.either(*[ws.equals("location", l[1]) if isinstance(l, tuple) else ws.equals(
-                                            "location", l)
-                                                    for l in self.geo.iam_to_ecoinvent_location(ds["location"])
-                                                    ]),
-                                        ws.contains("reference product", "steel")
-
-                                    ]
-                                )
-                                exc["location"] = new_supplier["location"]
-
-                            else:
-                                # If the dataset location is an ecoinvent location
-                                # Let's try to find a steel market which location
-                                # encompasses the location of the dataset
-                                try:
-                                    possible_locs = [l[1] if isinstance(l, tuple) else l
-                                                     for l in self.geo.geo.contained(ds["location"])]
-                                    possible_locs = [l for l in possible_locs if l != "GLO"]
-
-                                    new_supplier = ws.get_one(
-                                        self.db,
-                                        *[
-                                            ws.contains("name", "market for steel, low-alloyed"),
-                                            ws.either(*[ws.equals("location", l) for l in possible_locs]),
-                                            ws.contains("reference product", "steel")
-
-                                        ]
-                                    )
-                                    exc["location"] = new_supplier["location"]
-
-                                except ws.NoResults:
-
-                                    # If the dataset location is an ecoinvent location
-                                    # Let's try to find a steel market which location
-                                    # is a part of the location of the dataset
-                                    possible_locs = [l[1] if isinstance(l, tuple) else l
-                                                     for l in self.geo.geo.within(ds["location"])]
-                                    possible_locs = [l for l in possible_locs if l != "GLO"]
-                                    new_supplier = ws.get_one(
-                                        self.db,
-                                        *[
-                                            ws.contains("name", "market for steel, low-alloyed"),
-                                            ws.either(*[
-                                                ws.equals("location", l) for l in possible_locs]),
-                                            ws.contains("reference product", "steel")
-
-                                        ]
-                                    )
-                                    exc["location"] = new_supplier["location"]
-
-                                except ws.MultipleResults:
-                                    # We have several potential steel suppliers
-                                    # We will look up their respective production volumes
-                                    # And include them proportionally to it
-
-                                    possible_locs = [l[1] if isinstance(l, tuple) else l
-                                                     for l in self.geo.geo.contained(ds["location"])]
-                                    possible_locs = [l for l in possible_locs if l != "GLO"]
-
-                                    possible_suppliers = ws.get_many(
-                                        self.db,
-                                        *[
-                                            ws.contains("name", "market for steel, low-alloyed"),
-                                            ws.either(
-                                                *[ws.equals("location", l) for l in possible_locs]),
-                                            ws.contains("reference product", "steel")
-
-                                        ]
-                                    )
-                                    possible_suppliers = self.get_shares_from_production_volume(possible_suppliers)
-
-                                    # We fetch the initial amount of steel needed
-                                    amount = exc["amount"]
-                                    # We remove the initial exchange
-                                    ds["exchanges"] = [e for e in ds["exchanges"] if
-                                                       e["name"] != "market for steel, low-alloyed"]
-
-                                    for supplier in possible_suppliers:
-                                        ds["exchanges"].append(
-                                            {
-                                                "uncertainty type": 0,
-                                                "loc": amount * possible_suppliers[supplier],
-                                                "amount": amount * possible_suppliers[supplier],
-                                                "type": "technosphere",
-                                                "production volume": 1,
-                                                "product": supplier[2],
-                                                "name": supplier[0],
-                                                "unit": supplier[3],
-                                                "location": supplier[1],
-                                            }
-
-                                        )
-
-                        # Europe without Austria is a new location in ei 3.7
-                        # which is not yet defined in wurst
-                        except KeyError:
-
-                            if ds["location"] == "Europe without Austria":
-                                new_supplier = ws.get_one(
-                                    self.db,
-                                    ws.equals("name", "market for steel, low-alloyed"),
-                                    ws.equals("location", "RER"),
-                                    ws.contains("reference product", "steel")
-                                )
-                                exc["location"] = new_supplier["location"]
-
-                        # If this also fails
-                        except ws.NoResults:
-
-                            try:
-                                # If the dataset location is an ecoinvent location
-                                # Let's try to find a steel market which location
-                                # is a part of the location of the dataset
-
-                                possible_locs = [l[1] if isinstance(l, tuple) else l
-                                                 for l in self.geo.geo.within(ds["location"])]
-                                possible_locs = [l for l in possible_locs if l != "GLO"]
-
-                                new_supplier = ws.get_one(
-                                    self.db,
-                                    *[
-                                        ws.contains("name", "market for steel, low-alloyed"),
-                                        ws.either(*[
-                                            ws.equals("location", l) for l in possible_locs]),
-                                        ws.contains("reference product", "steel")
-
-                                    ]
-                                )
-                                exc["location"] = new_supplier["location"]
-
-                            # If this fails, then we use the GLO steel market
-                            except (ws.NoResults, KeyError):
-                                new_supplier = ws.get_one(
-                                    self.db,
-                                    ws.equals("name", "market for steel, low-alloyed"),
-                                    ws.equals("location", "GLO"),
-                                    ws.contains("reference product", "steel")
-                                )
-                                exc["location"] = new_supplier["location"]
-
-                            except ws.MultipleResults:
-                                # We have several potential steel suppliers
-                                # We will look up their respective production volumes
-                                # And include them proportionally to it
-
-                                possible_locs = [l[1] if isinstance(l, tuple) else l
-                                                 for l in self.geo.geo.contained(ds["location"])]
-                                possible_locs = [l for l in possible_locs if l != "GLO"]
-
-                                possible_suppliers = ws.get_many(
-                                    self.db,
-                                    *[
-                                        ws.contains("name", "market for steel, low-alloyed"),
-                                        ws.either(
-                                            *[ws.equals("location", l) for l in possible_locs]),
-                                        ws.contains("reference product", "steel")
+    def get_steel_suppliers_of_a_location(self, location, steel_markets):
+        """
+        Resolve the steel market(s) that should supply a dataset, given the dataset location.
+        The following fallbacks are tried in turn:
+
+        * a steel market with the same location,
+        * if the location is an IAM region, steel markets which location intersects with the IAM region,
+        * if the location is an ecoinvent location, steel markets which location is a part of the location,
+        * steel markets which location encompasses the location,
+        * the global steel market.
+
+        If several steel markets fit, they are all returned and supply according to their production volumes.
+
+        :param location: location of the steel-consuming dataset
+        :type location: str
+        :param steel_markets: steel market datasets, indexed by location
+        :type steel_markets: dict
+        :return: the fallback used and a list of steel market datasets
+        :rtype: tuple
+        """
 
-                                    ]
-                                )
-                                possible_suppliers = self.get_shares_from_production_volume(possible_suppliers)
-
-                                # We fetch the initial amount of steel needed
-                                amount = exc["amount"]
-                                # We remove the initial exchange
-                                ds["exchanges"] = [e for e in ds["exchanges"] if
-                                                   e["name"] != "market for steel, low-alloyed"]
-
-                                for supplier in possible_suppliers:
-                                    ds["exchanges"].append(
-                                        {
-                                            "uncertainty type": 0,
-                                            "loc": amount * possible_suppliers[supplier],
-                                            "amount": amount * possible_suppliers[supplier],
-                                            "type": "technosphere",
-                                            "production volume": 1,
-                                            "product": supplier[2],
-                                            "name": supplier[0],
-                                            "unit": supplier[3],
-                                            "location": supplier[1],
-                                        }
-
-                                    )
+        def find(locations):
+            return [
+                ds
+                for loc in dict.fromkeys(locations)
+                if loc != "GLO"
+                for ds in steel_markets.get(loc, [])
+            ]
 
-                        except ws.MultipleResults:
-                            # We have several potential steel suppliers
-                            # We will look up their respective production volumes
-                            # And include them proportionally to it
+        def as_ecoinvent_locations(locations):
+            return [l[1] if isinstance(l, tuple) else l for l in locations]
 
-                            if ds["location"] in self.iam_data.regions:
+        suppliers = steel_markets.get(location, [])
+        if suppliers:
+            return "same location", suppliers
 
-                                possible_suppliers = ws.get_many(
-                                    self.db,
-                                    *[
-                                        ws.contains("name", "market for steel, low-alloyed"),
-                                        ws.either(*[ws.equals("location", l[1]) if isinstance(l, tuple) else ws.equals(
-                                            "location", l)
-                                                    for l in self.geo.iam_to_ecoinvent_location(ds["location"])
-                                                    ]),
-                                        ws.contains("reference product", "steel")
+        # Europe without Austria is a new location in ei 3.7
+        # which is not yet defined in wurst
+        if location == "Europe without Austria":
+            suppliers = steel_markets.get("RER", [])
+            if suppliers:
+                return "RER", suppliers
 
-                                    ]
-                                )
+        try:
+            if location in self.iam_data.regions:
+                suppliers = find(
+                    as_ecoinvent_locations(self.geo.iam_to_ecoinvent_location(location))
+                )
+                if suppliers:
+                    return "intersecting IAM region", suppliers
+            else:
+                suppliers = find(as_ecoinvent_locations(self.geo.geo.contained(location)))
+                if suppliers:
+                    return "contained location", suppliers
 
-                                possible_suppliers = self.get_shares_from_production_volume(possible_suppliers)
+            suppliers = find(as_ecoinvent_locations(self.geo.geo.within(location)))
+            if suppliers:
+                return "encompassing location", suppliers
 
-                            else:
+        except KeyError:
+            # The location is unknown to the geomatcher
+            pass
 
-                                possible_locs = [l[1] if isinstance(l, tuple) else l
-                                                 for l in self.geo.geo.contained(ds["location"])]
-                                possible_locs = [l for l in possible_locs if l != "GLO"]
+        return "GLO", steel_markets.get("GLO", [])
 
-                                possible_suppliers = ws.get_many(
-                                    self.db,
-                                    *[
-                                        ws.contains("name", "market for steel, low-alloyed"),
-                                        ws.either(*[ws.equals("location", l) for l in possible_locs]),
-                                        ws.contains("reference product", "steel")
-
-                                    ]
-                                )
-                                possible_suppliers = self.get_shares_from_production_volume(possible_suppliers)
+    @profiler.profile()
+    def relink_to_new_steel_markets(self):
+        """
+        Relink steel-consuming datasets to the steel market(s) that best fit their location.
+        Steel markets are indexed by location once, and the fallback chain is resolved once per location,
+        so that relinking all steel consumers is a single pass through the database.
+        The number of exchanges relinked by each fallback is printed.
+        """
 
-                            # We fetch the initial amount of steel needed
-                            amount = exc["amount"]
-                            # We remove the initial exchange
-                            ds["exchanges"] = [e for e in ds["exchanges"] if
-                                               e["name"] != "market for steel, low-alloyed"]
+        steel_markets = {}
+        for ds in self.db:
+            if ds["name"] == "market for steel, low-alloyed" and "steel" in ds["reference product"]:
+                steel_markets.setdefault(ds["location"], []).append(ds)
 
-                            for supplier in possible_suppliers:
-                                ds["exchanges"].append(
-                                    {
-                                        "uncertainty type": 0,
-                                        "loc": amount * possible_suppliers[supplier],
-                                        "amount": amount * possible_suppliers[supplier],
-                                        "type": "technosphere",
-                                        "production volume": 1,
-                                        "product": supplier[2],
-                                        "name": supplier[0],
-                                        "unit": supplier[3],
-                                        "location": supplier[1],
-                                    }
+        resolved = {}
+        count_fallbacks = {}
 
-                                )
+        # Loop through datasets that are not steel markets
+        for ds in self.db:
+            if "market for steel, low-alloyed" in ds["name"]:
+                continue
 
-                    except ws.MultipleResults:
-                        # We have several potential steel suppliers
-                        # We will look up their respective production volumes
-                        # And include them proportionally to it
+            if not any(
+                exc["name"] == "market for steel, low-alloyed"
+                for exc in ds["exchanges"]
+                if exc["type"] == "technosphere"
+            ):
+                continue
 
-                        if ds["location"] in self.iam_data.regions:
+            if ds["location"] not in resolved:
+                fallback, suppliers = self.get_steel_suppliers_of_a_location(
+                    ds["location"], steel_markets
+                )
+                resolved[ds["location"]] = (
+                    fallback,
+                    self.get_shares_from_production_volume(suppliers),
+                )
 
-                            possible_suppliers = ws.get_many(
-                                self.db,
-                                *[
-                                    ws.contains("name", "market for steel, low-alloyed"),
-                                    ws.either(*[ws.equals("location", l[1]) if isinstance(l, tuple) else ws.equals(
-                                        "location", l)
-                                                for l in self.geo.iam_to_ecoinvent_location(ds["location"])
-                                                ]),
-                                    ws.contains("reference product", "steel")
+            fallback, suppliers = resolved[ds["location"]]
 
-                                ]
-                            )
+            if not suppliers:
+                continue
 
-                            possible_suppliers = self.get_shares_from_production_volume(possible_suppliers)
+            new_exchanges = []
+            for exc in ds["exchanges"]:
 
-                        else:
+                # Loop through technosphere exchanges that receive an input from the steel market
+                if exc["type"] != "technosphere" or exc["name"] != "market for steel, low-alloyed":
+                    new_exchanges.append(exc)
+                    continue
 
-                            possible_locs = [l[1] if isinstance(l, tuple) else l
-                                             for l in self.geo.geo.contained(ds["location"])]
-                            possible_locs = [l for l in possible_locs if l != "GLO"]
+                count_fallbacks[fallback] = count_fallbacks.get(fallback, 0) + 1
 
-                            possible_suppliers = ws.get_many(
-                                    self.db,
-                                    *[
-                                        ws.contains("name", "market for steel, low-alloyed"),
-                                        ws.either(*[ws.equals("location", l) for l in possible_locs]),
-                                        ws.contains("reference product", "steel")
+                if len(suppliers) == 1:
+                    supplier = list(suppliers)[0]
+                    exc["name"], exc["location"], exc["product"] = supplier[0], supplier[1], supplier[2]
+                    new_exchanges.append(exc)
 
-                                    ]
-                                )
-                            possible_suppliers = self.get_shares_from_production_volume(possible_suppliers)
+                else:
+                    # We have several potential steel suppliers
+                    # We include them proportionally to their respective production volumes
+                    amount = exc["amount"]
 
-                        # We fetch the initial amount of steel needed
-                        amount = exc["amount"]
-                        # We remove the initial exchange
-                        ds["exchanges"] = [e for e in ds["exchanges"] if e["name"] != "market for steel, low-alloyed"]
+                    for supplier in suppliers:
+                        new_exchanges.append(
+                            {
+                                "uncertainty type": 0,
+                                "loc": amount * suppliers[supplier],
+                                "amount": amount * suppliers[supplier],
+                                "type": "technosphere",
+                                "production volume": 1,
+                                "product": supplier[2],
+                                "name": supplier[0],
+                                "unit": supplier[3],
+                                "location": supplier[1],
+                            }
+                        )
 
-                        for supplier in possible_suppliers:
-                            ds["exchanges"].append(
-                                {
-                                    "uncertainty type": 0,
-                                    "loc": amount * possible_suppliers[supplier],
-                                    "amount": amount * possible_suppliers[supplier],
-                                    "type": "technosphere",
-                                    "production volume": 1,
-                                    "product": supplier[2],
-                                    "name": supplier[0],
-                                    "unit": supplier[3],
-                                    "location": supplier[1],
-                                }
+            ds["exchanges"] = new_exchanges
 
-                            )
+        print("Steel-consuming exchanges relinked, per supplier found:")
+        for fallback, count in count_fallbacks.items():
+            print(f"\t{fallback}: {count}")
@@ -1,8 +1,14 @@
 from . import DATA_DIR
+import copy
 import csv
+import hashlib
 import pandas as pd
 from .export import *
+from .data_registry import registry
 import numpy as np
+import sys
+import wurst
+import xarray as xr
 from wurst import searching as ws
 
 CO2_FUELS = DATA_DIR / "fuel_co2_emission_factor.txt"
@@ -16,9 +22,15 @@ STEEL_RECYCLING_SHARES = DATA_DIR / "steel" / "steel_recycling_shares.csv"
 REMIND_TO_FUELS = DATA_DIR / "steel" / "remind_fuels_correspondance.txt"
 EFFICIENCY_RATIO_SOLAR_PV = DATA_DIR / "renewables" / "efficiency_solar_PV.csv"
 
+# Fields of a dataset from which the code of a new dataset is derived
+CODE_FIELDS = ("name", "reference product", "location", "unit")
+# Fields of datasets and exchanges which values are identifiers, repeated throughout the database
+IDENTIFIER_FIELDS = ("name", "reference product", "product", "location", "unit", "type", "database", "categories", "input")
+
 def eidb_label(model, scenario, year):
     return "ecoinvent_" + model + "_" + scenario + "_" + str(year)
 
+@registry.memoize(REMIND_TO_FUELS)
 def get_correspondance_remind_to_fuels():
     """
     Return a dictionary with REMIND fuels as keys and ecoinvent activity names and reference products as values.
@@ -32,6 +44,7 @@ def get_correspondance_remind_to_fuels():
             d[row[0]] = {"fuel name": row[1], "activity name": row[2], "reference product": row[3]}
     return d
 
+@registry.memoize(CO2_FUELS)
 def get_fuel_co2_emission_factors():
     """
     Return a dictionary with fuel names as keys and, as values:
@@ -50,6 +63,7 @@ def get_fuel_co2_emission_factors():
 
     return d
 
+@registry.memoize(LHV_FUELS)
 def get_lower_heating_values():
     """
     Loads a csv file into a dictionary. This dictionary contains lower heating values for a number of fuel types.
@@ -63,10 +77,12 @@ def get_lower_heating_values():
         d = {k: float(v) for k, v in d.items()}
         return d
 
-def get_efficiency_ratio_solar_PV(year, power):
+@registry.memoize(EFFICIENCY_RATIO_SOLAR_PV)
+def get_efficiency_solar_PV():
     """
-    Return a dictionary with years as keys and efficiency ratios as values
-    :return: dict
+    Return an array with the efficiency ratios of solar PV installations, per power and per year.
+    The file is only read once, and the array is shared across scenarios.
+    :return: xarray
     """
 
     df = pd.read_csv(
@@ -74,9 +90,22 @@ def get_efficiency_ratio_solar_PV(year, power):
 
     return df.groupby(["power", "year"]) \
         .mean()["value"] \
-        .to_xarray() \
+        .to_xarray()
+
+def get_efficiency_ratio_solar_PV(year, power):
+    """
+    Return the efficiency ratio(s) of solar PV installations, interpolated for a given year and power(s).
+    :param year: year
+    :type year: int
+    :param power: power of the installation(s), in kWp
+    :type power: float or list
+    :return: xarray
+    """
+
+    return get_efficiency_solar_PV() \
         .interp(year=year, power=power, kwargs={"fill_value": "extrapolate"})
 
+@registry.memoize(CLINKER_RATIO_ECOINVENT_35, CLINKER_RATIO_ECOINVENT_36, preload_args=(("3.5",), ("3.6",), ("3.7",), ("3.7.1",)))
 def get_clinker_ratio_ecoinvent(version):
     """
     Return a dictionary with (cement names, location) as keys and clinker-to-cement ratios as values,
@@ -94,34 +123,118 @@ def get_clinker_ratio_ecoinvent(version):
             d[(val[0], val[1])] = float(val[2])
     return d
 
-def get_clinker_ratio_remind(year):
+@registry.memoize(CLINKER_RATIO_REMIND)
+def get_clinker_ratios_remind():
     """
-    Return an array with the average clinker-to-cement ratio per year and per region, as given by REMIND.
+    Return an array with the average clinker-to-cement ratio per year and per region, as given by REMIND,
+    for the years available in the data file.
     :return: xarray
-    :return:
     """
     df = pd.read_csv(
         CLINKER_RATIO_REMIND)
 
     return df.groupby(["region", "year"]) \
         .mean()["value"] \
-        .to_xarray() \
-        .interp(year=year)
+        .to_xarray()
 
-def get_steel_recycling_rates(year):
+def get_clinker_ratio_remind(year):
     """
-    Return an array with the average shares for primary (Basic oxygen furnace) and secondary (Electric furnace)
-    steel production per year and per region, as given by: https://www.bir.org/publications/facts-figures/download/643/175/36?method=view
-    for 2015-2019, further linearly extrapolated to 2020, 2030, 2040 and 2050.
+    Return an array with the average clinker-to-cement ratio per year and per region, as given by REMIND.
     :return: xarray
     :return:
     """
+    return get_clinker_ratios_remind() \
+        .interp(year=year)
+
+def adjust_clinker_shares(shares, ratios, target):
+    """
+    Reallocate cement supply shares so that the average clinker-to-cement ratio meets `target`.
+
+    Supply is withdrawn from the cements with the highest clinker-to-cement ratio first and given
+    to the supplied cement with the lowest ratio, until the target is met exactly.
+    If the target cannot be met, all the supply is given to the cement with the lowest ratio.
+    Shares of markets already at, or below, the target are left untouched.
+
+    The cement types are given along the last axis, any leading axes (e.g., region, year) are
+    solved at once. Missing cement types can be padded with a share of 0 and a NaN ratio.
+
+    :param shares: supply shares of each cement type
+    :type shares: numpy.ndarray
+    :param ratios: clinker-to-cement ratio of each cement type
+    :type ratios: numpy.ndarray
+    :param target: clinker-to-cement ratio to reach, one value per market
+    :type target: numpy.ndarray
+    :return: adjusted supply shares, with the same shape as `shares`
+    :rtype: numpy.ndarray
+    """
+    shares = np.nan_to_num(np.asarray(shares, dtype=float))
+    ratios = np.asarray(ratios, dtype=float)
+    target = np.asarray(target, dtype=float)
+    shares, ratios, _ = np.broadcast_arrays(shares, ratios, target[..., None])
+
+    supplied = (shares > 0) & ~np.isnan(ratios)
+    ratios = np.where(supplied, ratios, np.nan)
+
+    # The supplied cement with the lowest ratio receives the reallocated supply
+    lowest = np.argmin(np.where(supplied, ratios, np.inf), axis=-1)[..., None]
+    lowest_ratio = np.take_along_axis(ratios, lowest, axis=-1)
+
+    excess = np.nansum(shares * ratios, axis=-1) - target
+
+    # Reduction of the average ratio obtained by moving the entire supply of a cement
+    gain = np.nan_to_num((ratios - lowest_ratio) * shares)
+
+    # Cements sorted from the highest to the lowest ratio
+    order = np.argsort(np.where(supplied, -ratios, np.inf), axis=-1, kind="stable")
+    gain_sorted = np.take_along_axis(gain, order, axis=-1)
+    cumulative_gain = np.cumsum(gain_sorted, axis=-1) - gain_sorted
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fraction = np.where(
+            gain_sorted > 0,
+            np.clip((excess[..., None] - cumulative_gain) / gain_sorted, 0, 1),
+            0,
+        )
+    fraction = np.where(excess[..., None] > 0, fraction, 0)
+
+    moved = np.empty_like(shares)
+    np.put_along_axis(
+        moved, order, fraction * np.take_along_axis(shares, order, axis=-1), axis=-1
+    )
+
+    new_shares = shares - moved
+    np.put_along_axis(
+        new_shares,
+        lowest,
+        np.take_along_axis(new_shares, lowest, axis=-1) + moved.sum(axis=-1, keepdims=True),
+        axis=-1,
+    )
+
+    return new_shares
+
+@registry.memoize(STEEL_RECYCLING_SHARES)
+def get_steel_recycling_shares():
+    """
+    Return an array with the shares for primary and secondary steel production per year and per region,
+    for the years available in the data file.
+    :return: xarray
+    """
     df = pd.read_csv(
         STEEL_RECYCLING_SHARES, sep=";")
 
     return df.groupby(["region", "year", "type"]) \
         .mean()[["share", "world_share"]] \
-        .to_xarray() \
+        .to_xarray()
+
+def get_steel_recycling_rates(year):
+    """
+    Return an array with the average shares for primary (Basic oxygen furnace) and secondary (Electric furnace)
+    steel production per year and per region, as given by: https://www.bir.org/publications/facts-figures/download/643/175/36?method=view
+    for 2015-2019, further linearly extrapolated to 2020, 2030, 2040 and 2050.
+    :return: xarray
+    :return:
+    """
+    return get_steel_recycling_shares() \
         .interp(year=year)
 
 def rev_index(inds):
@@ -215,4 +328,235 @@ def add_modified_tags(original_db, scenarios):
                 else:
                     exc["modified"] = True
 
-    return scenarios
\ No newline at end of file
+    return scenarios
+
+def rescale_pollutant_emissions(datasets, emissions, emissions_map, regions, sector=None, fallback_region=None):
+    """
+    Set the amount of the pollutant emissions of `datasets` to the GAINS emission factors of their region.
+    The biosphere exchanges are matched on their name with `emissions_map`,
+    and all the emission factors are fetched from `emissions` at once.
+    Biosphere exchanges with a zero amount are left to zero. Uncertainty is removed.
+    Modifies the datasets in place.
+
+    :param datasets: datasets to update
+    :type datasets: list
+    :param emissions: GAINS emission factors, with `region` and `pollutant` dimensions (and `sector`, if `sector` is given)
+    :type emissions: xarray.core.dataarray.DataArray
+    :param emissions_map: ecoinvent emission names as keys, GAINS pollutants as values
+    :type emissions_map: dict
+    :param regions: GAINS region of each dataset
+    :type regions: list
+    :param sector: GAINS sector of the datasets
+    :type sector: str
+    :param fallback_region: GAINS region used for the datasets which region is not in `emissions`
+    :type fallback_region: str
+    :return: the updated datasets
+    :rtype: list
+    """
+    if sector is not None:
+        # Sector labels can be repeated (one per IAM technology), with the same values
+        emissions = emissions.isel(sector=list(emissions.sector.values).index(sector))
+
+    gains_regions = set(emissions.region.values)
+
+    exchanges, exc_regions, exc_pollutants = [], [], []
+    for ds, region in zip(datasets, regions):
+        if region not in gains_regions and fallback_region is not None:
+            region = fallback_region
+        for exc in ds["exchanges"]:
+            if exc["type"] == "biosphere" and exc["name"] in emissions_map:
+                exchanges.append(exc)
+                exc_regions.append(region)
+                exc_pollutants.append(emissions_map[exc["name"]])
+
+    if not exchanges:
+        return datasets
+
+    values = emissions.sel(
+        region=xr.DataArray(exc_regions), pollutant=xr.DataArray(exc_pollutants)
+    ).values
+    amounts = np.array([exc["amount"] for exc in exchanges], dtype=float)
+    # Scaling factors, as `amount * factor` gives the emission factor (or zero)
+    factors = np.divide(values, amounts, out=values.copy(), where=amounts != 0)
+
+    for exc, factor in zip(exchanges, factors.tolist()):
+        wurst.rescale_exchange(exc, factor, remove_uncertainty=True)
+
+    return datasets
+
+
+def intern_strings(obj):
+    """
+    Intern the strings of the identifier fields (see `IDENTIFIER_FIELDS`) of a dataset or an exchange,
+    including the strings in tuples (e.g., `categories` or `input`), so that each distinct string
+    is stored only once in memory. Interned strings are also compared faster.
+    Modifies in place.
+
+    :param obj: dataset or exchange
+    :type obj: dict
+    :return: the dataset or exchange
+    :rtype: dict
+    """
+    for field in IDENTIFIER_FIELDS:
+        value = obj.get(field)
+        if type(value) is str:
+            obj[field] = sys.intern(value)
+        elif type(value) is tuple:
+            obj[field] = tuple(sys.intern(v) if type(v) is str else v for v in value)
+    return obj
+
+
+def intern_database_strings(db):
+    """
+    Intern the strings of the identifier fields of the datasets of `db` and of their exchanges.
+    Modifies in place.
+
+    :param db: wurst inventory database
+    :type db: list
+    :return: the database
+    :rtype: list
+    """
+    for ds in db:
+        intern_strings(ds)
+        for exc in ds["exchanges"]:
+            intern_strings(exc)
+    return db
+
+
+def copy_dataset(ds):
+    """
+    Return a copy of a dataset, e.g., to create a regional version of it.
+    Faster and lighter than `copy.deepcopy`, as only the containers premise modifies are copied:
+    the dataset, its list of exchanges and each exchange are new dictionaries (or list), so that their fields
+    can be set, added or removed independently of the original dataset, but the values of the exchange
+    fields are shared with the original. Strings, numbers and tuples are shared by `copy.deepcopy` as well,
+    but mutable exchange values (e.g., `pedigree` or `properties`) are also shared, and must not be
+    modified in place. The other fields of the dataset (e.g., `parameters`) are deep-copied.
+
+    :param ds: dataset
+    :type ds: dict
+    :return: a copy of the dataset
+    :rtype: dict
+    """
+    new_ds = {k: copy.deepcopy(v) for k, v in ds.items() if k != "exchanges"}
+    new_ds["exchanges"] = [dict(exc) for exc in ds["exchanges"]]
+    return new_ds
+
+
+def get_dataset_code(ds):
+    """
+    Return a code for a dataset created by premise, derived from its name, reference product, location and unit.
+    The same dataset is therefore given the same code in every run and in every scenario database,
+    unlike with a random code.
+
+    :param ds: dataset
+    :type ds: dict
+    :return: a 32-character hexadecimal code
+    :rtype: str
+    """
+    return hashlib.md5(
+        "|".join(str(ds.get(field)) for field in CODE_FIELDS).encode("utf-8")
+    ).hexdigest()
+
+
+def build_superstructure_database(scenarios, name):
+    """
+    Merge the databases of several scenarios into one superstructure database, which contains every dataset
+    and every exchange found in any of them, and a table of the exchanges which amounts differ between scenarios.
+
+    Datasets are matched across scenarios by name, reference product, location and unit, and exchanges by
+    the dataset they belong to, their type and their supplier. The amounts of all exchanges in all scenarios
+    are gathered into one array (exchanges missing from a scenario count as zero, except production exchanges),
+    and compared column-wise. Amounts in the superstructure database are those of the first scenario.
+
+    The table has the layout of the scenario difference files of the Activity Browser, with one column
+    of amounts by scenario, named after its model, pathway and year.
+
+    :param scenarios: scenario dictionaries, with their `database` as a list of datasets
+    :type scenarios: list
+    :param name: name of the superstructure database, used in the keys of the table
+    :type name: str
+    :return: superstructure database and scenario difference table
+    :rtype: tuple
+    """
+    datasets = {}
+    keys, exchanges = [], []
+    rows, cols, values = [], [], []
+    index = {}
+
+    for s, scenario in enumerate(scenarios):
+        for ds in scenario["database"]:
+            identity = tuple(ds[f] for f in CODE_FIELDS)
+            if identity not in datasets:
+                new_ds = copy_dataset(ds)
+                new_ds["exchanges"] = []
+                datasets[identity] = new_ds
+
+            for exc in ds["exchanges"]:
+                if exc["type"] == "biosphere":
+                    supplier = tuple(exc["input"])
+                else:
+                    supplier = (exc["name"], exc["product"], exc["location"], exc["unit"])
+                key = (identity, exc["type"], supplier)
+
+                if key not in index:
+                    index[key] = len(keys)
+                    keys.append(key)
+                    exchanges.append(dict(exc))
+                    datasets[identity]["exchanges"].append(exchanges[-1])
+
+                rows.append(index[key])
+                cols.append(s)
+                values.append(exc["amount"])
+
+    amounts = np.zeros((len(keys), len(scenarios)))
+    np.add.at(amounts, (rows, cols), values)
+
+    # A dataset missing from a scenario keeps its production exchange
+    present = np.zeros(amounts.shape, dtype=bool)
+    present[rows, cols] = True
+    defaults = np.array([exc["amount"] for exc in exchanges], dtype=float)
+    production = np.array([key[1] == "production" for key in keys], dtype=bool)
+    missing = production[:, None] & ~present
+    amounts[missing] = np.broadcast_to(defaults[:, None], amounts.shape)[missing]
+
+    for exc, amount in zip(exchanges, amounts[:, 0].tolist()):
+        if exc["amount"] != amount:
+            for field in ("scale", "shape", "minimum", "maximum"):
+                exc.pop(field, None)
+            exc.update({"amount": amount, "uncertainty type": 0, "loc": amount})
+
+    changed = np.flatnonzero((amounts != amounts[:, :1]).any(axis=1))
+    records = []
+    for i in changed.tolist():
+        identity, flow_type, supplier = keys[i]
+        consumer = datasets[identity]
+        if flow_type == "biosphere":
+            exc = exchanges[i]
+            origin = (exc["name"], None, None, exc.get("categories"), supplier[0], supplier)
+        else:
+            producer = datasets[supplier]
+            origin = (
+                producer["name"], producer["reference product"], producer["location"],
+                None, name, (name, producer["code"]),
+            )
+        records.append(
+            origin
+            + (
+                consumer["name"], consumer["reference product"], consumer["location"],
+                None, name, (name, consumer["code"]), flow_type,
+            )
+        )
+
+    columns = [
+        "from activity name", "from reference product", "from location", "from categories",
+        "from database", "from key",
+        "to activity name", "to reference product", "to location", "to categories",
+        "to database", "to key", "flow type",
+    ]
+    differences = pd.DataFrame(records, columns=columns)
+    for s, scenario in enumerate(scenarios):
+        label = "{} - {} - {}".format(scenario["model"], scenario["pathway"], scenario["year"])
+        differences[label] = amounts[changed, s]
+
+    return list(datasets.values()), differences
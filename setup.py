@@ -40,6 +40,7 @@ setup(
         'bw2data',
         'brightway2',
         'xarray',
+        'scipy>=1.12',
         'carculator',
         'carculator_truck',
         'prettytable',
@@ -0,0 +1,115 @@
+# content of test_brightway.py
+import copy
+import numpy as np
+from bw2data import Database, databases, mapping
+from bw2data.tests import bw2test
+from premise.brightway import extract_brightway2_database, write_brightway2_database
+
+
+def get_db():
+    return [
+        {
+            "name": "steel production",
+            "reference product": "steel",
+            "location": "RER",
+            "unit": "kilogram",
+            "database": "ecoinvent",
+            "code": "steel",
+            "exchanges": [
+                {"name": "steel production", "product": "steel", "location": "RER",
+                 "unit": "kilogram", "amount": 1, "type": "production"},
+                {"name": "electricity production", "product": "electricity", "location": "FR",
+                 "unit": "kilowatt hour", "amount": 0.5, "type": "technosphere"},
+                {"name": "Carbon dioxide, fossil", "unit": "kilogram", "amount": 2.1,
+                 "type": "biosphere", "input": ("biosphere3", "co2")},
+            ],
+        },
+        {
+            "name": "electricity production",
+            "reference product": "electricity",
+            "location": "FR",
+            "unit": "kilowatt hour",
+            "database": "ecoinvent",
+            "code": "electricity",
+            "exchanges": [
+                {"name": "electricity production", "product": "electricity", "location": "FR",
+                 "unit": "kilowatt hour", "amount": 1, "type": "production",
+                 "input": ("ecoinvent", "electricity")},
+                {"name": "Carbon dioxide, fossil", "unit": "kilogram", "amount": 0.1,
+                 "type": "biosphere", "input": ("biosphere3", "co2"),
+                 "uncertainty type": 2, "loc": -2.3, "scale": 0.1},
+            ],
+        },
+    ]
+
+
+def write_biosphere():
+    Database("biosphere3").write(
+        {
+            ("biosphere3", "co2"): {
+                "name": "Carbon dioxide, fossil", "unit": "kilogram", "categories": ("air",), "type": "emission"
+            }
+        }
+    )
+
+
+@bw2test
+def test_write_brightway2_database():
+    write_biosphere()
+
+    db = get_db()
+    write_brightway2_database(db, "new")
+
+    assert databases["new"]["number"] == 2
+    assert databases["new"]["depends"] == ["biosphere3"]
+    assert db[0]["exchanges"][1]["input"] == ("new", "electricity")
+
+    new = Database("new")
+    assert len(new) == 2
+    assert new.get("steel")["location"] == "RER"
+    assert [e.input.key for e in new.get("steel").technosphere()] == [("new", "electricity")]
+    assert new.search("steel")[0].key == ("new", "steel")
+
+    # Same arrays as when the linked database is written by `bw2data`
+    Database("reference").write(
+        {
+            ("reference", ds["code"]): dict(
+                copy.deepcopy(ds),
+                database="reference",
+                exchanges=[
+                    dict(e, input=("reference", e["input"][1]) if e["input"][0] == "new" else e["input"])
+                    for e in ds["exchanges"]
+                ],
+            )
+            for ds in db
+        }
+    )
+    translate = {mapping[("new", c)]: mapping[("reference", c)] for c in ("steel", "electricity")}
+    new_arr = np.load(new.filepath_processed())
+    reference_arr = np.load(Database("reference").filepath_processed())
+    for field in ("input", "output"):
+        new_arr[field] = [translate.get(i, i) for i in new_arr[field]]
+    new_arr.sort(order=new.dtype_field_order())
+    reference_arr.sort(order=new.dtype_field_order())
+    assert repr(new_arr.tolist()) == repr(reference_arr.tolist())
+
+
+@bw2test
+def test_extract_brightway2_database():
+    write_biosphere()
+    write_brightway2_database(get_db(), "ecoinvent")
+
+    steel, electricity = sorted(extract_brightway2_database("ecoinvent"), key=lambda ds: ds["code"], reverse=True)
+    assert steel["name"] == "steel production" and steel["reference product"] == "steel"
+    assert steel["unit"] == "kilogram" and steel["type"] == "process"
+
+    exchanges = {exc["type"]: exc for exc in steel["exchanges"]}
+    assert exchanges["production"]["name"] == "steel production"
+    assert exchanges["technosphere"] == {
+        "amount": 0.5, "uncertainty type": 0, "loc": 0.5, "type": "technosphere", "production volume": None,
+        "name": "electricity production", "product": "electricity", "unit": "kilowatt hour",
+        "location": "FR", "database": "ecoinvent",
+    }
+    assert exchanges["biosphere"]["input"] == ("biosphere3", "co2")
+    assert exchanges["biosphere"]["categories"] == ("air",)
+    assert [exc["loc"] for exc in electricity["exchanges"] if exc["type"] == "biosphere"] == [-2.3]
@@ -1,9 +1,12 @@
 from premise import DATA_DIR
 from premise import NewDatabase
 from premise.cars import Cars
+from premise.geomap import Geomap
+from types import SimpleNamespace
 import os
 import pytest
 import wurst
+import wurst.searching as ws
 import brightway2 as bw
 from pathlib import Path
 
@@ -154,4 +157,106 @@ def test_full_import():
     if dbname in bw.databases:
         del bw.databases[dbname]
     wurst.write_brightway2_database(ndb.db, dbname)
-    del bw.databases[dbname]
\ No newline at end of file
+    del bw.databases[dbname]
+
+def get_fuel_db():
+    def dataset(name, location, exchanges=()):
+        return {
+            "name": name, "reference product": name, "location": location, "unit": "kilogram",
+            "exchanges": [{"name": name, "product": name, "location": location, "amount": 1, "type": "production",
+                           "unit": "kilogram"}] + [
+                {"name": product, "product": product, "location": "GLO", "amount": 1, "type": "technosphere",
+                 "unit": "kilogram"} for product in exchanges
+            ],
+        }
+
+    synfuel = "Diesel, synthetic, from electrolysis-based hydrogen, energy allocation, at fuelling station"
+    return [
+        dataset("Biodiesel, from used cooking oil, at fuelling station", "RER"),
+        dataset("Ethanol, from wheat straw pellets, at fuelling station", "RER"),
+        # fossil markets for european regions only
+        dataset("market for petrol, low-sulfur", "Europe without Switzerland"),
+        dataset("market group for diesel", "RER"),
+        dataset(synfuel, "CN"),
+        dataset(synfuel, "DE"),
+        dataset(synfuel, "RER"),
+        dataset(synfuel, "CL"),
+        dataset("Gasoline, synthetic, from MTG, hydrogen from electrolysis, energy allocation, at fuelling station",
+                "RER"),
+    ] + [
+        dataset("fuel supply for {} vehicles, {}".format(ftype, year), region, products)
+        for region in ("EUR", "LAM")
+        for ftype, products in (
+            ("gasoline", ["petrol, low-sulfur", "gasoline, synthetic, vehicle grade"]),
+            ("diesel", ["diesel", "diesel, synthetic, vehicle grade"]),
+        )
+    ]
+
+
+def get_cars(db):
+    cars = Cars.__new__(Cars)
+    cars.db = db
+    cars.iam_data = SimpleNamespace(regions=["EUR", "LAM"])
+    cars.geo = Geomap(model="remind")
+    cars.year = year
+    cars.model = "remind"
+    cars.suppliers = {}
+    return cars
+
+
+def test_get_supplier_errors_as_get_one():
+    db = get_fuel_db()
+    cars = get_cars(db)
+    synfuel = db[4]["name"]
+
+    assert cars._get_supplier("market group for diesel", "RER") is ws.get_one(
+        db, ws.equals("name", "market group for diesel"), ws.equals("location", "RER"))
+    for args in ((synfuel,), ("market group for diesel", "GLO"), ("unknown", None)):
+        for query in (cars._get_supplier, lambda name, location=None: ws.get_one(
+                db, ws.equals("name", name), *([ws.equals("location", location)] if location else []))):
+            with pytest.raises(ws.NoResults if args[0] != synfuel else ws.MultipleResults):
+                query(*args)
+
+
+def test_find_local_supplier_as_database_scan():
+    db = get_fuel_db()
+    cars = get_cars(db)
+    synfuel = db[4]["name"]
+
+    def scan(region):
+        # Selection by `ws.get_many`, as before suppliers were indexed
+        for locs in (cars.geo.iam_to_ecoinvent_location(region, contained=True),
+                     cars.geo.iam_to_ecoinvent_location(region)):
+            producers = list(ws.get_many(db, ws.equals("name", synfuel),
+                                         ws.either(*[ws.equals("location", loc) for loc in locs])))
+            if len(producers) == 1:
+                return producers[0]
+            if producers:
+                return [p for p in producers if p["location"] == "RER"][0]
+        return list(ws.get_many(db, ws.equals("name", synfuel)))[0]
+
+    for region, location in (("EUR", "RER"), ("LAM", "CL"), ("CHA", "CN"), ("SSA", "CN")):
+        producer = cars._find_local_supplier(region, synfuel)
+        assert producer is scan(region)
+        assert producer["location"] == location
+
+
+def test_link_local_liquid_fuel_markets_skips_regions_without_fossil_markets():
+    cars = get_cars(get_fuel_db())
+    cars.link_local_liquid_fuel_markets()
+
+    def inputs(ftype, region):
+        supply = cars._get_supplier("fuel supply for {} vehicles, {}".format(ftype, year), region)
+        return [(e["name"], e["location"]) for e in ws.technosphere(supply)]
+
+    assert inputs("gasoline", "EUR") == [
+        ("market for petrol, low-sulfur", "Europe without Switzerland"),
+        ("Gasoline, synthetic, from MTG, hydrogen from electrolysis, energy allocation, at fuelling station", "RER"),
+    ]
+    assert inputs("diesel", "EUR") == [
+        ("market group for diesel", "RER"),
+        ("Diesel, synthetic, from electrolysis-based hydrogen, energy allocation, at fuelling station", "RER"),
+    ]
+    # No fossil markets for regions outside Europe: their fuel supply is left as it is
+    assert inputs("gasoline", "LAM") == [("petrol, low-sulfur", "GLO"), ("gasoline, synthetic, vehicle grade", "GLO")]
+    assert inputs("diesel", "LAM") == [("diesel", "GLO"), ("diesel, synthetic, vehicle grade", "GLO")]
@@ -0,0 +1,159 @@
+# content of test_cement.py
+from types import SimpleNamespace
+import numpy as np
+import xarray as xr
+from premise.cement import Cement
+from premise.geomap import Geomap
+from premise.utils import adjust_clinker_shares, get_fuel_co2_emission_factors, get_lower_heating_values
+
+
+def test_clinker_shares_reach_target():
+    shares = np.array([[0.5, 0.3, 0.2], [0.6, 0.4, 0]])
+    ratios = np.array([[0.9, 0.7, 0.5], [0.8, 0.6, np.nan]])
+    target = np.array([0.7, 0.65])
+
+    new_shares = adjust_clinker_shares(shares, ratios, target)
+
+    np.testing.assert_allclose(new_shares.sum(axis=1), 1)
+    np.testing.assert_allclose(np.nansum(new_shares * ratios, axis=1), target)
+    # supply is withdrawn from the highest ratio first
+    np.testing.assert_allclose(new_shares[0], [0.35, 0.3, 0.35])
+
+
+def test_clinker_shares_below_target():
+    shares = np.array([[0.5, 0.5]])
+    ratios = np.array([[0.7, 0.6]])
+
+    new_shares = adjust_clinker_shares(shares, ratios, np.array([0.8]))
+
+    np.testing.assert_allclose(new_shares, shares)
+
+
+def test_clinker_shares_unreachable_target():
+    shares = np.array([[0.5, 0.5]])
+    ratios = np.array([[0.9, 0.7]])
+
+    new_shares = adjust_clinker_shares(shares, ratios, np.array([0.5]))
+
+    np.testing.assert_allclose(new_shares, [[0, 1]])
+
+
+def test_clinker_shares_multiple_years():
+    shares = np.array([0.5, 0.3, 0.2])
+    ratios = np.array([0.9, 0.7, 0.5])
+    targets = np.array([[0.75], [0.7], [0.6]])
+
+    new_shares = adjust_clinker_shares(shares, ratios, targets[:, 0])
+
+    assert new_shares.shape == (3, 3)
+    np.testing.assert_allclose((new_shares * ratios).sum(axis=1), targets[:, 0])
+
+
+def get_cement():
+    """
+    Cement instance for two REMIND regions: EUR, which captures half of its cement CO2,
+    and CHA, which emits no cement CO2 in the IAM data (undefined capture rate).
+    """
+    regions = ["EUR", "CHA"]
+    gnr = {
+        "Production volume share, dry kiln": [0.7, 0.2],
+        "Production volume share, wet kiln": [0.3, 0.9],
+        "Thermal energy consumption, dry kiln": [3300, 3500],
+        "Thermal energy consumption, wet kiln": [5800, 6000],
+        "Share waste fuel": [0.2, 0.05],
+        "Share biomass fuel": [0.1, 0.02],
+        "Share fossil fuel": [0.7, 0.93],
+        "Share of recovered energy, per ton clinker": [0.05, 0.01],
+    }
+    emissions = {
+        "Emi|CCO2|FFaI|Industry|Cement": [[40, 60], [0, 0]],
+        "Emi|CO2|FFaI|Industry|Cement": [[100, 100], [0, 0]],
+    }
+
+    def clinker(region):
+        return {
+            "name": "clinker production", "reference product": "clinker", "unit": "kilogram",
+            "location": region, "comment": "",
+            "exchanges": [
+                {"name": "clinker production", "product": "clinker", "unit": "kilogram", "location": region,
+                 "amount": 1, "type": "production"},
+                {"name": "Carbon dioxide, fossil", "unit": "kilogram", "amount": 0.8, "type": "biosphere",
+                 "input": ("biosphere3", "co2")},
+            ],
+        }
+
+    def fuel_supplier(name, product):
+        return {
+            "name": name, "reference product": product, "unit": "kilogram", "location": "DE",
+            "exchanges": [
+                {"name": name, "product": product, "unit": "kilogram", "location": "DE",
+                 "amount": 1, "type": "production", "production volume": 1},
+            ],
+        }
+
+    cement = Cement.__new__(Cement)
+    cement.model = "remind"
+    cement.year = 2030
+    cement.geo = Geomap(model="remind")
+    cement.fuels_lhv = get_lower_heating_values()
+    cement.fuels_co2 = get_fuel_co2_emission_factors()
+    cement.fuel_map = {"waste": ["waste plastic"], "wood pellet": ["wood pellet"], "hard coal": ["hard coal"]}
+    cement.db = [
+        fuel_supplier("market for waste plastic, mixture", "waste plastic, mixture"),
+        fuel_supplier("market for wood pellet", "wood pellet, measured as dry mass"),
+        fuel_supplier("market for hard coal", "hard coal"),
+    ]
+    cement.iam_data = SimpleNamespace(
+        gnr_data=xr.DataArray(
+            list(gnr.values()), coords={"variables": list(gnr), "region": regions}, dims=["variables", "region"]
+        ),
+        data=xr.DataArray(
+            list(emissions.values()),
+            coords={"variables": list(emissions), "region": regions, "year": [2020, 2040]},
+            dims=["variables", "region", "year"],
+        ),
+    )
+    cement.fetch_proxies = lambda name, ref_prod: {r: clinker(r) for r in regions}
+    return cement, gnr
+
+
+def test_clinker_production_datasets_all_regions():
+    cement, gnr = get_cement()
+    datasets = cement.build_clinker_production_datasets()
+    fuels = ["waste", "wood pellet", "hard coal"]
+
+    for r, (region, capture_rate) in enumerate((("EUR", 0.5), ("CHA", 0))):
+        # Scalar calculation, region by region
+        shares = np.array([gnr["Production volume share, dry kiln"][r], gnr["Production volume share, wet kiln"][r]])
+        shares /= shares.sum()
+        energy = (shares * [gnr["Thermal energy consumption, dry kiln"][r],
+                            gnr["Thermal energy consumption, wet kiln"][r]]).sum()
+        fuel_mix = np.array([gnr["Share waste fuel"][r], gnr["Share biomass fuel"][r], gnr["Share fossil fuel"][r]])
+        fuel_mix /= fuel_mix.sum()
+        fuel_qty = energy * fuel_mix / [cement.fuels_lhv[f] for f in fuels]
+        fossil_co2 = (energy * fuel_mix * [
+            cement.fuels_co2[f]["co2"] * (1 - cement.fuels_co2[f]["bio_share"]) for f in fuels]).sum()
+        biogenic_co2 = (energy * fuel_mix * [
+            cement.fuels_co2[f]["co2"] * cement.fuels_co2[f]["bio_share"] for f in fuels]).sum()
+
+        exchanges = {exc["name"]: exc["amount"] for exc in datasets[region]["exchanges"]}
+        np.testing.assert_allclose(
+            [exchanges["market for " + f] for f in ("waste plastic, mixture", "wood pellet", "hard coal")],
+            fuel_qty / 1000,
+        )
+        np.testing.assert_allclose(exchanges["Carbon dioxide, fossil"], (fossil_co2 + 525) / 1000 * (1 - capture_rate))
+        np.testing.assert_allclose(exchanges["Carbon dioxide, non-fossil"], biogenic_co2 / 1000 * (1 - capture_rate))
+
+        if capture_rate:
+            captured = capture_rate * (biogenic_co2 + fossil_co2 + 525) / 1000
+            np.testing.assert_allclose(
+                exchanges["market group for electricity, medium voltage"], captured * (0.146 + 0.024)
+            )
+            np.testing.assert_allclose(
+                exchanges["steam production, as energy carrier, in chemical industry"],
+                captured * 3.48 - gnr["Share of recovered energy, per ton clinker"][r] * energy / 1000,
+            )
+        else:
+            # No capture, rather than NaN amounts, without cement CO2 in the IAM data
+            assert "market group for electricity, medium voltage" not in exchanges
+            assert not any(np.isnan(amount) for amount in exchanges.values())
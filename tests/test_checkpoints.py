@@ -0,0 +1,90 @@
+# content of test_checkpoints.py
+from premise.ecoinvent_modification import NewDatabase
+from premise.compact import CompactDatabase
+from premise.checkpoints import get_hash, get_step_key
+
+
+def get_db():
+    return [
+        {
+            "name": "photovoltaic slanted-roof installation, 3kWp, single-Si, panel, mounted, on roof",
+            "reference product": "photovoltaic slanted-roof installation, 3kWp, single-Si, panel, mounted, on roof",
+            "location": "CH",
+            "unit": "unit",
+            "exchanges": [
+                {
+                    "name": "photovoltaic panel, single-Si wafer",
+                    "product": "photovoltaic panel, single-Si wafer",
+                    "amount": 22,
+                    "type": "technosphere",
+                    "unit": "square meter",
+                    "location": "GLO",
+                }
+            ],
+        }
+    ]
+
+
+def get_ndb(checkpoint_dir, compact=False):
+    ndb = NewDatabase.__new__(NewDatabase)
+    ndb.checkpoint_dir = checkpoint_dir
+    ndb.compact = compact
+    ndb.db = get_db()
+    ndb.scenarios = [
+        {
+            "model": "remind",
+            "pathway": "SSP2-Base",
+            "year": 2030,
+            "checkpoint": get_hash("source"),
+            "checkpoint file": None,
+        }
+    ]
+    return ndb
+
+
+def test_step_key_depends_on_previous_key():
+    scenario = {"model": "remind", "pathway": "SSP2-Base", "year": 2030}
+    assert get_step_key("a", "update_cement", scenario) == get_step_key("a", "update_cement", scenario)
+    assert get_step_key("a", "update_cement", scenario) != get_step_key("b", "update_cement", scenario)
+    assert get_step_key("a", "update_cement", scenario) != get_step_key("a", "update_steel", scenario)
+
+
+def test_resume_from_checkpoint(tmp_path):
+    ndb = get_ndb(tmp_path)
+    ndb.update_solar_PV()
+    updated = ndb.scenarios[0]["database"]
+
+    assert updated[0]["exchanges"][0]["amount"] < 22
+    assert len(list(tmp_path.glob("*.pickle"))) == 1
+
+    ndb = get_ndb(tmp_path)
+    ndb.update_solar_PV()
+
+    # The step is skipped, and the database is loaded from the checkpoint when needed
+    assert "database" not in ndb.scenarios[0]
+    ndb.restore_databases()
+    assert ndb.scenarios[0]["database"] == updated
+
+
+def test_without_checkpoints():
+    ndb = get_ndb(None)
+    ndb.scenarios[0]["database"] = get_db()
+    ndb.update_solar_PV()
+
+    assert ndb.scenarios[0]["database"][0]["exchanges"][0]["amount"] < 22
+
+
+def test_compact_databases(tmp_path):
+    ndb = get_ndb(tmp_path, compact=True)
+    ndb.update_solar_PV()
+
+    # The database is compacted after the step, and expanded when needed
+    assert isinstance(ndb.scenarios[0]["database"], CompactDatabase)
+    ndb.restore_databases()
+    assert ndb.scenarios[0]["database"][0]["exchanges"][0]["amount"] < 22
+
+    ndb = get_ndb(None, compact=True)
+    ndb.scenarios[0]["database"] = CompactDatabase(get_db())
+    ndb.update_solar_PV()
+    ndb.restore_databases()
+    assert ndb.scenarios[0]["database"][0]["exchanges"][0]["amount"] < 22
@@ -1,7 +1,8 @@
 # content of test_activity_maps.py
 from bw2data.database import DatabaseChooser
 import pytest
-from premise.clean_datasets import DatabaseCleaner
+from bw2io.extractors.ecospold2 import Ecospold2DataExtractor
+from premise.clean_datasets import DatabaseCleaner, ParallelEcospold2Importer, DATASET_STRATEGIES
 
 
 def get_dict():
@@ -54,3 +55,106 @@ def test_validity_db():
 
     dbc = DatabaseCleaner("dummy_db", 'brightway', 'x')
     assert dbc.db[0]['name'] == 'fake activity'
+
+
+def test_fix_unset_exchange_locations():
+    def ds(name, location, exchanges=()):
+        return {
+            'name': name,
+            'unit': 'kilogram',
+            'location': location,
+            'exchanges': [{'name': name, 'unit': 'kilogram', 'amount': 1, 'type': 'production'}]
+                         + [{'name': e, 'unit': 'kilogram', 'amount': 1, 'type': 'technosphere'} for e in exchanges],
+        }
+
+    dbc = DatabaseCleaner.__new__(DatabaseCleaner)
+    dbc.db = [
+        ds('consumer', 'CH', ['unique supplier', 'ambiguous supplier', 'missing supplier']),
+        ds('unique supplier', 'DE'),
+        ds('ambiguous supplier', 'FR'),
+        ds('ambiguous supplier', 'IT'),
+    ]
+    dbc.fix_unset_technosphere_and_production_exchange_locations()
+
+    production, unique, ambiguous, missing = dbc.db[0]['exchanges']
+    assert production['location'] == 'CH'
+    assert unique['location'] == 'DE'
+    assert 'location' not in ambiguous and 'location' not in missing
+    assert dbc.unresolved_locations == [
+        {'name': 'ambiguous supplier', 'unit': 'kilogram', 'locations found': ['FR', 'IT'], 'consumers': [('consumer', 'CH')]},
+        {'name': 'missing supplier', 'unit': 'kilogram', 'locations found': [], 'consumers': [('consumer', 'CH')]},
+    ]
+
+
+def test_ecospold_rules_in_single_pass():
+    dbc = DatabaseCleaner.__new__(DatabaseCleaner)
+    dbc.db = [
+        {
+            'name': 'consumer', 'reference product': 'consumer product', 'unit': 'kilogram', 'location': None,
+            'database': 'ei', 'code': 'a', 'parameters': [{'name': 'p', 'amount': 2}],
+            'exchanges': [
+                {'name': 'x', 'unit': 'kilogram', 'amount': 1, 'type': 'production', 'input': ('ei', 'a')},
+                {'name': 'x', 'unit': 'kilogram', 'amount': 1, 'type': 'technosphere', 'input': ('ei', 'b'),
+                 'comment': None},
+            ],
+        },
+        {
+            'name': 'supplier', 'reference product': 'supplier product', 'unit': 'kilogram', 'location': 'DE',
+            'database': 'ei', 'code': 'b', 'parameters': [],
+            'exchanges': [],
+        },
+    ]
+    dbc.dataset_rules = [dbc.transform_dataset_parameter_field]
+    dbc.exchange_rules = [dbc.set_exchange_location_from_input, dbc.set_exchange_product_and_name]
+    consumer, _ = dbc.prepare_datasets()
+
+    assert consumer['location'] == 'GLO'
+    assert consumer['parameters'] == {'p': 2}
+    assert consumer['exchanges'][0] == {
+        'name': 'consumer', 'product': 'consumer product', 'unit': 'kilogram', 'location': 'GLO',
+        'amount': 1, 'type': 'production', 'input': ('ei', 'a')
+    }
+    assert consumer['exchanges'][1] == {
+        'name': 'supplier', 'product': 'supplier product', 'unit': 'kilogram', 'location': 'DE',
+        'amount': 1, 'type': 'technosphere', 'input': ('ei', 'b')
+    }
+
+
+SPOLD = """<?xml version="1.0" encoding="UTF-8"?>
+<ecoSpold xmlns="http://www.EcoInvent.org/EcoSpold02">
+  <activityDataset>
+    <activityDescription>
+      <activity id="activity-{i}"><activityName>activity {i}</activityName></activity>
+      <geography><shortname>RER</shortname></geography>
+      <technology/>
+      <timePeriod/>
+    </activityDescription>
+    <flowData>
+      <intermediateExchange intermediateExchangeId="product-{i}" amount="1">
+        <name>product {i}</name><unitName>kg</unitName><outputGroup>0</outputGroup>
+      </intermediateExchange>
+      <intermediateExchange intermediateExchangeId="product-0" activityLinkId="activity-0" amount="0.5">
+        <name>product 0</name><unitName>kWh</unitName><inputGroup>5</inputGroup>
+      </intermediateExchange>
+    </flowData>
+    <administrativeInformation><dataEntryBy/><dataGeneratorAndPublication/></administrativeInformation>
+  </activityDataset>
+</ecoSpold>
+"""
+
+
+def test_parallel_ecospold_extraction(tmp_path):
+    for i in range(5):
+        (tmp_path / "{}.spold".format(i)).write_text(SPOLD.format(i=i), encoding="utf-8")
+
+    importer = ParallelEcospold2Importer(str(tmp_path), "ei", processes=2, batch_size=2)
+
+    expected = Ecospold2DataExtractor.extract(str(tmp_path), "ei", use_mp=False)
+    expected.sort(key=lambda ds: ds["filename"])
+    for strategy in DATASET_STRATEGIES:
+        expected = strategy(expected)
+
+    assert importer.data == expected
+    assert importer.data[1]["unit"] == "kilogram"
+    assert importer.data[1]["exchanges"][1]["unit"] == "kilowatt hour"
+    assert not set(importer.strategies).intersection(DATASET_STRATEGIES)
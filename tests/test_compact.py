@@ -0,0 +1,58 @@
+# content of test_compact.py
+import pickle
+from wurst import searching as ws
+from premise.compact import CompactDatabase
+
+
+def get_db():
+    return [
+        {
+            "name": "steel production",
+            "reference product": "steel",
+            "location": "RER",
+            "unit": "kilogram",
+            "parameters": {"p": 1.0},
+            "exchanges": [
+                {"name": "steel production", "product": "steel", "location": "RER", "unit": "kilogram",
+                 "type": "production", "amount": 1, "production volume": 1e6, "input": ("ei", "a")},
+                {"name": "market for coke", "product": "coke", "location": "GLO", "unit": "megajoule",
+                 "type": "technosphere", "amount": 2.5, "uncertainty type": 2, "loc": 0.9, "scale": 0.1,
+                 "pedigree": {"reliability": 2}, "comment": "estimated", "input": ("ei", "b")},
+                {"name": "Carbon dioxide, fossil", "categories": ("air",), "unit": "kilogram",
+                 "type": "biosphere", "amount": 1.8, "uncertainty type": 0, "input": ("biosphere3", "c")},
+            ],
+        },
+        {
+            "name": "market for coke",
+            "reference product": "coke",
+            "location": "GLO",
+            "unit": "megajoule",
+            "exchanges": [],
+        },
+    ]
+
+
+def test_round_trip():
+    db = get_db()
+    compact_db = CompactDatabase(db)
+
+    assert compact_db.to_database() == db
+    assert list(compact_db) == db
+    assert compact_db[-1] == db[-1]
+    assert type(compact_db[0]["exchanges"][0]["amount"]) is int
+    assert len(compact_db.pool) < 3 * 9
+    assert pickle.loads(pickle.dumps(compact_db)).to_database() == db
+
+
+def test_datasets_are_copies():
+    db = get_db()
+    compact_db = CompactDatabase(db)
+
+    db[0]["exchanges"][1]["pedigree"]["reliability"] = 5
+    db[0]["parameters"]["p"] = 2.0
+    ds = ws.get_one(compact_db, ws.equals("name", "steel production"))
+    assert ds["exchanges"][1]["pedigree"] == {"reliability": 2}
+    assert ds["parameters"] == {"p": 1.0}
+
+    ds["exchanges"][1]["amount"] = 0
+    assert compact_db[0]["exchanges"][1]["amount"] == 2.5
@@ -0,0 +1,49 @@
+# content of test_data_collection.py
+import os
+import pandas as pd
+from premise.data_collection import IAMDataCollection
+
+
+def test_image_file_cache(tmp_path, monkeypatch):
+    filepath = tmp_path / "image.xls"
+    filepath.write_bytes(b"workbook")
+    cache_filepath = tmp_path / "image.xls.cache"
+    df = pd.DataFrame({"2020": [1.0]})
+    reads = []
+    monkeypatch.setattr(pd, "read_excel", lambda *args, **kwargs: reads.append(args) or df)
+
+    # An empty cache, as left by an interrupted write, is replaced
+    cache_filepath.write_bytes(b"")
+    assert IAMDataCollection.read_image_file(filepath).equals(df)
+    assert len(reads) == 1
+    assert IAMDataCollection.read_image_file(filepath).equals(df)
+    assert len(reads) == 1
+
+    # A touched but unchanged workbook is not parsed again, and its new stamp is stored
+    os.utime(filepath, (0, 0))
+    assert IAMDataCollection.read_image_file(filepath).equals(df)
+    assert len(reads) == 1
+    assert pd.read_pickle(cache_filepath)["stamp"]["mtime"] == 0
+    assert not (tmp_path / "image.xls.cache.tmp").exists()
+
+
+def test_read_mif_file_by_chunks(tmp_path):
+    filepath = tmp_path / "remind_SSP2-Base.mif"
+    filepath.write_text(
+        "Model;Scenario;Region;Variable;Unit;2005;2010;\n"
+        "REMIND;SSP2-Base;EUR;SE|Electricity|Coal;EJ/yr;1.5;N/A;\n"
+        "REMIND;SSP2-Base;EUR;FE|Transport;EJ/yr;2;3;\n"
+        # chunk boundary
+        "REMIND;SSP2-Base;CHA;Tech|Electricity|Coal;%;N/A;40;\n"
+        "REMIND;SSP2-Base;CHA;SE|Electricity|Solar;EJ/yr;0.1;0.2;\n"
+        # chunk boundary
+        "REMIND;SSP2-Base;CHA;Emi|CO2;Mt CO2/yr;10;11;\n"
+    )
+    list_var = ("SE|", "Tech|")
+
+    df = IAMDataCollection.read_mif_file(filepath, list_var, chunksize=2)
+
+    expected = pd.read_csv(filepath, sep=";", na_values=["N/A"])
+    expected = expected.loc[expected["Variable"].str.startswith(list_var), ["Region", "Variable", "Unit", "2005", "2010"]]
+    pd.testing.assert_frame_equal(df, expected.reset_index(drop=True))
+    assert df["Variable"].tolist() == ["SE|Electricity|Coal", "Tech|Electricity|Coal", "SE|Electricity|Solar"]
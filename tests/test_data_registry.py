@@ -0,0 +1,56 @@
+# content of test_data_registry.py
+import os
+from premise.data_registry import DataRegistry
+
+
+def get_registry(filepath):
+    registry = DataRegistry()
+    calls = []
+
+    @registry.memoize(filepath)
+    def load():
+        calls.append(1)
+        with open(filepath) as f:
+            return {"value": {"content": f.read()}}
+
+    return registry, load, calls
+
+
+def test_file_is_parsed_once(tmp_path):
+    fp = tmp_path / "data.csv"
+    fp.write_text("a")
+    registry, load, calls = get_registry(fp)
+
+    first = load()
+    first["value"]["content"] = "modified"
+
+    assert load() == {"value": {"content": "a"}}
+    assert len(calls) == 1
+
+
+def test_snapshot(tmp_path):
+    fp = tmp_path / "data.csv"
+    fp.write_text("a")
+    registry, load, calls = get_registry(fp)
+    registry.preload()
+    registry.save_snapshot(tmp_path / "snapshot.pkl")
+
+    registry, load, calls = get_registry(fp)
+    assert registry.load_snapshot(tmp_path / "snapshot.pkl") == 1
+    assert load() == {"value": {"content": "a"}}
+    assert len(calls) == 0
+
+
+def test_stale_snapshot_is_ignored(tmp_path):
+    fp = tmp_path / "data.csv"
+    fp.write_text("a")
+    registry, load, calls = get_registry(fp)
+    load()
+    registry.save_snapshot(tmp_path / "snapshot.pkl")
+
+    fp.write_text("b")
+    os.utime(fp, (os.path.getatime(fp), os.path.getmtime(fp) + 10))
+
+    registry, load, calls = get_registry(fp)
+    assert registry.load_snapshot(tmp_path / "snapshot.pkl") == 0
+    assert load() == {"value": {"content": "b"}}
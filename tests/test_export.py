@@ -0,0 +1,79 @@
+# content of test_export.py
+import numpy as np
+import pytest
+from premise.export import MatrixStore
+
+CO2 = ("biosphere3", "349b29d1-3e58-4c66-98b9-9d1a076efd2e")
+
+
+def get_db(share_of_coal):
+    """
+    Electricity market supplied by coal and wind power, each emitting carbon dioxide.
+    """
+
+    def dataset(name, exchanges):
+        return {
+            "name": name, "reference product": "electricity", "unit": "kilowatt hour", "location": "DE",
+            "exchanges": [
+                {"name": name, "product": "electricity", "unit": "kilowatt hour", "location": "DE",
+                 "amount": 1, "type": "production"},
+            ] + exchanges,
+        }
+
+    def supply(name, amount):
+        return {"name": name, "product": "electricity", "unit": "kilowatt hour", "location": "DE",
+                "amount": amount, "type": "technosphere"}
+
+    def co2(amount):
+        return {"name": "Carbon dioxide, fossil", "categories": ("air",), "unit": "kilogram",
+                "amount": amount, "type": "biosphere", "input": CO2}
+
+    exchanges = [supply("coal power", share_of_coal)] if share_of_coal else []
+    return [
+        dataset("market for electricity", exchanges + [supply("wind power", 1 - share_of_coal)]),
+        dataset("coal power", [co2(1.0)]),
+        dataset("wind power", [co2(0.01)]),
+    ]
+
+
+def test_matrix_store(tmp_path):
+    scenarios = [("remind", "SSP2-Base", 2030, get_db(0.4)), ("remind", "SSP2-Base", 2050, get_db(0))]
+    MatrixStore(scenarios).write(tmp_path)
+    store = MatrixStore.load(tmp_path)
+
+    assert store.scenarios == [("remind", "SSP2-Base", 2030), ("remind", "SSP2-Base", 2050)]
+    assert [a[0] for a in store.activities] == ["market for electricity", "coal power", "wind power"]
+    assert isinstance(store.A_values, np.memmap)
+
+    # One pattern for both scenarios: the supply of coal power is zero in 2050
+    market, coal, wind = 0, 1, 2
+    A = {tuple(ij): v for ij, v in zip(store.A_indices.T.tolist(), store.A_values.T.tolist())}
+    assert A[(market, market)] == [1, 1]
+    assert A[(market, coal)] == [-0.4, 0]
+    assert A[(market, wind)] == [-0.6, -1]
+    assert len(A) == 5
+
+    flow = store.flows.index(("Carbon dioxide, fossil", "air", "unspecified", "kilogram"))
+    assert store.B_indices.T.tolist() == [[coal, flow], [wind, flow]]
+    assert store.B_values.tolist() == [[-1.0, -0.01], [-1.0, -0.01]]
+
+
+def test_matrix_store_scenarios_with_different_activities(tmp_path):
+    db = get_db(0.4)
+    db.append(
+        dict(db[1], name="solar power",
+             exchanges=[dict(db[1]["exchanges"][0], name="solar power")])
+    )
+    MatrixStore([("remind", "SSP2-Base", 2030, get_db(0.4)), ("remind", "SSP2-Base", 2050, db)]).write(tmp_path)
+    store = MatrixStore.load(tmp_path)
+
+    assert store.activities[-1][0] == "solar power"
+    assert store.activities_in_scenarios.tolist() == [[True, True, True, False], [True, True, True, True]]
+
+
+def test_matrix_store_unknown_supplier():
+    db = get_db(0.4)
+    del db[1]
+
+    with pytest.raises(KeyError):
+        MatrixStore([("remind", "SSP2-Base", 2030, db)])
@@ -0,0 +1,80 @@
+# content of test_lca.py
+import numpy as np
+from premise.export import MatrixStore
+from premise.lca import ScenarioLCA
+
+CO2 = ("Carbon dioxide, fossil", "air", "unspecified", "kilogram")
+
+
+def get_db(share_of_coal):
+    """
+    Electricity market supplied by coal and wind power, which emit 1 and 0.01 kg CO2 per kWh.
+    """
+
+    def exchange(name, amount, kind="technosphere"):
+        return {"name": name, "product": "electricity", "unit": "kilowatt hour", "location": "DE",
+                "amount": amount, "type": kind}
+
+    def dataset(name, exchanges):
+        return {"name": name, "reference product": "electricity", "unit": "kilowatt hour", "location": "DE",
+                "exchanges": [exchange(name, 1, "production")] + exchanges}
+
+    def co2(amount):
+        return {"name": "Carbon dioxide, fossil", "categories": ("air",), "unit": "kilogram", "amount": amount,
+                "type": "biosphere", "input": ("biosphere3", "349b29d1-3e58-4c66-98b9-9d1a076efd2e")}
+
+    return [
+        dataset("market for electricity",
+                [exchange("coal power", share_of_coal), exchange("wind power", 1 - share_of_coal)]),
+        dataset("coal power", [co2(1.0)]),
+        dataset("wind power", [co2(0.01)]),
+    ]
+
+
+def get_store():
+    return MatrixStore(
+        ("remind", "SSP2-Base", year, get_db(share)) for year, share in ((2030, 0.4), (2040, 0.3), (2050, 0.1))
+    )
+
+
+def test_lcia_scenarios():
+    store = get_store()
+    market, coal, wind = store.activities
+    demands = [{market: 1}, {coal: 2, wind: 1}]
+    expected = [[0.406, 2.01], [0.307, 2.01], [0.109, 2.01]]
+
+    for iterative in (False, True):
+        lca = ScenarioLCA(store, {CO2: 1}, iterative=iterative)
+        assert np.allclose(lca.lcia_scenarios(demands), expected)
+        # Only the first scenario is factorized by the iterative solver
+        assert sorted(lca.factorizations) == ([0] if iterative else [0, 1, 2])
+
+
+def test_lci():
+    store = get_store()
+    lca = ScenarioLCA(store, {CO2: 1}, iterative=True)
+    supply = lca.lci(2, [{store.activities[0]: 1}, {store.activities[1]: 3}])
+
+    assert np.allclose(supply, [[1, 0], [0.1, 3], [0.9, 0]])
+    emissions = lca.biosphere_matrix(2) @ supply
+    assert np.allclose(emissions[store.flows.index(CO2)], [0.109, 3])
+    assert np.allclose(emissions.sum(axis=0), [0.109, 3])
+    # Several demands are solved with the factorization of the scenario, not with GMRES
+    assert sorted(lca.factorizations) == [2]
+
+
+def test_scenarios_with_different_activities():
+    db = get_db(0.1)
+    db[0]["exchanges"].append(
+        {"name": "solar power", "product": "electricity", "unit": "kilowatt hour", "location": "DE",
+         "amount": 0.1, "type": "technosphere"}
+    )
+    db[0]["exchanges"][2]["amount"] = 0.8
+    db.append(dict(db[2], name="solar power", exchanges=[dict(db[2]["exchanges"][0], name="solar power")]))
+    store = MatrixStore([("remind", "SSP2-Base", 2030, get_db(0.4)), ("remind", "SSP2-Base", 2050, db)])
+    market = store.activities[0]
+
+    for iterative in (False, True):
+        lca = ScenarioLCA(store, {CO2: 1}, iterative=iterative)
+        assert np.allclose(lca.lcia_scenarios([{market: 1}]), [[0.406], [0.108]])
+        assert np.allclose(lca.lci(0, [{market: 1}])[:, 0], [1, 0.4, 0.6, 0])
@@ -0,0 +1,78 @@
+# content of test_profiling.py
+import json
+from types import SimpleNamespace
+from wurst import searching as ws
+from premise.compact import CompactDatabase
+from premise.profiling import Profiler, count_datasets_and_exchanges, profiler
+from premise.renewables import SolarPV
+
+
+def get_db():
+    return [
+        {
+            "name": "photovoltaic slanted-roof installation, 3kWp, single-Si, panel, mounted, on roof",
+            "location": "CH",
+            "unit": "unit",
+            "exchanges": [
+                {
+                    "name": "photovoltaic panel, single-Si wafer",
+                    "amount": 22,
+                    "type": "technosphere",
+                    "unit": "square meter",
+                }
+            ],
+        }
+    ]
+
+
+def test_nested_stages(tmp_path):
+    prof = Profiler()
+    prof.enable()
+    try:
+        with prof.stage("outer"):
+            with prof.stage("inner", get_db()):
+                ws.get_many(get_db(), ws.equals("location", "CH"))
+    finally:
+        prof.disable()
+
+    inner, outer = prof.records
+    assert inner["name"] == "inner" and inner["parent"] == "outer" and inner["depth"] == 1
+    assert inner["datasets"] == 1 and inner["exchanges"] == 1
+    assert inner["wurst search calls"] == outer["wurst search calls"] == 1
+    assert outer["wall time"] >= inner["wall time"]
+
+    prof.to_chrome_trace(tmp_path / "trace.json")
+    with open(tmp_path / "trace.json") as f:
+        assert len(json.load(f)["traceEvents"]) == 2
+
+
+def test_decorated_method():
+    profiler.reset()
+    profiler.enable()
+    try:
+        SolarPV(get_db(), 2030).update_efficiency_of_solar_PV()
+    finally:
+        profiler.disable()
+
+    record = profiler.records[-1]
+    assert record["name"] == "SolarPV.update_efficiency_of_solar_PV"
+    assert record["datasets"] == 1
+    assert record["wurst search calls"] > 0
+    profiler.reset()
+
+
+def test_disabled_profiler():
+    profiler.reset()
+    SolarPV(get_db(), 2030).update_efficiency_of_solar_PV()
+    assert profiler.records == []
+    assert ws.get_many.__module__ == "wurst.searching"
+
+
+def test_count_compact_database(monkeypatch):
+    db = get_db() * 2
+    compact_db = CompactDatabase(db)
+    # Counting must not expand the datasets
+    monkeypatch.setattr(CompactDatabase, "__iter__", None)
+
+    assert count_datasets_and_exchanges(SimpleNamespace(scenarios=[{"database": compact_db}])) == (2, 2)
+    assert count_datasets_and_exchanges(db) == (2, 2)
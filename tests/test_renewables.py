@@ -0,0 +1,19 @@
+# content of test_renewables.py
+from premise.renewables import SolarPV
+
+
+def test_update_efficiency_of_solar_PV_without_PV():
+    db = [
+        {
+            "name": "photovoltaic panel factory",
+            "location": "CH",
+            "unit": "unit",
+            "exchanges": [
+                {"name": "photovoltaic panel, single-Si wafer", "amount": 22, "type": "technosphere",
+                 "unit": "square meter"}
+            ],
+        }
+    ]
+
+    assert SolarPV(db, 2030).update_efficiency_of_solar_PV() is db
+    assert db[0]["exchanges"][0]["amount"] == 22 and "parameters" not in db[0]
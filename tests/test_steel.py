@@ -0,0 +1,54 @@
+# content of test_steel.py
+from types import SimpleNamespace
+from premise.geomap import Geomap
+from premise.steel import Steel
+
+
+def get_steel():
+    def market(name, location):
+        product = name.replace("market for ", "")
+        return {
+            "name": name,
+            "reference product": product,
+            "location": location,
+            "unit": "kilogram",
+            "exchanges": [
+                {"name": name, "product": product, "location": location, "unit": "kilogram",
+                 "amount": 1, "type": "production", "production volume": 1},
+            ],
+        }
+
+    def consumer(location):
+        return {
+            "name": "steel consumer",
+            "reference product": "steel product",
+            "location": location,
+            "unit": "kilogram",
+            "exchanges": [
+                {"name": "market for steel, low-alloyed", "product": "steel, low-alloyed", "location": "GLO",
+                 "unit": "kilogram", "amount": 2, "type": "technosphere"},
+            ],
+        }
+
+    steel = Steel.__new__(Steel)
+    steel.geo = Geomap(model="remind")
+    steel.iam_data = SimpleNamespace(regions=["EUR"])
+    steel.db = [
+        market("market for steel, low-alloyed", "GLO"),
+        market("market for steel, low-alloyed, hot rolled", "GLO"),
+        market("market for steel, low-alloyed", "RER"),
+        market("market for steel, low-alloyed, hot rolled", "RER"),
+        consumer("AQ"),
+        consumer("Europe without Austria"),
+    ]
+    return steel
+
+
+def test_relink_ignores_hot_rolled_markets():
+    steel = get_steel()
+    steel.relink_to_new_steel_markets()
+
+    for ds, location in zip(steel.db[4:], ("GLO", "RER")):
+        assert [(exc["name"], exc["location"], exc["amount"]) for exc in ds["exchanges"]] == [
+            ("market for steel, low-alloyed", location, 2)
+        ]
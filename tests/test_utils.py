@@ -0,0 +1,168 @@
+# content of test_utils.py
+import sys
+import numpy as np
+import xarray as xr
+from premise.utils import (
+    build_superstructure_database,
+    copy_dataset,
+    get_dataset_code,
+    get_efficiency_ratio_solar_PV,
+    intern_database_strings,
+    rescale_pollutant_emissions,
+)
+
+
+def get_emissions():
+    return xr.DataArray(
+        np.arange(8, dtype=float).reshape(2, 2, 2),
+        coords={"region": ["EUR", "CHA"], "pollutant": ["SO2", "NOx"], "sector": ["STEEL", "CEMENT"]},
+        dims=["region", "pollutant", "sector"],
+    )
+
+
+def ds(location, amounts):
+    return {
+        "location": location,
+        "exchanges": [
+            {"name": "Sulfur dioxide", "type": "biosphere", "amount": amounts[0], "uncertainty type": 2, "scale": 0.1},
+            {"name": "Nitrogen oxides", "type": "biosphere", "amount": amounts[1]},
+            {"name": "Sulfur dioxide", "type": "technosphere", "amount": 1},
+        ],
+    }
+
+
+def test_rescale_pollutant_emissions():
+    emissions_map = {"Sulfur dioxide": "SO2", "Nitrogen oxides": "NOx"}
+    datasets = [ds("CHA", [2, 0]), ds("World", [3, 4])]
+
+    rescale_pollutant_emissions(
+        datasets,
+        get_emissions(),
+        emissions_map,
+        regions=[d["location"] for d in datasets],
+        sector="CEMENT",
+        fallback_region="EUR",
+    )
+
+    # CHA: SO2 5, NOx 7 (left to zero); World falls back on EUR: SO2 1, NOx 3
+    assert [e["amount"] for e in datasets[0]["exchanges"]] == [5, 0, 1]
+    assert [e["amount"] for e in datasets[1]["exchanges"]] == [1, 3, 1]
+    assert datasets[0]["exchanges"][0]["uncertainty type"] == 0
+    assert "scale" not in datasets[0]["exchanges"][0]
+
+
+def test_intern_database_strings():
+    # Strings built at run time are distinct objects
+    name = "".join(["market for ", "coke"])
+    db = [
+        {
+            "name": name,
+            "location": "".join(["G", "LO"]),
+            "comment": "".join(["some ", "comment"]),
+            "exchanges": [
+                {"name": "".join(["market for ", "coke"]), "type": "production", "amount": 1,
+                 "input": ("".join(["e", "i"]), "".join(["a", "b"]))},
+                {"name": "".join(["Carbon dioxide", ", fossil"]), "type": "biosphere", "amount": 1,
+                 "categories": ("".join(["a", "ir"]),)},
+            ],
+        }
+    ]
+    intern_database_strings(db)
+
+    ds = db[0]
+    assert ds["exchanges"][0]["name"] is ds["name"] is sys.intern("market for coke")
+    assert ds["location"] is sys.intern("GLO")
+    assert ds["exchanges"][0]["input"][0] is sys.intern("ei")
+    assert ds["exchanges"][1]["categories"][0] is sys.intern("air")
+    assert ds["comment"] is not sys.intern("some comment")
+
+
+def test_copy_dataset():
+    original = ds("CHA", [2, 0])
+    original["parameters"] = {"efficiency": 0.4}
+    copied = copy_dataset(original)
+
+    copied["location"] = "EUR"
+    copied["parameters"]["efficiency"] = 0.5
+    copied["exchanges"][0]["amount"] = 5
+    copied["exchanges"][1]["location"] = "EUR"
+    copied["exchanges"].pop()
+
+    assert original == {**ds("CHA", [2, 0]), "parameters": {"efficiency": 0.4}}
+    assert copied["exchanges"][0]["name"] is original["exchanges"][0]["name"]
+
+
+def test_get_dataset_code():
+    ds = {"name": "market for steel", "reference product": "steel", "location": "EUR", "unit": "kilogram"}
+
+    assert get_dataset_code(ds) == get_dataset_code(dict(ds, comment="a copy"))
+    assert get_dataset_code(ds) != get_dataset_code(dict(ds, location="CHA"))
+    assert len(get_dataset_code(ds)) == 32
+
+
+def market(location, suppliers):
+    """
+    A market dataset, supplied by electricity production datasets located in `suppliers`, with their amounts.
+    """
+    dataset = {
+        "name": "market for electricity", "reference product": "electricity", "location": location,
+        "unit": "kilowatt hour", "code": "market " + location,
+        "exchanges": [
+            {"name": "market for electricity", "product": "electricity", "location": location,
+             "unit": "kilowatt hour", "amount": 1, "type": "production"},
+            {"name": "Carbon dioxide, fossil", "categories": ("air",), "unit": "kilogram", "amount": 0.1,
+             "type": "biosphere", "input": ("biosphere3", "co2")},
+        ],
+    }
+    for supplier, amount in suppliers.items():
+        dataset["exchanges"].append(
+            {"name": "electricity production", "product": "electricity", "location": supplier,
+             "unit": "kilowatt hour", "amount": amount, "type": "technosphere", "uncertainty type": 2, "scale": 0.1}
+        )
+    return dataset
+
+
+def production(location):
+    return {
+        "name": "electricity production", "reference product": "electricity", "location": location,
+        "unit": "kilowatt hour", "code": "production " + location,
+        "exchanges": [
+            {"name": "electricity production", "product": "electricity", "location": location,
+             "unit": "kilowatt hour", "amount": 1, "type": "production"},
+        ],
+    }
+
+
+def test_build_superstructure_database():
+    scenarios = [
+        {"model": "remind", "pathway": "SSP2-Base", "year": 2030,
+         "database": [market("EUR", {"FR": 0.6}), production("FR")]},
+        {"model": "remind", "pathway": "SSP2-Base", "year": 2050,
+         "database": [market("EUR", {"FR": 0.4, "DE": 0.6}), production("FR"), production("DE")]},
+    ]
+    db, differences = build_superstructure_database(scenarios, "super")
+
+    assert sorted(ds["code"] for ds in db) == ["market EUR", "production DE", "production FR"]
+    supply = {exc["location"]: exc for exc in db[0]["exchanges"] if exc["type"] == "technosphere"}
+    assert supply["FR"]["amount"] == 0.6 and supply["FR"]["scale"] == 0.1
+    assert supply["DE"]["amount"] == 0 and "scale" not in supply["DE"]
+
+    # Only the supplies of the market differ between scenarios
+    assert differences["from location"].tolist() == ["FR", "DE"]
+    assert differences["from key"].tolist() == [("super", "production FR"), ("super", "production DE")]
+    assert set(differences["to key"]) == {("super", "market EUR")}
+    assert differences["remind - SSP2-Base - 2030"].tolist() == [0.6, 0]
+    assert differences["remind - SSP2-Base - 2050"].tolist() == [0.4, 0.6]
+    assert scenarios[0]["database"][0] == market("EUR", {"FR": 0.6})
+
+
+def test_efficiency_ratio_solar_PV_of_several_powers():
+    # 3 and 570 kWp are outside of the table, as is 2060: efficiencies are extrapolated
+    for year in (2030, 2060):
+        powers = [3, 570, 3]
+        efficiencies = get_efficiency_ratio_solar_PV(year, powers).values
+
+        assert efficiencies.shape == (3,)
+        np.testing.assert_allclose(
+            efficiencies, [float(get_efficiency_ratio_solar_PV(year, power)) for power in powers]
+        )